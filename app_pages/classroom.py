@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+import hashlib
+
+import pandas as pd
+import streamlit as st
+
+from app_pages.common import get_firebase, get_live_roster, get_models, show_job_progress
+from core.ann_index import DEFAULT_NPROBE, get_roster_index
+from core.class_detection import TILE_OVERLAP, TILE_SIZE, TILE_WORKERS
+from core.detection_cache import get_detection_cache
+from core.image_decode import decode_image
+from core.jobs import CANCELLED, FAILED, JobQueueFull, get_job_queue
+from core.matching import match_faces_index
+from core.recognition import class_recognition_job
+from core.rendering import (FULL_QUALITY, PREVIEW_MAX_SIZE, PREVIEW_QUALITY, crop_face, encode_image, face_sprite,
+                            render_annotated)
+
+# Trang 3: Nhận diện Sinh viên trong Lớp
+db, bucket = get_firebase()
+models = get_models()
+detection_cache = get_detection_cache()
+# Nhận diện lớp học chạy nền, giới hạn số job suy luận đồng thời
+job_queue = get_job_queue()
+get_live_roster()
+
+
+def render():
+    st.title("Tìm kiếm Sinh viên trong Ảnh Lớp học")
+
+    def result_annotations(faces, matches):
+        annotations = []
+        for face, matched_students in zip(faces, matches):
+            if matched_students:
+                best_match = max(matched_students, key=lambda x: x[1])
+                student_name, score = best_match
+                annotations.append((face, (0, 255, 0), f"{student_name} ({score:.2f})"))
+            else:
+                annotations.append((face, (0, 0, 255), "Unknown"))
+        return annotations
+
+    # Giao diện người dùng
+    st.header("Tải lên Ảnh Lớp học")
+    class_image = st.file_uploader("Chọn ảnh lớp học", type=['jpg', 'jpeg', 'png'])
+
+    threshold = st.slider("Ngưỡng nhận dạng (0-1)", 0.0, 1.0, 0.3, 0.001)
+    with st.expander("Tùy chọn tìm kiếm"):
+        # Chỉ có tác dụng với danh sách lớn; danh sách nhỏ luôn tìm vét cạn
+        nprobe = st.slider("Số cụm dò tìm (cao hơn = chính xác hơn, chậm hơn)", 1, 64, DEFAULT_NPROBE)
+        tile_mode = st.radio("Chia ô ảnh lớp học", ["Tự động", "Luôn chia", "Không chia"], horizontal=True)
+        tile_size = st.slider("Kích thước ô (px)", 512, 2048, TILE_SIZE, 128)
+        tile_overlap = st.slider("Độ chồng lấn giữa các ô", 0.0, 0.5, TILE_OVERLAP, 0.05)
+        tile_workers = st.slider("Số luồng xử lý ô", 1, 8, TILE_WORKERS)
+        refresh_roster = st.checkbox("Nạp lại danh sách sinh viên từ Firestore",
+                                     help="Chỉ cần khi nghi ngờ danh sách trong bộ nhớ bị lệch")
+    detect_options = {
+        "tile_size": tile_size,
+        "overlap": tile_overlap,
+        "workers": tile_workers,
+        "use_tiles": {"Tự động": None, "Luôn chia": True, "Không chia": False}[tile_mode],
+    }
+    search_button = st.button("Tìm kiếm")
+
+    if class_image and search_button:
+        try:
+            job = job_queue.submit("class_recognition", class_recognition_job, db, models, detection_cache,
+                                   class_image.getvalue(), threshold, nprobe=nprobe,
+                                   refresh_roster=refresh_roster, **detect_options)
+            st.session_state.class_job = job.id
+        except JobQueueFull:
+            st.warning("Hệ thống đang bận, vui lòng thử lại sau ít phút")
+    elif search_button:
+        st.warning("Vui lòng tải lên ảnh lớp học trước khi tìm kiếm")
+
+    # Job chạy nền: theo dõi tiến độ, hoặc hiển thị kết quả khi đã xong (kể cả
+    # khi quay lại trang này sau khi chuyển trang)
+    class_job = job_queue.get(st.session_state.get("class_job"))
+    if class_job is not None and not class_job.finished_state:
+        show_job_progress(class_job)
+    elif class_job is not None and class_job.status == FAILED:
+        st.error(f"Đã xảy ra lỗi: {class_job.error}")
+    elif class_job is not None and class_job.status == CANCELLED:
+        st.info("Đã hủy nhận diện")
+    elif class_job is not None:
+        try:
+            class_faces = class_job.result["faces"]
+            class_features = class_job.result["face_features"]
+            # Job chỉ giữ bản xem trước; ảnh gốc lấy lại từ ô tải lên nếu vẫn là ảnh đó
+            uploaded = class_image.getvalue() if class_image else None
+            if uploaded is not None and hashlib.sha256(uploaded).hexdigest() != class_job.result["digest"]:
+                uploaded = None
+
+            if len(class_faces) > 0:
+                # Đổi ngưỡng chỉ so khớp lại các feature đã có, không chạy lại job
+                face_matches = match_faces_index(class_features, get_roster_index(), threshold, nprobe=nprobe)
+
+                # Khung theo ảnh giải mã với CLASS_DECODE_SIZE; mặc định vẽ trên bản
+                # xem trước của job, ảnh gốc chỉ được giải mã khi người dùng yêu cầu
+                full_resolution = st.checkbox("Hiện ảnh kết quả ở độ phân giải đầy đủ", disabled=uploaded is None,
+                                              help=None if uploaded else "Cần tải lại ảnh gốc")
+                if full_resolution and uploaded is not None:
+                    class_img = decode_image(uploaded, need=("rgb",)).rgb
+                    display_size = None
+                else:
+                    class_img = class_job.result["preview"]
+                    display_size = PREVIEW_MAX_SIZE
+                face_scale = class_img.shape[1] / class_job.result["size"][0]
+                result_img = render_annotated(class_img, result_annotations(class_faces, face_matches), face_scale,
+                                              max_size=display_size,
+                                              quality=FULL_QUALITY if display_size is None else PREVIEW_QUALITY)
+
+                st.header("Kết quả Nhận diện")
+                st.image(result_img, caption="Kết quả nhận diện trong lớp học", use_column_width=True)
+
+                matched_faces = sum(1 for matches in face_matches if matches)
+                st.write(f"Đã nhận diện được {matched_faces} khuôn mặt trong {len(class_faces)} khuôn mặt phát hiện được")
+
+                if matched_faces > 0:
+                    st.header("Các khuôn mặt được nhận dạng:")
+
+                    recognized = [(face, max(matches, key=lambda x: x[1]))
+                                  for face, matches in zip(class_faces, face_matches) if matches]
+                    # Mọi khuôn mặt trong một ảnh lưới, đánh số theo bảng bên dưới
+                    sprite = face_sprite(class_img, [[v * face_scale for v in face] for face, _ in recognized])
+                    st.image(sprite, caption="Các khuôn mặt được nhận dạng")
+                    st.dataframe(pd.DataFrame([(i + 1, student_name, score)
+                                               for i, (_, (student_name, score)) in enumerate(recognized)],
+                                              columns=["#", "Tên", "Độ tương đồng"]), hide_index=True)
+
+                    selected = st.selectbox("Xem ảnh gốc của khuôn mặt", [None] + list(range(len(recognized))),
+                                            format_func=lambda i: "-" if i is None else f"{i + 1}. {recognized[i][1][0]}")
+                    if selected is not None:
+                        # Bản xem trước khi ảnh gốc không còn trong ô tải lên
+                        original = class_img
+                        if uploaded is not None and display_size is not None:
+                            original = decode_image(uploaded, need=("rgb",)).rgb
+                        face, (student_name, score) = recognized[selected]
+                        original_scale = original.shape[1] / class_job.result["size"][0]
+                        face_img = crop_face(original, [v * original_scale for v in face])
+                        st.image(encode_image(face_img, quality=FULL_QUALITY), caption=f"{student_name}\n({score:.2f})")
+
+            else:
+                st.error("Không thể phát hiện khuôn mặt trong ảnh lớp học")
+
+        except Exception as e:
+            st.error(f"Đã xảy ra lỗi: {str(e)}")
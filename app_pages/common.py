@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+
+import streamlit as st
+
+from core.ann_index import get_roster_index
+from core.firebase_client import init_firebase
+from core.jobs import QUEUED, JobQueueFull, get_job_queue
+from core.models import get_model_manager
+from core.name_search import get_name_index
+from core.recognition import apply_student_changes, refresh_embeddings_job
+from core.roster_cache import CachedStudent, get_roster_cache
+from core.roster_store import get_roster_store
+from core.student_repo import invalidate_student_pages
+
+logger = logging.getLogger(__name__)
+
+# Các client dùng chung giữa các trang: module này chỉ được import khi một
+# trang được mở lần đầu, client tạo một lần rồi giữ cho cả tiến trình nên các
+# lần chạy lại script không khởi tạo lại
+JOB_POLL_SECONDS = 0.5
+
+JOB_STAGES = {
+    "detect": "Đang phát hiện khuôn mặt",
+    "roster": "Đang nạp danh sách sinh viên",
+    "match": "Đang so khớp",
+    "done": "Đang hoàn tất",
+}
+
+_firebase = None
+_firebase_lock = threading.Lock()
+
+
+def get_firebase():
+    # Khởi tạo Firebase và trả về (db, bucket)
+    global _firebase
+    if _firebase is None:
+        with _firebase_lock:
+            if _firebase is None:
+                _firebase = init_firebase(dict(st.secrets["firebase"]))
+    return _firebase
+
+
+_models = None
+_models_lock = threading.Lock()
+
+
+def get_models():
+    # Mô hình được nạp một lần cho cả tiến trình và dùng chung giữa các phiên
+    global _models
+    if _models is None:
+        with _models_lock:
+            if _models is None:
+                models = get_model_manager()
+                models.warm_up(background=True)
+                _models = models
+    return _models
+
+
+def on_students_changed(changes):
+    # Listener báo thay đổi (kể cả từ phiên/tiến trình khác): cập nhật các chỉ
+    # mục trong bộ nhớ và snapshot. Sinh viên đổi ảnh chân dung mà chưa có
+    # embedding mới bị bỏ khỏi chỉ mục ngay và được tính lại bằng một job nền.
+    invalidate_student_pages()
+    stale = apply_student_changes(changes, get_name_index(), get_roster_index(), get_roster_store())
+    if not stale:
+        return
+    db, _ = get_firebase()
+    students_ref = db.collection("Students")
+    data_of = dict(changes)
+    students = [CachedStudent(students_ref.document(student_id), data_of[student_id]) for student_id in stale]
+    try:
+        get_job_queue().submit("embeddings", refresh_embeddings_job, get_models(), students)
+    except JobQueueFull:
+        logger.warning("Could not queue embedding refresh for %d students", len(students))
+
+
+def get_live_roster():
+    # Toàn bộ danh sách sinh viên trong bộ nhớ, được listener Firestore giữ cập nhật;
+    # khi chưa nạp xong các trang đọc thẳng từ Firestore như trước
+    db, _ = get_firebase()
+    roster_cache = get_roster_cache()
+    roster_cache.add_listener("app", on_students_changed)
+    roster_cache.start(db.collection("Students"))
+    return roster_cache
+
+
+def show_job_progress(job):
+    # Hiển thị tiến độ job nền và tự chạy lại trang sau JOB_POLL_SECONDS
+    snapshot = job.snapshot()
+    progress = snapshot["progress"]
+    if snapshot["status"] == QUEUED:
+        st.info(f"Đang chờ xử lý ({get_job_queue().position(job)} yêu cầu phía trước)...")
+    else:
+        text = JOB_STAGES.get(progress.get("stage"), "Đang xử lý")
+        if "faces" in progress:
+            text += f" — {progress['faces']} khuôn mặt"
+        st.info(text + "...")
+        if progress.get("students_total"):
+            st.progress(progress["students_processed"] / progress["students_total"],
+                        text=f"{progress['students_processed']}/{progress['students_total']} sinh viên")
+    if st.button("Hủy", key=f"cancel_{job.id}"):
+        job.cancel()
+        st.rerun()
+    time.sleep(JOB_POLL_SECONDS)
+    st.rerun()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+import streamlit as st
+
+from app_pages import timing
+from app_pages.common import get_firebase, get_live_roster, get_models
+from core.blob_gc import get_cleanup_queue
+from core.detection_cache import get_detection_cache
+from core.jobs import get_job_queue
+from core.tracing import get_tracer
+
+# Bảng chẩn đoán ở thanh bên, chỉ được import khi người dùng bật
+
+
+def _ms(row, field):
+    return "-" if row is None else f"{row[field]:.0f} ms"
+
+
+def render():
+    models = get_models()
+    with st.sidebar.expander("Thông tin mô hình"):
+        model_report = models.report()
+        st.dataframe(pd.DataFrame(model_report["models"]), hide_index=True)
+        if model_report["process_memory_mb"] is not None:
+            st.caption(f"Bộ nhớ tiến trình: {model_report['process_memory_mb']:.1f} MB")
+
+    with st.sidebar.expander("Thời gian theo giai đoạn", expanded=True):
+        tracer = get_tracer()
+        stage_rows = tracer.snapshot()
+        if stage_rows:
+            st.dataframe(pd.DataFrame(stage_rows).round(1), hide_index=True)
+        else:
+            st.caption("Chưa có số liệu")
+        app_report = timing.report()
+        rerun = app_report.get("app.rerun")
+        imports = [f"{stage[len('app.import.'):]} {row['max_ms']:.0f} ms"
+                   for stage, row in app_report.items() if stage.startswith("app.import.")]
+        st.caption(f"Khởi động: {_ms(app_report.get('app.cold_start'), 'max_ms')}, "
+                   f"chạy lại: {_ms(rerun, 'last_ms')} (p95 {_ms(rerun, 'p95_ms')}), "
+                   f"nạp trang: {', '.join(imports) or '-'}")
+        cache_report = get_detection_cache().report()
+        st.caption(f"Cache phát hiện: {cache_report['entries']} mục, {cache_report['memory_mb']:.1f} MB, "
+                   f"{cache_report['hits'] + cache_report['disk_hits']} lần dùng lại / {cache_report['misses']} lần tính")
+        job_report = get_job_queue().report()
+        st.caption(f"Job nền: {job_report.get('running', 0)} đang chạy (tối đa {job_report['max_running']}), "
+                   f"{job_report.get('queued', 0)} đang chờ")
+        st.caption(f"Suy luận: {model_report['backend']}, {model_report['threads']} luồng, "
+                   f"{model_report['precision']}")
+        _, bucket = get_firebase()
+        cleanup_report = get_cleanup_queue(bucket).report()
+        st.caption(f"Dọn ảnh cũ: {cleanup_report['pending']} đang chờ, đã xóa {cleanup_report['deleted']}, "
+                   f"lỗi {cleanup_report['failed']}")
+        roster_report = get_live_roster().report()
+        staleness = roster_report["staleness_s"]
+        st.caption(f"Cache danh sách: {roster_report['students']} sinh viên, "
+                   f"{'listener hoạt động' if roster_report['active'] else 'listener mất kết nối'}, "
+                   f"trễ {'-' if staleness is None else f'{staleness:.0f}s'}, "
+                   f"kết nối lại {roster_report['reconnects']} lần")
+        st.download_button("Tải chỉ số Prometheus", tracer.prometheus_text(),
+                           file_name="metrics.prom", mime="text/plain")
+        if st.button("Đặt lại số liệu"):
+            tracer.reset()
+            st.rerun()
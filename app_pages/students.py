@@ -0,0 +1,545 @@
+# -*- coding: utf-8 -*-
+import zipfile
+
+import pandas as pd
+import streamlit as st
+
+from app_pages.common import get_firebase, get_live_roster, get_models
+from core.ann_index import get_roster_index
+from core.blob_gc import URL_FIELDS, get_cleanup_queue, image_urls
+from core.bulk_import import REQUIRED_COLUMNS, STATUS_OK, import_students
+from core.embeddings import embedding_fields, load_embedding, process_student_image
+from core.name_search import get_name_index, matches_name, name_tokens, parse_name_query
+from core.roster_store import get_roster_store
+from core.student_repo import DEFAULT_PAGE_SIZE, PAGE_SIZE_OPTIONS, get_page_cache, invalidate_student_pages
+from core.thumbnails import PREVIEW_THUMBNAIL_SIZE, thumbnail_url
+from core.tracing import span
+from core.uploads import UploadError, start_uploads
+
+# Trang 1: Quản lý Sinh viên
+db, bucket = get_firebase()
+models = get_models()
+# Snapshot embedding cục bộ (mmap), giúp nạp danh sách sinh viên nhanh khi khởi động
+roster_store = get_roster_store()
+# Ảnh cũ của sinh viên đã sửa ảnh hoặc bị xóa được xóa khỏi Storage sau một lúc
+blob_cleanup = get_cleanup_queue(bucket)
+roster_cache = get_live_roster()
+
+# CSS của bảng và kết quả tìm kiếm; Streamlit xóa các phần tử của lần chạy
+# trước nên phải chèn lại mỗi lần trang này được hiển thị
+PAGE_CSS = """
+<style>
+    .table-container {
+        display: flex;
+        justify-content: center;
+        width: 100%;
+        overflow-x: auto;
+    }
+    .dataframe {
+        font-size: 14px;
+        width: 100%;
+        border-collapse: collapse;
+    }
+    .dataframe th, .dataframe td {
+        border: 1px solid #ddd;
+        padding: 12px;
+        text-align: left;
+    }
+    .dataframe td:nth-child(3), .dataframe td:nth-child(4) {
+        text-align: center;
+    }
+    .dataframe img {
+        max-width: 80px;
+        max-height: 80px;
+        display: block;
+        margin-left: auto;
+        margin-right: auto;
+    }
+    .stApp {
+        max-width: 100%;
+        margin: 0 auto;
+    }
+    .search-result {
+        margin: 20px 0;
+    }
+    .result-header {
+        font-size: 18px;
+        font-weight: bold;
+        margin-bottom: 10px;
+        border-bottom: 2px solid #333;
+        padding-bottom: 5px;
+    }
+    .result-table {
+        display: table;
+        width: 100%;
+        border-collapse: collapse;
+    }
+    .result-row {
+        display: table-row;
+    }
+    .result-cell {
+        display: table-cell;
+        padding: 10px;
+        vertical-align: middle;
+        border-right: 1px solid #ddd;
+    }
+    .result-cell:last-child {
+        border-right: none;
+    }
+    .info-label {
+        font-weight: bold;
+        margin-right: 10px;
+    }
+    .image-container {
+        text-align: center;
+    }
+    .image-label {
+        font-weight: bold;
+        margin-bottom: 5px;
+    }
+    .image-container img {
+        max-width: 150px;
+        max-height: 150px;
+    }
+</style>
+"""
+
+
+def upload_images(files):
+    # Bắt đầu tải song song ảnh gốc và các bản thu nhỏ của các file được chọn;
+    # files: {trường: file tải lên hoặc None}. Trả về PendingUploads.
+    return start_uploads(bucket, {field: (file.getvalue(), file.name, file.type)
+                                  for field, file in files.items() if file is not None})
+
+
+def portrait_feature(image_data):
+    with models.lease("yunet") as detector, models.lease("sface") as sface_recognizer:
+        _, _, feature = process_student_image(image_data, detector, sface_recognizer)
+    return feature
+
+
+def get_student_data(page_size=DEFAULT_PAGE_SIZE, start_after=None):
+    # Chỉ đọc một trang; các trang đã đọc được cache trong thời gian ngắn
+    if roster_cache.ready:
+        return roster_cache.page(page_size, start_after)
+    return get_page_cache().page(db.collection("Students"), page_size, start_after)
+
+
+def count_student_data():
+    if roster_cache.ready:
+        return roster_cache.count()
+    return get_page_cache().count(db.collection("Students"))
+
+
+def ensure_name_index():
+    # Chỉ mục họ/tên được nạp một lần cho cả tiến trình
+    name_index = get_name_index()
+    if not name_index.loaded:
+        name_index.load(db.collection("Students"), db,
+                        students=roster_cache.students() if roster_cache.ready else None)
+    return name_index
+
+
+def render():
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
+    # Khởi tạo session state
+    if 'current_action' not in st.session_state:
+        st.session_state.current_action = None
+    if 'page_cursors' not in st.session_state:
+        # Con trỏ (ID cuối trang trước) của các trang đã đi qua
+        st.session_state.page_cursors = [None]
+
+    st.header("1. Quản lý Sinh viên")
+    
+    # Tạo các nút cho các chức năng
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("Thêm Sinh viên"):
+            st.session_state.current_action = 'add'
+    with col2:
+        if st.button("Tìm kiếm Sinh viên"):
+            st.session_state.current_action = 'search'
+    with col3:
+        if st.button("Nhập từ File"):
+            st.session_state.current_action = 'import'
+
+    # Chức năng thêm sinh viên mới
+    if st.session_state.current_action == 'add':
+        st.subheader("Thêm Sinh viên mới")
+        
+        st.info("""
+        📝 **Hướng dẫn thêm sinh viên:**
+        - ID: Nhập mã số sinh viên (không được trùng với ID đã có)
+        - Tên: Nhập đầy đủ họ và tên sinh viên
+        - Thẻ Sinh viên & Ảnh Chân dung: Upload file ảnh (JPG, PNG, JPEG)
+        
+        ⚠️ **Lưu ý:** 
+        - Tất cả các trường thông tin đều bắt buộc
+        - Kích thước file ảnh tối đa 200MB
+        """)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            new_id = st.text_input("ID")
+        with col2:
+            new_name = st.text_input("Tên")
+        
+        new_thesv = st.file_uploader("Thẻ Sinh viên", type=["jpg", "png", "jpeg"])
+        new_chandung = st.file_uploader("Ảnh Chân dung", type=["jpg", "png", "jpeg"])
+
+        if st.button("Xác nhận thêm"):
+            if new_id and new_name and new_thesv and new_chandung:
+                with span("firestore.get"):
+                    doc_ref = db.collection("Students").document(new_id).get()
+                if doc_ref.exists:
+                    st.error(f"ID {new_id} đã tồn tại! Vui lòng chọn ID khác.")
+                else:
+                    with span("student.add"):
+                        uploads = upload_images({"TheSV": new_thesv, "ChanDung": new_chandung})
+                        try:
+                            # Tính embedding chân dung trong lúc ảnh đang được tải lên
+                            feature = portrait_feature(new_chandung.getvalue())
+                            student_record = {"Name": new_name}
+                            student_record.update(uploads.result())
+                        except UploadError as e:
+                            st.error(f"Tải ảnh lên thất bại: {e}")
+                            st.stop()
+                        except Exception:
+                            uploads.rollback()
+                            raise
+                        student_record.update(name_tokens(new_name))
+                        student_record.update(embedding_fields(feature, student_record["ChanDung"]))
+                        # Chỉ ghi Firestore một lần sau khi mọi ảnh đã tải lên xong
+                        try:
+                            db.collection("Students").document(new_id).set(student_record)
+                        except Exception:
+                            uploads.rollback()
+                            raise
+                        roster_index = get_roster_index()
+                        if roster_index.loaded:
+                            roster_index.upsert(new_id, new_name, load_embedding(student_record))
+                        roster_store.upsert(new_id, new_name, load_embedding(student_record))
+                        name_index = get_name_index()
+                        if name_index.loaded:
+                            name_index.add(new_id, student_record["HoNorm"], student_record["TenNorm"])
+                        invalidate_student_pages()
+                    st.success("Đã thêm sinh viên mới!")
+                    st.session_state.current_action = None
+                    st.rerun()
+            else:
+                st.warning("Vui lòng điền đầy đủ thông tin!")
+
+    # Chức năng nhập hàng loạt
+    elif st.session_state.current_action == 'import':
+        st.subheader("Nhập danh sách Sinh viên")
+
+        st.info(f"""
+        📥 **Hướng dẫn nhập hàng loạt:**
+        - File CSV (UTF-8) gồm các cột: {", ".join(REQUIRED_COLUMNS)}
+        - TheSV, ChanDung: tên file ảnh thẻ sinh viên và ảnh chân dung trong file zip
+        - File zip: chứa toàn bộ ảnh, có thể đặt trong thư mục con
+
+        ⚠️ **Lưu ý:**
+        - Các dòng có ID đã tồn tại hoặc thiếu ảnh sẽ bị bỏ qua và ghi trong báo cáo
+        """)
+
+        import_csv = st.file_uploader("File CSV danh sách", type=["csv"])
+        import_zip = st.file_uploader("File zip ảnh", type=["zip"])
+
+        if st.button("Xác nhận nhập"):
+            if import_csv and import_zip:
+                progress_bar = st.progress(0.0)
+
+                def show_import_progress(done, total):
+                    progress_bar.progress(done / total if total else 1.0)
+
+                try:
+                    with st.spinner("Đang nhập danh sách sinh viên..."):
+                        import_report, imported = import_students(
+                            db, bucket, models, import_csv.getvalue(), import_zip.getvalue(),
+                            progress=show_import_progress)
+                except (ValueError, zipfile.BadZipFile) as e:
+                    st.error(f"File không hợp lệ: {e}")
+                    st.stop()
+                progress_bar.progress(1.0)
+
+                roster_index = get_roster_index()
+                name_index = get_name_index()
+                with roster_store.batch():
+                    for student_id, student_record in imported:
+                        if roster_index.loaded:
+                            roster_index.upsert(student_id, student_record["Name"], load_embedding(student_record))
+                        roster_store.upsert(student_id, student_record["Name"], load_embedding(student_record))
+                        if name_index.loaded:
+                            name_index.add(student_id, student_record["HoNorm"], student_record["TenNorm"])
+                if imported:
+                    invalidate_student_pages()
+
+                failed_rows = sum(1 for r in import_report if r["Trạng thái"] != STATUS_OK)
+                st.success(f"Đã nhập {len(imported)} sinh viên, {failed_rows} dòng lỗi")
+                report_df = pd.DataFrame(import_report)
+                st.dataframe(report_df, hide_index=True, use_container_width=True)
+                st.download_button("Tải báo cáo", report_df.to_csv(index=False).encode("utf-8-sig"),
+                                   file_name="bao_cao_nhap.csv", mime="text/csv")
+            else:
+                st.warning("Vui lòng chọn file CSV và file zip ảnh!")
+
+    # Chức năng tìm kiếm
+    elif st.session_state.current_action == 'search':
+        st.subheader("Tìm kiếm Sinh viên")
+        
+        st.info("""
+        🔍 **Hướng dẫn tìm kiếm:**
+        1. Tìm theo ID: 
+           - Nhập chính xác mã số sinh viên
+        
+        2. Tìm theo Tên:
+           - Tìm theo họ: Nhập trực tiếp (vd: Ho, Hoang)
+           - Tìm theo tên: Thêm # trước tên (vd: #Chuong)
+        
+        3. Tìm kết hợp:
+           - Có thể nhập cả ID và tên để tìm chính xác hơn
+        
+        ⚠️ **Lưu ý:** 
+        - Không phân biệt chữ hoa/thường
+        - Không phân biệt dấu tiếng Việt
+        """)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            search_id = st.text_input("Nhập ID sinh viên")
+        with col2:
+            search_name = st.text_input("Nhập tên sinh viên (thêm # ở đầu để tìm theo tên)")
+
+        if st.button("Xác nhận tìm kiếm"):
+            found_students = []
+            
+            if search_id:
+                if roster_cache.ready:
+                    student_data = roster_cache.get(search_id)
+                else:
+                    with span("firestore.get"):
+                        student = db.collection("Students").document(search_id).get()
+                    student_data = student.to_dict() if student.exists else None
+                if student_data is not None:
+                    if search_name:
+                        normalized_search, is_search_by_last_name = parse_name_query(search_name)
+                        if matches_name(student_data, normalized_search, is_search_by_last_name):
+                            found_students.append((search_id, student_data))
+                    else:
+                        found_students.append((search_id, student_data))
+            
+            elif search_name:
+                normalized_search, is_search_by_last_name = parse_name_query(search_name)
+                # Tra chỉ mục trong bộ nhớ, chỉ đọc các bản ghi khớp
+                student_ids = ensure_name_index().lookup(normalized_search, is_search_by_last_name)
+                if student_ids and roster_cache.ready:
+                    for student_id in student_ids:
+                        student_data = roster_cache.get(student_id)
+                        if student_data is not None:
+                            found_students.append((student_id, student_data))
+                elif student_ids:
+                    students_ref = db.collection("Students")
+                    with span("firestore.get_all", count=len(student_ids)):
+                        students = list(db.get_all([students_ref.document(student_id) for student_id in student_ids]))
+                    for student in students:
+                        if student.exists:
+                            found_students.append((student.id, student.to_dict()))
+
+            if found_students:
+                for student_id, student_data in found_students:
+                    st.markdown(f"""
+                    <div class="search-result">
+                        <div class="result-header">Thông tin sinh viên</div>
+                        <div class="result-table">
+                            <div class="result-row">
+                                <div class="result-cell">
+                                    <span class="info-label">ID:</span>
+                                    <span>{student_id}</span>
+                                </div>
+                                <div class="result-cell">
+                                    <span class="info-label">Tên:</span>
+                                    <span>{student_data.get('Name', '')}</span>
+                                </div>
+                                <div class="result-cell">
+                                    <div class="image-container">
+                                        <div class="image-label">Thẻ Sinh viên</div>
+                                        <img src="{thumbnail_url(student_data, 'TheSV', PREVIEW_THUMBNAIL_SIZE)}" alt="Thẻ Sinh viên">
+                                    </div>
+                                </div>
+                                <div class="result-cell">
+                                    <div class="image-container">
+                                        <div class="image-label">Ảnh Chân dung</div>
+                                        <img src="{thumbnail_url(student_data, 'ChanDung', PREVIEW_THUMBNAIL_SIZE)}" alt="Ảnh Chân dung">
+                                    </div>
+                                </div>
+                            </div>
+                        </div>
+                    </div>
+                    """, unsafe_allow_html=True)
+            else:
+                st.warning("Không tìm thấy sinh viên phù hợp!")
+
+    # Hiển thị bảng dữ liệu
+    st.subheader("Danh sách Sinh viên")
+
+    def reset_pagination():
+        st.session_state.page_cursors = [None]
+
+    page_size = st.selectbox("Số sinh viên mỗi trang", PAGE_SIZE_OPTIONS,
+                             index=PAGE_SIZE_OPTIONS.index(DEFAULT_PAGE_SIZE), on_change=reset_pagination)
+    page_cursors = st.session_state.page_cursors
+    table_data, next_cursor = get_student_data(page_size, page_cursors[-1])
+    total_students = count_student_data()
+    total_pages = max(1, -(-total_students // page_size))
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("◀ Trang trước", disabled=len(page_cursors) == 1):
+            page_cursors.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Trang {len(page_cursors)}/{total_pages} — tổng số {total_students} sinh viên")
+    with col3:
+        if st.button("Trang sau ▶", disabled=next_cursor is None or len(page_cursors) >= total_pages):
+            page_cursors.append(next_cursor)
+            st.rerun()
+
+    df = pd.DataFrame(table_data, columns=["ID", "Name", "TheSV", "ChanDung"])
+
+    df['Edit'] = False
+    df['Delete'] = False
+
+    edited_df = st.data_editor(
+        df,
+        hide_index=True,
+        column_config={
+            "Edit": st.column_config.CheckboxColumn("Chỉnh sửa", default=False, width="small"),
+            "Delete": st.column_config.CheckboxColumn("Xóa", default=False, width="small"),
+            "TheSV": st.column_config.ImageColumn("Thẻ SV", help="Thẻ sinh viên", width="medium"),
+            "ChanDung": st.column_config.ImageColumn("Chân dung", help="Ảnh chân dung", width="medium"),
+            "ID": st.column_config.TextColumn("ID", help="ID sinh viên", width="medium"),
+            "Name": st.column_config.TextColumn("Tên", help="Tên sinh viên", width="large"),
+        },
+        disabled=["ID", "Name", "TheSV", "ChanDung"],
+        use_container_width=True,
+        num_rows="dynamic"
+    )
+
+    # Xử lý chỉnh sửa và xóa
+    students_to_edit = edited_df[edited_df['Edit']]
+    if not students_to_edit.empty:
+        for _, student in students_to_edit.iterrows():
+            st.subheader(f"Chỉnh sửa thông tin cho sinh viên: {student['Name']}")
+            
+            st.info("""
+            ✏️ **Hướng dẫn chỉnh sửa:**
+            - ID: Có thể thay đổi (không được trùng với ID khác)
+            - Tên: Nhập tên mới cần thay đổi
+            - Ảnh: Chỉ cần upload khi muốn thay đổi ảnh mới
+            
+            ⚠️ **Lưu ý:**
+            - Nếu không upload ảnh mới, ảnh cũ sẽ được giữ nguyên
+            - Sau khi thay đổi ID, sinh viên sẽ được cập nhật với ID mới
+            """)
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                edit_id = st.text_input(f"ID mới cho {student['ID']}", value=student['ID'])
+            with col2:
+                edit_name = st.text_input(f"Tên mới cho {student['ID']}", value=student['Name'])
+            
+            edit_thesv = st.file_uploader(f"Thẻ Sinh viên mới cho {student['ID']}", type=["jpg", "png", "jpeg"])
+            edit_chandung = st.file_uploader(f"Ảnh Chân dung mới cho {student['ID']}", type=["jpg", "png", "jpeg"])
+
+            if st.button(f"Cập nhật cho {student['ID']}"):
+                with span("student.update"):
+                    uploads = upload_images({"TheSV": edit_thesv, "ChanDung": edit_chandung})
+                    try:
+                        feature = portrait_feature(edit_chandung.getvalue()) if edit_chandung else None
+                        update_data = {"Name": edit_name}
+                        update_data.update(name_tokens(edit_name))
+                        update_data.update(uploads.result())
+                    except UploadError as e:
+                        st.error(f"Tải ảnh lên thất bại: {e}")
+                        st.stop()
+                    except Exception:
+                        uploads.rollback()
+                        raise
+                    if edit_chandung:
+                        update_data.update(embedding_fields(feature, update_data["ChanDung"]))
+
+                    students_ref = db.collection("Students")
+                    try:
+                        old_data = students_ref.document(student['ID']).get().to_dict()
+                        if edit_id != student['ID']:
+                            current_data = dict(old_data)
+                            current_data.update(update_data)
+                            # Đổi ID: tạo bản ghi mới và xóa bản ghi cũ trong cùng một batch
+                            batch = db.batch()
+                            batch.set(students_ref.document(edit_id), current_data)
+                            batch.delete(students_ref.document(student['ID']))
+                            batch.commit()
+                        else:
+                            students_ref.document(student['ID']).update(update_data)
+                    except Exception:
+                        uploads.rollback()
+                        raise
+                    # Ảnh (và bản thu nhỏ) bị thay thế không còn được dùng
+                    blob_cleanup.enqueue_urls(old_data[field] for field in URL_FIELDS
+                                              if field in update_data and old_data.get(field)
+                                              and old_data[field] != update_data[field])
+
+                    roster_index = get_roster_index()
+                    name_index = get_name_index()
+                    if name_index.loaded:
+                        name_index.remove(student['ID'])
+                        name_index.add(edit_id, update_data["HoNorm"], update_data["TenNorm"])
+                    if edit_id != student['ID']:
+                        if roster_index.loaded:
+                            roster_index.delete(student['ID'])
+                            roster_index.upsert(edit_id, edit_name, load_embedding(current_data))
+                        with roster_store.batch():
+                            roster_store.delete(student['ID'])
+                            roster_store.upsert(edit_id, edit_name, load_embedding(current_data))
+                        st.success(f"Đã cập nhật thông tin và ID sinh viên từ {student['ID']} thành {edit_id}!")
+                    else:
+                        if roster_index.loaded:
+                            if "Embedding" in update_data:
+                                roster_index.upsert(student['ID'], edit_name, load_embedding(update_data))
+                            else:
+                                roster_index.rename(student['ID'], student['ID'], edit_name)
+                        if "Embedding" in update_data:
+                            roster_store.upsert(student['ID'], edit_name, load_embedding(update_data))
+                        else:
+                            roster_store.rename(student['ID'], student['ID'], edit_name)
+                        st.success(f"Đã cập nhật thông tin sinh viên {student['ID']}!")
+                
+                    invalidate_student_pages()
+                st.rerun()
+
+    students_to_delete = edited_df[edited_df['Delete']]
+    if not students_to_delete.empty:
+        for _, student in students_to_delete.iterrows():
+            st.subheader(f"Xác nhận xóa sinh viên: {student['Name']}")
+            
+            st.warning("""
+            ⚠️ **Cảnh báo:**
+            - Thao tác xóa không thể hoàn tác
+            - Tất cả thông tin của sinh viên sẽ bị xóa vĩnh viễn
+            - Vui lòng kiểm tra kỹ trước khi xác nhận xóa
+            """)
+            
+            if st.button(f"Xác nhận xóa {student['ID']}"):
+                with span("student.delete"):
+                    student_ref = db.collection("Students").document(student['ID'])
+                    old_snapshot = student_ref.get()
+                    student_ref.delete()
+                    if old_snapshot.exists:
+                        blob_cleanup.enqueue_urls(image_urls(old_snapshot.to_dict()))
+                    get_roster_index().delete(student['ID'])
+                    roster_store.delete(student['ID'])
+                    get_name_index().remove(student['ID'])
+                    invalidate_student_pages()
+                st.success(f"Đã xóa sinh viên {student['ID']}!")
+                st.rerun()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+import importlib
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from core.tracing import get_tracer
+
+# Thời gian khởi động và mỗi lần chạy lại script được ghi vào tracer chung:
+# app.cold_start (lần chạy đầu của tiến trình), app.rerun (các lần sau),
+# app.import.<trang> (import trang lần đầu, kèm tạo client) và app.page.<trang>
+_cold_start_done = False
+_lock = threading.Lock()
+
+
+def import_page(module_name):
+    # Trang và các thư viện/client của nó chỉ được import ở lần dùng đầu,
+    # các lần sau lấy lại từ sys.modules
+    full_name = f"{__package__}.{module_name}"
+    module = sys.modules.get(full_name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    failed = False
+    try:
+        return importlib.import_module(full_name)
+    except Exception:
+        failed = True
+        raise
+    finally:
+        get_tracer().record(f"app.import.{module_name}", time.perf_counter() - start, failed)
+
+
+def render_page(module_name):
+    module = import_page(module_name)
+    start = time.perf_counter()
+    try:
+        module.render()
+    finally:
+        get_tracer().record(f"app.page.{module_name}", time.perf_counter() - start)
+
+
+@contextmanager
+def script_run(started):
+    # Bọc một lần chạy script tính từ started (time.perf_counter() ở đầu
+    # script). st.rerun()/st.stop() thoát bằng ngoại lệ nhưng vẫn được tính
+    global _cold_start_done
+    failed = False
+    try:
+        yield
+    except Exception:
+        failed = True
+        raise
+    finally:
+        with _lock:
+            name = "app.rerun" if _cold_start_done else "app.cold_start"
+            _cold_start_done = True
+        get_tracer().record(name, time.perf_counter() - started, failed)
+
+
+def report():
+    # {tên: dòng snapshot} của các số liệu khởi động/chạy lại
+    return {row["stage"]: row for row in get_tracer().snapshot() if row["stage"].startswith("app.")}
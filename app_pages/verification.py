@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+import hashlib
+
+import cv2
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from app_pages.common import get_firebase, get_live_roster, get_models, show_job_progress
+from core.detection_cache import cache_key, get_detection_cache
+from core.embeddings import face_crop, largest_face
+from core.image_decode import VERIFY_DECODE_SIZE, decode_image
+from core.jobs import CANCELLED, FAILED, JobQueueFull, get_job_queue
+from core.recognition import ensure_roster_index
+from core.rendering import FULL_QUALITY, downscale, render_annotated
+from core.tracing import span
+
+# Trang 2: Xác thực Khuôn mặt
+db, bucket = get_firebase()
+models = get_models()
+# Kết quả phát hiện/embedding theo nội dung ảnh, dùng lại giữa các lần chạy lại
+detection_cache = get_detection_cache()
+# Xác thực chạy nền, giới hạn số job suy luận đồng thời
+job_queue = get_job_queue()
+get_live_roster()
+
+
+# Các hàm xử lý khuôn mặt
+# Kết quả phát hiện và feature được cache theo nội dung ảnh: bấm "Kiểm tra"
+# lại với cùng ảnh chỉ cần giải mã để hiển thị
+def detect_portrait(image_data):
+    # Trả về (ảnh RGB, khung mặt lớn nhất, feature) của ảnh chân dung; phát hiện
+    # và cắt như embedding chân dung trong danh sách để tìm sinh viên gần nhất
+    decoded = decode_image(image_data, VERIFY_DECODE_SIZE, need=("bgr", "rgb"))
+
+    def compute():
+        with models.lease("yunet") as detector:
+            face = largest_face(detector, decoded.bgr)
+        if face is None:
+            return {"face": None, "feature": None}
+        with models.lease("sface") as face_recognizer:
+            feature = face_recognizer.feature(face_crop(decoded.rgb, face))
+        return {"face": np.asarray(face), "feature": feature}
+
+    entry = detection_cache.get_or_compute(
+        cache_key(image_data, "verify_portrait", models, decode_size=VERIFY_DECODE_SIZE, detector="yunet"), compute)
+    return decoded.rgb, entry["face"], entry["feature"]
+
+
+def detect_recognize_face_yunet(image_data):
+    # Trả về (ảnh RGB, khuôn mặt YuNet đầu tiên, feature) của ảnh thẻ sinh viên
+    decoded = decode_image(image_data, VERIFY_DECODE_SIZE, need=("bgr", "rgb"))
+    img, img_rgb = decoded.bgr, decoded.rgb
+
+    def compute():
+        height, width, _ = img.shape
+        with models.lease("yunet") as face_detector, span("detect.yunet_single"):
+            face_detector.setInputSize((width, height))
+            _, faces = face_detector.detect(img)
+        if faces is None or len(faces) == 0:
+            return {"face": None, "feature": None}
+        with models.lease("sface") as face_recognizer, span("embed.align_feature"):
+            aligned_face = face_recognizer.alignCrop(img_rgb, faces[0])
+            feature = face_recognizer.feature(aligned_face)
+        return {"face": faces[0], "feature": feature}
+
+    entry = detection_cache.get_or_compute(
+        cache_key(image_data, "verify_id", models, decode_size=VERIFY_DECODE_SIZE), compute)
+    return img_rgb, entry["face"], entry["feature"]
+
+
+def compare_faces(feature1, feature2, face_recognizer):
+    with span("match.pair"):
+        cosine_score = face_recognizer.match(feature1, feature2, cv2.FaceRecognizerSF_FR_COSINE)
+    return cosine_score
+
+
+def image_result(img_rgb, face, image_data):
+    # Phần được giữ trong kết quả job cho một ảnh: bản xem trước (cạnh dài tối
+    # đa PREVIEW_MAX_SIZE), khung theo ảnh đã giải mã, chiều rộng ảnh đó để đổi
+    # tỉ lệ và digest để nhận ra ảnh gốc còn trong ô tải lên
+    preview, _ = downscale(img_rgb)
+    return {"preview": preview, "face": face, "width": img_rgb.shape[1],
+            "digest": hashlib.sha256(image_data).hexdigest()}
+
+
+def render_image(image, uploaded, color, full_resolution):
+    # Vẽ khung lên bản xem trước, hoặc lên ảnh gốc tải lên khi xem độ phân giải đầy đủ
+    if full_resolution:
+        img = decode_image(uploaded, need=("rgb",)).rgb
+        display = {"max_size": None, "quality": FULL_QUALITY}
+    else:
+        img = image["preview"]
+        display = {}
+    return render_annotated(img, [(image["face"], color, None)], img.shape[1] / image["width"], **display)
+
+
+def verification_job(job, portrait_data, id_data):
+    # Chạy nền cho trang 2: phát hiện, tính feature, so sánh và tìm sinh viên gần
+    # nhất. Kết quả chỉ giữ bản xem trước và khung, không giữ ảnh đã giải mã.
+    job.update(stage="detect")
+    try:
+        portrait_img, largest_face, portrait_face_feature = detect_portrait(portrait_data)
+        id_img, id_face, id_feature = detect_recognize_face_yunet(id_data)
+    except ValueError as e:
+        raise ValueError(f"Ảnh không hợp lệ: {e}") from e
+    result = {"portrait": image_result(portrait_img, largest_face, portrait_data),
+              "id": image_result(id_img, id_face, id_data), "score": None, "candidates": []}
+    if largest_face is not None and id_face is not None:
+        job.update(stage="match")
+        with models.lease("sface") as sface_recognizer:
+            result["score"] = compare_faces(portrait_face_feature, id_feature, sface_recognizer)
+        result["candidates"] = ensure_roster_index(db, models).search(portrait_face_feature, k=3)[0]
+    return result
+
+
+def render():
+    st.title("Ứng dụng So sánh nh Chân dung và Thẻ Sinh viên")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.header("Ảnh Chân dung")
+        portrait_image = st.file_uploader("Tải lên ảnh chân dung", type=['jpg', 'jpeg', 'png'])
+
+    with col2:
+        st.header("Ảnh Thẻ Sinh viên")
+        id_image = st.file_uploader("Tải lên ảnh thẻ sinh viên", type=['jpg', 'jpeg', 'png'])
+
+    check_button = st.button("Kiểm tra")
+
+    if portrait_image and id_image and check_button:
+        try:
+            job = job_queue.submit("verification", verification_job,
+                                   portrait_image.getvalue(), id_image.getvalue())
+            st.session_state.verify_job = job.id
+        except JobQueueFull:
+            st.warning("Hệ thống đang bận, vui lòng thử lại sau ít phút")
+    elif check_button:
+        st.warning("Vui lòng tải lên cả ảnh chân dung và ảnh thẻ sinh viên trước khi kiểm tra.")
+
+    verify_job = job_queue.get(st.session_state.get("verify_job"))
+    if verify_job is not None and not verify_job.finished_state:
+        show_job_progress(verify_job)
+    elif verify_job is not None and verify_job.status == FAILED:
+        st.error(verify_job.error)
+    elif verify_job is not None and verify_job.status == CANCELLED:
+        st.info("Đã hủy kiểm tra")
+    elif verify_job is not None:
+        verification = verify_job.result
+        portrait, id_card = verification["portrait"], verification["id"]
+
+        if portrait["face"] is not None and id_card["face"] is not None:
+            similarity_score = verification["score"]
+
+            st.header("Kết quả So sánh")
+            st.write(f"Độ tương đồng: {similarity_score:.4f}")
+
+            if similarity_score > 0.3:
+                st.success("Ảnh chân dung và ảnh thẻ sinh viên KHỚP!")
+                color = (0, 255, 0)
+            else:
+                st.error("Ảnh chân dung và ảnh thẻ sinh viên KHÔNG KHỚP!")
+                color = (0, 0, 255)
+
+            # Khung được vẽ trên bản thu nhỏ và gửi đi dưới dạng ảnh nén; độ phân
+            # giải đầy đủ giải mã lại ảnh gốc, chỉ khi cả hai vẫn còn trong ô tải lên
+            uploads = [image.getvalue() if image else None for image in (portrait_image, id_image)]
+            originals = all(data is not None and hashlib.sha256(data).hexdigest() == kept["digest"]
+                            for data, kept in zip(uploads, (portrait, id_card)))
+            full_resolution = st.checkbox("Hiện ảnh ở độ phân giải đầy đủ", disabled=not originals,
+                                          help=None if originals else "Cần tải lại ảnh gốc") and originals
+            portrait_img_with_rect = render_image(portrait, uploads[0], color, full_resolution)
+            id_img_with_rect = render_image(id_card, uploads[1], color, full_resolution)
+
+            col1, col2 = st.columns(2)
+            with col1:
+                st.image(portrait_img_with_rect, caption="Ảnh Chân dung", use_column_width=True)
+            with col2:
+                st.image(id_img_with_rect, caption="Ảnh Thẻ Sinh viên", use_column_width=True)
+
+            # Các sinh viên đã đăng ký có chân dung gần nhất với ảnh chân dung tải lên
+            candidates = verification["candidates"]
+            if candidates:
+                st.subheader("Sinh viên gần nhất trong danh sách")
+                st.dataframe(pd.DataFrame(candidates, columns=["ID", "Tên", "Độ tương đồng"]), hide_index=True)
+        else:
+            st.error("Không thể phát hiện khuôn mặt trong một hoặc cả hai ảnh. Vui lòng thử lại với ảnh khác.")
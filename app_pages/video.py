@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+
+import pandas as pd
+import streamlit as st
+
+from app_pages.common import get_firebase, get_live_roster, get_models
+from core.embeddings import load_roster_features
+from core.matching import stack_features
+from core.roster_cache import load_students
+from core.video_attendance import DETECT_EVERY, VideoAttendance
+
+# Trang 4: Điểm danh qua Video
+db, bucket = get_firebase()
+models = get_models()
+get_live_roster()
+
+
+def render():
+    st.title("Điểm danh từ Video / Camera")
+
+    source_type = st.radio("Nguồn video", ["File video", "Camera"], horizontal=True)
+    if source_type == "File video":
+        video_file = st.file_uploader("Chọn file video", type=['mp4', 'avi', 'mov', 'mkv'])
+        camera_index, max_seconds = None, None
+    else:
+        video_file = None
+        camera_index = st.number_input("Số thứ tự camera", min_value=0, value=0, step=1)
+        max_seconds = st.slider("Thời gian điểm danh (giây)", 10, 600, 60, 10)
+
+    threshold = st.slider("Ngưỡng nhận dạng (0-1)", 0.0, 1.0, 0.3, 0.001)
+    detect_every = st.slider("Phát hiện khuôn mặt mỗi N khung hình", 1, 30, DETECT_EVERY)
+    start_button = st.button("Bắt đầu điểm danh")
+
+    if start_button and (video_file or camera_index is not None):
+        try:
+            with st.spinner('Đang nạp danh sách sinh viên...'):
+                students = load_students(db.collection("Students"))
+                with models.lease("yunet") as detector, models.lease("sface_net") as feature_net:
+                    roster = load_roster_features(students, detector, feature_net)
+            labels = [(student_id, name) for student_id, name, _ in roster]
+            roster_matrix = stack_features([feature for _, _, feature in roster])
+
+            if video_file:
+                with tempfile.NamedTemporaryFile(suffix="." + video_file.name.split(".")[-1], delete=False) as tmp:
+                    tmp.write(video_file.getvalue())
+                source = tmp.name
+            else:
+                source = int(camera_index)
+
+            progress_bar = st.progress(0.0)
+            status = st.empty()
+
+            def show_progress(frame_index, total_frames, present):
+                if total_frames:
+                    progress_bar.progress(min(1.0, frame_index / total_frames))
+                status.write(f"Khung hình {frame_index} — đã điểm danh {present} sinh viên")
+
+            session = VideoAttendance(models, labels, roster_matrix, threshold, detect_every)
+            try:
+                attendance, stats = session.run(source, max_seconds=max_seconds, progress=show_progress)
+            finally:
+                if video_file:
+                    os.remove(source)
+            progress_bar.progress(1.0)
+
+            st.header("Danh sách điểm danh")
+            if attendance:
+                st.dataframe(pd.DataFrame(attendance).rename(columns={
+                    "student_id": "ID", "student_name": "Tên",
+                    "first_seen": "Xuất hiện lúc (giây)", "score": "Độ tương đồng"}), hide_index=True)
+            else:
+                st.warning("Không nhận diện được sinh viên nào")
+
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("Khung hình", stats["frames"])
+            col2.metric("Tốc độ (khung/giây)", f"{stats['fps']:.1f}")
+            col3.metric("Phát hiện (ms)", f"{stats['detect_ms_mean']:.1f}")
+            col4.metric("Khuôn mặt được theo dõi", stats["tracks"])
+            with st.expander("Thống kê chi tiết"):
+                st.json(stats)
+        except Exception as e:
+            st.error(f"Đã xảy ra lỗi: {str(e)}")
+    elif start_button:
+        st.warning("Vui lòng chọn file video trước khi điểm danh")
@@ -0,0 +1,450 @@
+# -*- coding: utf-8 -*-
+# Bản giả lập trong bộ nhớ của các đối tượng db (Firestore) và bucket (Storage)
+# mà ứng dụng dùng, đủ cho các đường đo hiệu năng chạy không cần mạng.
+import copy
+import datetime
+import threading
+import time
+from enum import Enum
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from google.api_core.exceptions import AlreadyExists, NotFound
+
+DOCUMENT_ID = "__name__"
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+
+class FakeDocumentReference:
+    def __init__(self, collection, doc_id):
+        self._collection = collection
+        self.id = doc_id
+
+    def get(self):
+        self._collection.reads += 1
+        return FakeSnapshot(self, self._collection.docs.get(self.id))
+
+    def set(self, data):
+        self._collection.write(self.id, copy.deepcopy(data))
+
+    def update(self, data):
+        if self.id not in self._collection.docs:
+            raise KeyError(f"No document to update: {self.id}")
+        merged = dict(self._collection.docs[self.id])
+        merged.update(copy.deepcopy(data))
+        self._collection.write(self.id, merged)
+
+    def delete(self):
+        self._collection.remove(self.id)
+
+
+class FakeChangeType(Enum):
+    ADDED = 1
+    REMOVED = 2
+    MODIFIED = 3
+
+
+class FakeDocumentChange:
+    def __init__(self, change_type, document):
+        self.type = change_type
+        self.document = document
+
+
+class FakeWatch:
+    # Luồng thay đổi giả lập của on_snapshot: lần đầu gửi toàn bộ tài liệu
+    # (ADDED), sau đó gửi từng thay đổi ngay trong luồng ghi. disconnect() giả
+    # lập mất kết nối: watch ngừng hoạt động và bỏ lỡ các thay đổi sau đó.
+
+    def __init__(self, collection, callback):
+        self._collection = collection
+        self._callback = callback
+        self.is_active = True
+
+    def deliver(self, changes):
+        if self.is_active:
+            documents = [FakeSnapshot(FakeDocumentReference(self._collection, doc_id), data)
+                         for doc_id, data in list(self._collection.docs.items())]
+            self._callback(documents, changes, datetime.datetime.now(datetime.timezone.utc))
+
+    def disconnect(self):
+        self.is_active = False
+
+    def unsubscribe(self):
+        self.is_active = False
+        self._collection.watches.discard(self)
+
+
+class FakeAggregationResult:
+    def __init__(self, value):
+        self.value = value
+
+
+class FakeAggregationQuery:
+    def __init__(self, query):
+        self._query = query
+
+    def get(self):
+        self._query._collection.reads += 1
+        return [[FakeAggregationResult(len(self._query._matching_ids()))]]
+
+
+class FakeQuery:
+    def __init__(self, collection, order_by=None, limit=None, start_after=None, fields=None):
+        self._collection = collection
+        self._order_by = order_by
+        self._limit = limit
+        self._start_after = start_after
+        self._fields = fields
+
+    def _copy(self, **changes):
+        params = dict(order_by=self._order_by, limit=self._limit,
+                      start_after=self._start_after, fields=self._fields)
+        params.update(changes)
+        return FakeQuery(self._collection, **params)
+
+    def order_by(self, field_path):
+        return self._copy(order_by=str(field_path))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, values):
+        value = values[DOCUMENT_ID]
+        return self._copy(start_after=getattr(value, "id", value))
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def count(self):
+        return FakeAggregationQuery(self)
+
+    def _matching_ids(self):
+        ids = list(self._collection.docs)
+        if self._order_by is not None:
+            ids.sort(key=lambda i: i if self._order_by == DOCUMENT_ID else self._collection.docs[i].get(self._order_by))
+        if self._start_after is not None:
+            ids = [i for i in ids if i > self._start_after]
+        if self._limit is not None:
+            ids = ids[:self._limit]
+        return ids
+
+    def stream(self):
+        for doc_id in self._matching_ids():
+            self._collection.reads += 1
+            data = self._collection.docs[doc_id]
+            if self._fields is not None:
+                data = {k: v for k, v in data.items() if k in self._fields}
+            yield FakeSnapshot(FakeDocumentReference(self._collection, doc_id), copy.deepcopy(data))
+
+    def get(self):
+        return list(self.stream())
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, name):
+        super().__init__(self)
+        self.name = name
+        self.docs = {}
+        self.reads = 0
+        self.writes = 0
+        self.watches = set()
+        self._lock = threading.Lock()
+
+    def document(self, doc_id):
+        return FakeDocumentReference(self, doc_id)
+
+    def write(self, doc_id, data):
+        with self._lock:
+            change_type = FakeChangeType.MODIFIED if doc_id in self.docs else FakeChangeType.ADDED
+            self.docs[doc_id] = data
+            self.writes += 1
+        self._notify(change_type, doc_id, data)
+
+    def remove(self, doc_id):
+        with self._lock:
+            data = self.docs.pop(doc_id, None)
+            self.writes += 1
+        if data is not None:
+            self._notify(FakeChangeType.REMOVED, doc_id, data)
+
+    def _notify(self, change_type, doc_id, data):
+        document = FakeSnapshot(FakeDocumentReference(self, doc_id), copy.deepcopy(data))
+        for watch in list(self.watches):
+            watch.deliver([FakeDocumentChange(change_type, document)])
+
+    def on_snapshot(self, callback):
+        watch = FakeWatch(self, callback)
+        self.watches.add(watch)
+        self.reads += len(self.docs)
+        watch.deliver([FakeDocumentChange(FakeChangeType.ADDED,
+                                          FakeSnapshot(FakeDocumentReference(self, doc_id), copy.deepcopy(data)))
+                       for doc_id, data in list(self.docs.items())])
+        return watch
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+        self._creates = []
+
+    def set(self, reference, data):
+        self._ops.append(lambda: reference.set(data))
+
+    def create(self, reference, data):
+        self._creates.append(reference)
+        self._ops.append(lambda: reference.set(data))
+
+    def update(self, reference, data):
+        self._ops.append(lambda: reference.update(data))
+
+    def delete(self, reference):
+        self._ops.append(reference.delete)
+
+    def commit(self):
+        if len(self._ops) > 500:
+            raise ValueError("Batch exceeds 500 operations")
+        # Như Firestore: batch là nguyên tử, create thất bại nếu tài liệu đã tồn tại
+        for reference in self._creates:
+            if reference.get().exists:
+                raise AlreadyExists(f"Document already exists: {reference.id}")
+        for op in self._ops:
+            op()
+        self._db.commits += 1
+        self._ops = []
+        self._creates = []
+
+
+class FakeFirestore:
+    def __init__(self):
+        self.collections = {}
+        self.commits = 0
+
+    def collection(self, name):
+        if name not in self.collections:
+            self.collections[name] = FakeCollection(name)
+        return self.collections[name]
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def get_all(self, references):
+        for reference in references:
+            yield reference.get()
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self._bucket = bucket
+        self.name = name
+        self.content_type = None
+        self.time_created = None
+        self.chunk_size = None
+        self.size = None
+
+    @property
+    def public_url(self):
+        return f"{self._bucket.base_url}/{self.name}"
+
+    def upload_from_file(self, file, content_type=None, predefined_acl=None, **kwargs):
+        self.upload_from_string(file.read(), content_type=content_type, predefined_acl=predefined_acl)
+
+    def upload_from_string(self, data, content_type=None, predefined_acl=None, **kwargs):
+        self.content_type = content_type
+        self.time_created = datetime.datetime.now(datetime.timezone.utc)
+        self.size = len(data)
+        self._bucket.store(self.name, bytes(data), self)
+        if predefined_acl == "publicRead":
+            self._bucket.public.add(self.name)
+
+    def make_public(self):
+        self._bucket.public.add(self.name)
+
+    def exists(self):
+        return self.name in self._bucket.objects
+
+    def delete(self):
+        if self.name in self._bucket.failing:
+            raise ConnectionError(f"Could not delete {self.name}")
+        with self._bucket._lock:
+            if self._bucket.objects.pop(self.name, None) is None:
+                raise NotFound(f"No such blob: {self.name}")
+            self._bucket.metadata.pop(self.name, None)
+
+
+class FakeBucket:
+    def __init__(self, base_url="http://127.0.0.1/fake-bucket"):
+        self.base_url = base_url
+        self.objects = {}
+        self.metadata = {}
+        self.public = set()
+        # Tên đối tượng mà thao tác xóa luôn lỗi (không phải NotFound)
+        self.failing = set()
+        self.list_calls = 0
+        self.client = None
+        self._lock = threading.Lock()
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+    def store(self, name, data, blob):
+        with self._lock:
+            self.objects[name] = data
+            self.metadata[name] = blob
+
+    def list_blobs(self, prefix=None, page_size=None):
+        # Như Bucket.list_blobs: duyệt theo thứ tự tên; page_size chỉ để đếm số lượt gọi
+        with self._lock:
+            names = sorted(name for name in self.metadata if prefix is None or name.startswith(prefix))
+            blobs = [self.metadata[name] for name in names]
+        self.list_calls += -(-len(blobs) // page_size) if page_size else 1
+        return iter(blobs)
+
+    def delete_blob(self, name):
+        # Trong `with client.batch()` thao tác được gom vào batch như Bucket.delete_blob
+        if self.client is not None and self.client.current_batch is not None:
+            self.client.current_batch.deferred.append(name)
+            return
+        self.blob(name).delete()
+
+    def delete_blobs(self, blobs, on_error=None):
+        for blob in blobs:
+            name = getattr(blob, "name", blob)
+            try:
+                self.blob(name).delete()
+            except NotFound:
+                if on_error is None:
+                    raise
+                on_error(self.blob(name))
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeStorageBatch:
+    # Như google.cloud.storage.batch.Batch: thao tác được gửi khi thoát khối
+    # with; mỗi thao tác con có một response trong _responses
+    def __init__(self, client, raise_exception=True):
+        self._client = client
+        self._raise_exception = raise_exception
+        self.deferred = []
+        self._responses = []
+
+    def __enter__(self):
+        self._client.current_batch = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._client.current_batch = None
+        if exc_type is not None:
+            return False
+        self._client.batches.append(list(self.deferred))
+        for name in self.deferred:
+            try:
+                self._client.bucket.blob(name).delete()
+            except NotFound:
+                status = 404
+            except ConnectionError:
+                status = 503
+            else:
+                status = 204
+            self._responses.append(FakeResponse(status))
+        failed = [r for r in self._responses if not 200 <= r.status_code < 300]
+        if failed and self._raise_exception:
+            raise NotFound("Batch request failed") if failed[0].status_code == 404 else ConnectionError("503")
+        return False
+
+
+class FakeStorageClient:
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.batches = []
+        self.current_batch = None
+        bucket.client = self
+
+    def batch(self, raise_exception=True):
+        return FakeStorageBatch(self, raise_exception)
+
+
+class _StaticHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        with self.server.lock:
+            self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+        delay = self.server.delays.get(self.path)
+        if delay:
+            time.sleep(delay)
+        status = self.server.statuses.get(self.path)
+        if status is not None:
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        data = self.server.files.get(self.path)
+        if data is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class LocalImageServer:
+    # Máy chủ HTTP cục bộ phục vụ ảnh chân dung mẫu thay cho Cloud Storage
+
+    def __init__(self, files=None):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _StaticHandler)
+        self._server.daemon_threads = True
+        self._server.files = dict(files or {})
+        # Độ trễ (giây) và mã trạng thái giả lập theo đường dẫn, số lần được gọi
+        self._server.delays = {}
+        self._server.statuses = {}
+        self._server.hits = {}
+        self._server.lock = threading.Lock()
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def add(self, path, data=b"", delay=None, status=None):
+        # status khác None: trả mã đó (vd. 404, 503) thay cho nội dung
+        key = "/" + path.lstrip("/")
+        self._server.files[key] = data
+        if delay:
+            self._server.delays[key] = delay
+        if status is not None:
+            self._server.statuses[key] = status
+        return f"{self.base_url}{key}"
+
+    def hits(self, path):
+        with self._server.lock:
+            return self._server.hits.get("/" + path.lstrip("/"), 0)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+# Bộ đo hiệu năng các đường xử lý chính, chạy hoàn toàn cục bộ:
+#   python -m benchmarks.run --students 400 --faces 60 -o bench.json
+#   python -m benchmarks.run --baseline bench.json   # báo hồi quy so với lần trước
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from benchmarks.fakes import FakeFirestore, LocalImageServer
+from core.ann_index import RosterIndex
+from core.class_detection import detect_class_faces
+from core.embeddings import (EMBEDDING_MODEL, EMBEDDING_VERSION, extract_features, face_crop,
+                             load_roster_features)
+from core.image_decode import CLASS_DECODE_SIZE, decode_image
+from core.matching import match_faces, match_faces_index
+from core.inference_backend import INFERENCE_THREADS, OPENCV, available_backends, ort
+from core.models import ModelManager
+from core.name_search import NamePrefixIndex, name_tokens, normalize_text, parse_name_query
+from core.recognition import process_class_image
+from core.rendering import face_sprite, render_annotated
+from core.student_repo import count_students, fetch_page
+
+SURNAMES = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ", "Hồ", "Ngô"]
+MIDDLE_NAMES = ["Văn", "Thị", "Hữu", "Đức", "Minh", "Ngọc", "Thanh", "Quốc"]
+GIVEN_NAMES = ["An", "Bình", "Chương", "Dũng", "Giang", "Hà", "Hải", "Hùng", "Khánh", "Linh",
+               "Long", "Mai", "Nam", "Phúc", "Quân", "Sơn", "Thảo", "Trang", "Tú", "Vy"]
+
+
+def measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "min_ms": samples[0],
+        "median_ms": statistics.median(samples),
+        "mean_ms": statistics.fmean(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(round(0.95 * (len(samples) - 1))))],
+        "repeat": repeat,
+    }
+
+
+class Suite:
+    def __init__(self, repeat, only=None):
+        self.repeat = repeat
+        self.only = only
+        self.results = []
+
+    def run(self, name, fn, params=None, repeat=None, warmup=1):
+        if self.only and not any(name.startswith(prefix) for prefix in self.only):
+            return
+        entry = {"name": name, "params": params or {}}
+        try:
+            entry.update(measure(fn, repeat or self.repeat, warmup))
+        except (FileNotFoundError, cv2.error) as e:
+            # Thiếu file mô hình hoặc OpenCV không hỗ trợ: ghi nhận là bỏ qua
+            entry["skipped"] = str(e).strip().splitlines()[0]
+        self.results.append(entry)
+        if "skipped" in entry:
+            print(f"{name:<40} skipped: {entry['skipped']}")
+        else:
+            print(f"{name:<40} median {entry['median_ms']:9.2f} ms   p95 {entry['p95_ms']:9.2f} ms")
+
+
+def random_name(rng):
+    return f"{rng.choice(SURNAMES)} {rng.choice(MIDDLE_NAMES)} {rng.choice(GIVEN_NAMES)}"
+
+
+def synthetic_photo(width, height, num_faces, rng, quality=90):
+    # Ảnh lớp học giả: nền nhiễu và các "khuôn mặt" hình elip xếp theo lưới.
+    # Trả về (bytes JPEG, danh sách khung (x, y, w, h)).
+    img = rng.integers(60, 200, size=(height // 8, width // 8, 3), dtype=np.uint8)
+    img = cv2.resize(img, (width, height), interpolation=cv2.INTER_LINEAR)
+    cols = max(1, int(np.ceil(np.sqrt(num_faces * width / height))))
+    rows = max(1, int(np.ceil(num_faces / cols)))
+    cell_w, cell_h = width // cols, height // rows
+    size = int(min(cell_w, cell_h) * 0.6)
+    boxes = []
+    for i in range(num_faces):
+        x = (i % cols) * cell_w + (cell_w - size) // 2
+        y = (i // cols) * cell_h + (cell_h - size) // 2
+        center = (x + size // 2, y + size // 2)
+        cv2.ellipse(img, center, (size // 2 - 2, size // 2), 0, 0, 360, (140, 170, 220), -1)
+        cv2.circle(img, (x + size // 3, y + size * 2 // 5), max(2, size // 12), (40, 40, 40), -1)
+        cv2.circle(img, (x + size * 2 // 3, y + size * 2 // 5), max(2, size // 12), (40, 40, 40), -1)
+        boxes.append((x, y, size, size))
+    ok, encoded = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes(), boxes
+
+
+def random_features(rng, count, dim=128):
+    features = rng.normal(size=(count, dim)).astype(np.float32)
+    return features / np.linalg.norm(features, axis=1, keepdims=True)
+
+
+def build_roster(db, server, num_students, stale_fraction, rng):
+    # Danh sách sinh viên giả trong Firestore giả; một phần không có embedding
+    # để đo đường tải ảnh chân dung qua HTTP và tính bù
+    students_ref = db.collection("Students")
+    features = random_features(rng, num_students)
+    portrait, _ = synthetic_photo(480, 640, 1, rng)
+    stale = set(rng.choice(num_students, int(num_students * stale_fraction), replace=False).tolist())
+    for i in range(num_students):
+        student_id = f"{21110000 + i}"
+        url = server.add(f"portraits/{student_id}.jpg", portrait)
+        name = random_name(rng)
+        record = {"Name": name, "TheSV": url, "ChanDung": url}
+        record.update(name_tokens(name))
+        if i not in stale:
+            record.update({"Embedding": features[i].tolist(), "EmbeddingModel": EMBEDDING_MODEL,
+                           "EmbeddingVersion": EMBEDDING_VERSION, "EmbeddingSource": url})
+        students_ref.document(student_id).set(record)
+    return students_ref, features
+
+
+def yunet_rows(boxes):
+    # Hàng kết quả dạng YuNet (khung + 5 điểm mốc ước lượng) cho alignCrop
+    rows = []
+    for x, y, w, h in boxes:
+        rows.append([x, y, w, h,
+                     x + 0.3 * w, y + 0.4 * h, x + 0.7 * w, y + 0.4 * h, x + 0.5 * w, y + 0.6 * h,
+                     x + 0.35 * w, y + 0.8 * h, x + 0.65 * w, y + 0.8 * h, 0.99])
+    return np.asarray(rows, dtype=np.float32)
+
+
+def legacy_name_search(students_ref, query):
+    normalized_search, is_search_by_last_name = parse_name_query(query)
+    found = []
+    for student in students_ref.stream():
+        name_parts = student.to_dict().get("Name", "").split()
+        if is_search_by_last_name:
+            if name_parts and normalize_text(name_parts[0]).startswith(normalized_search):
+                found.append(student.id)
+        elif name_parts and normalize_text(name_parts[-1]) == normalized_search:
+            found.append(student.id)
+    return found
+
+
+def run_benchmarks(args):
+    rng = np.random.default_rng(args.seed)
+    suite = Suite(args.repeat, args.only)
+    models = ModelManager(backend=args.backend, threads=args.threads or INFERENCE_THREADS, int8=args.int8)
+    width, height = args.photo_width, args.photo_height
+    photo, boxes = synthetic_photo(width, height, args.faces, rng)
+    params = {"width": width, "height": height, "faces": args.faces}
+
+    # Giải mã
+    def decode_full():
+        img = cv2.imdecode(np.frombuffer(photo, np.uint8), cv2.IMREAD_COLOR)
+        cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    suite.run("decode.full_rgb_gray", decode_full, params)
+    suite.run("decode.reduced_class", lambda: decode_image(photo, CLASS_DECODE_SIZE, need=("bgr", "rgb")), params)
+    suite.run("decode.reduced_1280_gray", lambda: decode_image(photo, 1280, need=("gray",)), params)
+
+    # Phát hiện
+    img = cv2.imdecode(np.frombuffer(photo, np.uint8), cv2.IMREAD_COLOR)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    def detect_haar():
+        with models.lease("haar") as cascade:
+            cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+
+    suite.run("detect.haar_full", detect_haar, params, repeat=max(1, args.repeat // 2))
+    suite.run("detect.yunet_downscaled", lambda: detect_class_faces(img, models, use_tiles=False), params)
+    suite.run("detect.yunet_tiled", lambda: detect_class_faces(img, models, use_tiles=True,
+                                                               workers=args.workers), params)
+
+    # alignCrop + feature từng khuôn mặt so với suy luận theo lô
+    rows = yunet_rows(boxes)
+
+    def align_feature_loop():
+        with models.lease("sface") as recognizer:
+            for row in rows:
+                recognizer.feature(recognizer.alignCrop(img_rgb, row))
+
+    def feature_batched():
+        crops = [face_crop(img_rgb, box) for box in boxes]
+        with models.lease("sface_net") as feature_net:
+            extract_features(feature_net, crops)
+
+    suite.run("embed.aligncrop_feature_loop", align_feature_loop, params)
+    suite.run("embed.crop_feature_batched", feature_batched, params)
+
+    # So khớp N sinh viên x M khuôn mặt
+    roster_features = random_features(rng, args.students)
+    face_features = random_features(rng, args.faces)
+    roster = [(str(i), str(i), roster_features[i:i + 1]) for i in range(args.students)]
+    class_features = [(None, face_features[i:i + 1]) for i in range(args.faces)]
+    match_params = {"students": args.students, "faces": args.faces}
+
+    def match_loop():
+        with models.lease("sface") as recognizer:
+            for _, _, student_feature in roster:
+                for _, class_feature in class_features:
+                    recognizer.match(student_feature, class_feature, cv2.FaceRecognizerSF_FR_COSINE)
+
+    if args.students * args.faces <= 100000:
+        suite.run("match.pairwise_loop", match_loop, match_params, repeat=max(1, args.repeat // 5))
+    suite.run("match.matrix", lambda: match_faces(class_features, roster, 0.3), match_params)
+    index = RosterIndex()
+    index.sync(roster)
+    suite.run("match.index", lambda: match_faces_index(class_features, index, 0.3), match_params)
+
+    # Hiển thị kết quả: vẽ trên bản sao đầy đủ (mảng RGB gửi nguyên) so với vẽ
+    # trên bản thu nhỏ rồi nén; số byte gửi lên trình duyệt ghi trong params
+    annotations = [(box, (0, 255, 0), "Nguyen Van An (0.87)") for box in boxes]
+    crops = [face_crop(img_rgb, box) for box in boxes]
+    render_params = dict(params, full_bytes=img_rgb.nbytes, crops_bytes=sum(crop.nbytes for crop in crops),
+                         preview_bytes=len(render_annotated(img_rgb, annotations)),
+                         sprite_bytes=len(face_sprite(img_rgb, boxes)))
+
+    def annotate_full():
+        annotated = img_rgb.copy()
+        for (x, y, w, h), color, _ in annotations:
+            cv2.rectangle(annotated, (x, y), (x + w, y + h), color, 2)
+
+    suite.run("render.annotate_full", annotate_full, render_params)
+    suite.run("render.annotate_preview", lambda: render_annotated(img_rgb, annotations), render_params)
+    suite.run("render.face_sprite", lambda: face_sprite(img_rgb, boxes), render_params)
+
+    # Bảng sinh viên và tìm kiếm tên trên Firestore giả
+    with LocalImageServer() as server:
+        db = FakeFirestore()
+        students_ref, _ = build_roster(db, server, args.students, args.stale_fraction, rng)
+        table_params = {"students": args.students, "page_size": args.page_size}
+
+        suite.run("table.full_collection", lambda: students_ref.get(), table_params)
+        suite.run("table.page_and_count", lambda: (fetch_page(students_ref, args.page_size),
+                                                   count_students(students_ref)), table_params)
+
+        queries = ["Nguy", "Hoàng", "#Chương", "#An", "Đ"]
+        suite.run("search.legacy_scan", lambda: [legacy_name_search(students_ref, q) for q in queries],
+                  {"students": args.students, "queries": len(queries)})
+        name_index = NamePrefixIndex()
+        suite.run("search.index_load", lambda: name_index.load(students_ref, db), {"students": args.students},
+                  repeat=1, warmup=0)
+        suite.run("search.index_lookup", lambda: [name_index.lookup(*parse_name_query(q)) for q in queries],
+                  {"students": args.students, "queries": len(queries)})
+
+        # Toàn bộ luồng nhận diện lớp học
+        def end_to_end():
+            _, _, class_feats, _ = process_class_image(photo, models)
+            with models.lease("yunet") as detector, models.lease("sface_net") as feature_net:
+                roster_now = load_roster_features(students_ref.get(), detector, feature_net)
+            roster_index = RosterIndex()
+            roster_index.sync(roster_now)
+            match_faces_index(class_feats, roster_index, 0.3)
+
+        e2e_params = dict(params, students=args.students, stale_fraction=args.stale_fraction)
+        # Lần đầu còn embedding lỗi thời (tải ảnh + tính bù), các lần sau dùng embedding đã lưu
+        suite.run("e2e.class_recognition_cold", end_to_end, e2e_params, repeat=1, warmup=0)
+        suite.run("e2e.class_recognition_warm", end_to_end, e2e_params)
+
+    return suite.results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "pillow": Image.__version__,
+        "onnxruntime": ort.__version__ if ort is not None else None,
+        "cpu_count": __import__("os").cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def compare(results, baseline, tolerance):
+    # Trả về danh sách các phép đo chậm hơn baseline quá tolerance (tỉ lệ)
+    previous = {r["name"]: r for r in baseline.get("results", []) if "median_ms" in r}
+    regressions = []
+    for result in results:
+        before = previous.get(result["name"])
+        if before is None or "median_ms" not in result or before["params"] != result["params"]:
+            continue
+        ratio = result["median_ms"] / max(before["median_ms"], 1e-9)
+        if ratio > 1 + tolerance:
+            regressions.append({"name": result["name"], "before_ms": before["median_ms"],
+                                "after_ms": result["median_ms"], "ratio": ratio})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo hiệu năng các đường xử lý chính")
+    parser.add_argument("--students", type=int, default=400)
+    parser.add_argument("--faces", type=int, default=60)
+    parser.add_argument("--photo-width", type=int, default=4000)
+    parser.add_argument("--photo-height", type=int, default=3000)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--stale-fraction", type=float, default=0.1,
+                        help="Tỉ lệ sinh viên chưa có embedding (đo đường tải ảnh chân dung)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--backend", choices=available_backends(), default=OPENCV, help="Backend suy luận YuNet/SFace")
+    parser.add_argument("--threads", type=int, default=None, help="Số luồng suy luận (mặc định theo số CPU)")
+    parser.add_argument("--int8", action="store_true", help="Dùng bản mô hình lượng tử int8 nếu có")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="*", help="Chỉ chạy các phép đo có tên bắt đầu bằng các tiền tố này")
+    parser.add_argument("-o", "--output", help="Ghi kết quả JSON ra file")
+    parser.add_argument("--baseline", help="File JSON kết quả trước đó để so sánh")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Mức chậm hơn cho phép so với baseline")
+    args = parser.parse_args(argv)
+
+    report = {"environment": environment(), "args": vars(args), "results": run_benchmarks(args)}
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["regressions"] = compare(report["results"], json.load(f), args.tolerance)
+        for regression in report["regressions"]:
+            print(f"REGRESSION {regression['name']}: {regression['before_ms']:.2f} -> "
+                  f"{regression['after_ms']:.2f} ms (x{regression['ratio']:.2f})")
+        exit_code = 1 if report["regressions"] else 0
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+import threading
+
+import numpy as np
+
+from core.matching import l2_normalize
+
+# Dưới ngưỡng này tìm kiếm vét cạn vẫn nhanh và chính xác tuyệt đối
+EXACT_SEARCH_THRESHOLD = 2000
+# Số cụm được dò khi tìm kiếm: càng lớn càng chính xác nhưng càng chậm
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_SIZE = 20000
+
+
+class RosterIndex:
+    # Chỉ mục IVF (inverted file) trên các feature SFace 128 chiều đã chuẩn hóa.
+    # Các vector được chia vào nlist cụm bằng k-means cầu; khi tìm kiếm chỉ
+    # chấm điểm những vector nằm trong nprobe cụm gần truy vấn nhất.
+    # Danh sách nhỏ (dưới EXACT_SEARCH_THRESHOLD) luôn được tìm vét cạn.
+
+    def __init__(self, dim=128, exact_threshold=EXACT_SEARCH_THRESHOLD, nprobe=DEFAULT_NPROBE, seed=0):
+        self.dim = dim
+        self.exact_threshold = exact_threshold
+        self.nprobe = nprobe
+        self.loaded = False
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.RLock()
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._ids = []
+        self._names = []
+        self._row_of = {}
+        self._free_rows = []
+        self._centroids = None
+        self._list_of_row = np.zeros(0, dtype=np.int32)
+        self._lists = []
+        self._list_arrays = {}
+        self._trained_size = 0
+
+    def __len__(self):
+        return len(self._row_of)
+
+    def __contains__(self, student_id):
+        return student_id in self._row_of
+
+    def _allocate_row(self):
+        if self._free_rows:
+            return self._free_rows.pop()
+        row = len(self._ids)
+        if row >= len(self._vectors):
+            capacity = max(64, len(self._vectors) * 2)
+            vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+            vectors[:len(self._vectors)] = self._vectors
+            self._vectors = vectors
+            list_of_row = np.full(capacity, -1, dtype=np.int32)
+            list_of_row[:len(self._list_of_row)] = self._list_of_row
+            self._list_of_row = list_of_row
+        self._ids.append(None)
+        self._names.append(None)
+        return row
+
+    def _assign_to_list(self, row):
+        if self._centroids is None:
+            return
+        list_id = int(np.argmax(self._centroids @ self._vectors[row]))
+        self._list_of_row[row] = list_id
+        self._lists[list_id].add(row)
+        self._list_arrays.pop(list_id, None)
+
+    def _remove_from_list(self, row):
+        list_id = self._list_of_row[row]
+        if list_id >= 0:
+            self._lists[list_id].discard(row)
+            self._list_arrays.pop(list_id, None)
+            self._list_of_row[row] = -1
+
+    def upsert(self, student_id, name, feature):
+        if feature is None:
+            self.delete(student_id)
+            return
+        vector = l2_normalize(np.asarray(feature, dtype=np.float32).reshape(1, -1))[0]
+        with self._lock:
+            row = self._row_of.get(student_id)
+            if row is None:
+                row = self._allocate_row()
+                self._row_of[student_id] = row
+            else:
+                self._remove_from_list(row)
+            self._vectors[row] = vector
+            self._ids[row] = student_id
+            self._names[row] = name
+            self._assign_to_list(row)
+            self._maybe_retrain()
+
+    def delete(self, student_id):
+        with self._lock:
+            row = self._row_of.pop(student_id, None)
+            if row is None:
+                return
+            self._remove_from_list(row)
+            self._vectors[row] = 0.0
+            self._ids[row] = None
+            self._names[row] = None
+            self._free_rows.append(row)
+
+    def rename(self, old_id, new_id, name=None):
+        # Đổi ID sinh viên mà không cần tính lại vector
+        with self._lock:
+            row = self._row_of.pop(old_id, None)
+            if row is None:
+                return
+            self._row_of[new_id] = row
+            self._ids[row] = new_id
+            if name is not None:
+                self._names[row] = name
+
+    def sync(self, roster):
+        # Đồng bộ toàn bộ từ danh sách (id, tên, feature): thêm/sửa/xóa cho khớp
+        with self._lock:
+            seen = set()
+            for student_id, name, feature in roster:
+                seen.add(student_id)
+                self.upsert(student_id, name, feature)
+            for student_id in [s for s in self._row_of if s not in seen]:
+                self.delete(student_id)
+            self.loaded = True
+
+    def _live_rows(self):
+        return np.fromiter(self._row_of.values(), dtype=np.int64, count=len(self._row_of))
+
+    def _maybe_retrain(self):
+        size = len(self._row_of)
+        if size < self.exact_threshold:
+            return
+        if self._centroids is None or size >= 2 * self._trained_size:
+            self.train()
+
+    def train(self):
+        with self._lock:
+            rows = self._live_rows()
+            if len(rows) == 0:
+                return
+            nlist = max(1, int(4 * np.sqrt(len(rows))))
+            sample = rows
+            if len(sample) > KMEANS_SAMPLE_SIZE:
+                sample = self._rng.choice(rows, KMEANS_SAMPLE_SIZE, replace=False)
+            data = self._vectors[sample]
+            nlist = min(nlist, len(data))
+            centroids = data[self._rng.choice(len(data), nlist, replace=False)]
+            for _ in range(KMEANS_ITERATIONS):
+                assign = np.argmax(data @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, data)
+                empty = np.bincount(assign, minlength=nlist) == 0
+                sums[empty] = centroids[empty]
+                centroids = l2_normalize(sums)
+
+            self._centroids = centroids
+            self._lists = [set() for _ in range(nlist)]
+            self._list_arrays = {}
+            self._list_of_row[:] = -1
+            assign = np.argmax(self._vectors[rows] @ centroids.T, axis=1)
+            for row, list_id in zip(rows, assign):
+                self._list_of_row[row] = list_id
+                self._lists[list_id].add(int(row))
+            self._trained_size = len(rows)
+
+    def _list_array(self, list_id):
+        array = self._list_arrays.get(list_id)
+        if array is None:
+            array = np.fromiter(self._lists[list_id], dtype=np.int64, count=len(self._lists[list_id]))
+            self._list_arrays[list_id] = array
+        return array
+
+    def _top_k(self, rows, scores, k):
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            rows, scores = rows[top], scores[top]
+        order = np.argsort(-scores)
+        return [(self._ids[r], self._names[r], float(s)) for r, s in zip(rows[order], scores[order])]
+
+    def search(self, queries, k=5, nprobe=None):
+        # queries: M x 128. Trả về với mỗi truy vấn danh sách (id, tên, điểm cosine)
+        # giảm dần. nprobe = None dùng giá trị mặc định của chỉ mục.
+        queries = l2_normalize(np.asarray(queries, dtype=np.float32).reshape(-1, self.dim))
+        nprobe = self.nprobe if nprobe is None else nprobe
+        with self._lock:
+            rows = self._live_rows()
+            if len(rows) == 0:
+                return [[] for _ in queries]
+            exact = (self._centroids is None or len(rows) < self.exact_threshold
+                     or nprobe >= len(self._centroids))
+            if exact:
+                scores = queries @ self._vectors[rows].T
+                return [self._top_k(rows, row_scores, k) for row_scores in scores]
+
+            probe = min(nprobe, len(self._centroids))
+            centroid_scores = queries @ self._centroids.T
+            probe_lists = np.argpartition(-centroid_scores, probe - 1, axis=1)[:, :probe]
+            results = []
+            for query, lists in zip(queries, probe_lists):
+                candidates = np.concatenate([self._list_array(int(l)) for l in lists])
+                if len(candidates) == 0:
+                    results.append([])
+                    continue
+                results.append(self._top_k(candidates, self._vectors[candidates] @ query, k))
+            return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_roster_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = RosterIndex()
+        return _index
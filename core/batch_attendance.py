@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import cv2
+
+from core.matching import DEFAULT_TOP_K, similarity_matrix, stack_features, top_k_matches
+from core.roster_store import DEFAULT_DTYPE, STORE_DIR, STORE_DTYPES, RosterStore
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+RESULT_FIELDS = ["image", "face", "x", "y", "w", "h", "student_id", "student_name", "score"]
+DEFAULT_THRESHOLD = 0.3
+
+# Trạng thái riêng của mỗi tiến trình con, khởi tạo một lần trong _init_worker
+_worker = {}
+
+
+def find_images(paths):
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(root, name)
+
+
+def load_roster(credentials_path=None):
+    # Đọc danh sách sinh viên một lần ở tiến trình cha; embedding thiếu được tính bù
+    from core.embeddings import load_roster_features
+    from core.firebase_client import init_firebase, load_credentials_info
+    from core.models import get_model_manager
+
+    db, _ = init_firebase(load_credentials_info(credentials_path))
+    students = db.collection("Students").get()
+    models = get_model_manager()
+    with models.lease("yunet") as detector, models.lease("sface_net") as feature_net:
+        roster = load_roster_features(students, detector, feature_net)
+    labels = [(student_id, name) for student_id, name, _ in roster]
+    return labels, stack_features([feature for _, _, feature in roster])
+
+
+def _init_worker(labels, roster_matrix, threshold, top_k, detect_options, roster_store=None):
+    from core.models import ModelManager
+
+    # Mỗi tiến trình dùng một luồng suy luận để không tranh CPU với nhau
+    _worker["models"] = ModelManager(threads=1)
+    _worker["labels"] = labels
+    _worker["roster_matrix"] = roster_matrix
+    _worker["roster_store"] = None
+    if roster_store is not None:
+        # Ánh xạ snapshot trên đĩa thay vì nhận bản sao ma trận qua pickle;
+        # các tiến trình dùng chung trang bộ nhớ của file
+        _worker["roster_store"] = RosterStore(*roster_store)
+        _worker["roster_store"].refresh()
+    _worker["threshold"] = threshold
+    _worker["top_k"] = top_k
+    _worker["detect_options"] = detect_options
+
+
+def _process_image(path):
+    from core.recognition import process_class_image
+
+    try:
+        with open(path, "rb") as f:
+            image_data = f.read()
+        _, faces, face_features, decoded = process_class_image(
+            image_data, _worker["models"], **_worker["detect_options"])
+    except (OSError, ValueError, cv2.error) as e:
+        return path, [], str(e)
+
+    face_matrix = stack_features([feature for _, feature in face_features])
+    if _worker["roster_store"] is not None:
+        face_matches = _worker["roster_store"].match(face_matrix, _worker["threshold"], _worker["top_k"])
+    else:
+        scores = similarity_matrix(face_matrix, _worker["roster_matrix"])
+        face_matches = top_k_matches(scores, _worker["labels"], _worker["threshold"], _worker["top_k"])
+    rows = []
+    for i, (face, matches) in enumerate(zip(decoded.to_original(faces), face_matches)):
+        x, y, w, h = face
+        row = {"image": path, "face": i, "x": x, "y": y, "w": w, "h": h,
+               "student_id": "", "student_name": "", "score": ""}
+        if matches:
+            (student_id, student_name), score = matches[0]
+            row.update(student_id=student_id, student_name=student_name, score=round(score, 4))
+        rows.append(row)
+    return path, rows, None
+
+
+class ResultWriter:
+    # Ghi nối tiếp kết quả ra CSV hoặc JSON Lines (.json/.jsonl), mỗi ảnh ghi xong là flush
+
+    def __init__(self, path):
+        self.is_json = path.lower().endswith((".json", ".jsonl"))
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", newline="", encoding="utf-8")
+        if not self.is_json:
+            self._csv = csv.DictWriter(self._file, fieldnames=RESULT_FIELDS)
+            if new_file:
+                self._csv.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            if self.is_json:
+                self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            else:
+                self._csv.writerow(row)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def discard_unmarked_rows(path, done):
+    # Kết quả được ghi trước khi ảnh được đánh dấu trong checkpoint: nếu bị ngắt
+    # giữa hai bước (hoặc giữa lúc ghi), các dòng của ảnh đó đã có trong file
+    # nhưng ảnh sẽ được xử lý lại. Bỏ các dòng của ảnh chưa có trong checkpoint
+    # (kể cả dòng ghi dở) trước khi chạy tiếp; trả về số dòng đã bỏ.
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return 0
+    is_json = path.lower().endswith((".json", ".jsonl"))
+    with open(path, newline="", encoding="utf-8") as f:
+        if is_json:
+            lines = f.read().splitlines(keepends=True)
+            kept = []
+            for line in lines:
+                try:
+                    image = json.loads(line).get("image")
+                except ValueError:
+                    image = None
+                if image in done and line.endswith("\n"):
+                    kept.append(line)
+            dropped = len(lines) - len(kept)
+        else:
+            rows = list(csv.DictReader(f))
+            kept = [row for row in rows if row.get("image") in done and None not in row.values()
+                    and None not in row]
+            dropped = len(rows) - len(kept)
+    if not dropped:
+        return 0
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        if is_json:
+            f.writelines(kept)
+        else:
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+            writer.writerows(kept)
+    os.replace(tmp_path, path)
+    logger.info("Discarded %d result rows of images missing from the checkpoint", dropped)
+    return dropped
+
+
+class Checkpoint:
+    # Danh sách ảnh đã xử lý xong, để chạy tiếp sau khi bị ngắt
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.done = {line.rstrip("\n") for line in f if line.strip()}
+        self._file = open(path, "a", encoding="utf-8")
+
+    def mark(self, image_path):
+        self._file.write(image_path + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done.add(image_path)
+
+    def close(self):
+        self._file.close()
+
+
+def run(images, output, checkpoint_path, labels, roster_matrix, workers=None,
+        threshold=DEFAULT_THRESHOLD, top_k=DEFAULT_TOP_K, detect_options=None, roster_store=None):
+    # Chia ảnh cho pool tiến trình; kết quả được ghi ngay khi từng ảnh xong.
+    # roster_store: (thư mục, dtype) của RosterStore, thay cho labels/roster_matrix
+    detect_options = dict(detect_options or {}, workers=1)
+    checkpoint = Checkpoint(checkpoint_path)
+    discard_unmarked_rows(output, checkpoint.done)
+    writer = ResultWriter(output)
+    pending_images = (path for path in images if path not in checkpoint.done)
+    processed = failed = 0
+    workers = workers or os.cpu_count() or 1
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(labels, roster_matrix, threshold, top_k, detect_options, roster_store)) as executor:
+            pending = set()
+
+            def submit_next():
+                for path in pending_images:
+                    pending.add(executor.submit(_process_image, path))
+                    return True
+                return False
+
+            while len(pending) < workers * 2 and submit_next():
+                pass
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    submit_next()
+                    path, rows, error = future.result()
+                    if error is not None:
+                        # Không ghi checkpoint để lần chạy sau thử lại ảnh lỗi
+                        logger.warning("Skipping %s: %s", path, error)
+                        failed += 1
+                        continue
+                    writer.write(rows)
+                    checkpoint.mark(path)
+                    processed += 1
+    finally:
+        writer.close()
+        checkpoint.close()
+    return processed, failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Điểm danh hàng loạt từ các thư mục ảnh lớp học")
+    parser.add_argument("inputs", nargs="+", help="Thư mục hoặc file ảnh lớp học")
+    parser.add_argument("-o", "--output", required=True, help="File kết quả .csv hoặc .jsonl")
+    parser.add_argument("--checkpoint", help="File checkpoint (mặc định: <output>.checkpoint)")
+    parser.add_argument("--workers", type=int, default=None, help="Số tiến trình (mặc định: số CPU)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Ngưỡng nhận dạng")
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--credentials", help="File JSON service account (mặc định: secrets.toml)")
+    parser.add_argument("--roster-store", nargs="?", const=STORE_DIR, metavar="DIR",
+                        help="So khớp trên snapshot embedding cục bộ (tạo từ Firestore nếu chưa có)")
+    parser.add_argument("--store-dtype", choices=STORE_DTYPES, default=DEFAULT_DTYPE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    roster_store = None
+    if args.roster_store:
+        store = RosterStore(args.roster_store, args.store_dtype)
+        if not store.refresh() or not store.complete:
+            labels, roster_matrix = load_roster(args.credentials)
+            store.sync([(student_id, name, roster_matrix[i]) for i, (student_id, name) in enumerate(labels)])
+        logger.info("Mapped %d students from %s", store.size, store.path)
+        labels = roster_matrix = None
+        roster_store = (args.roster_store, args.store_dtype)
+    else:
+        labels, roster_matrix = load_roster(args.credentials)
+        logger.info("Loaded %d students", len(labels))
+    processed, failed = run(find_images(args.inputs), args.output, args.checkpoint or args.output + ".checkpoint",
+                            labels, roster_matrix, args.workers, args.threshold, args.top_k,
+                            roster_store=roster_store)
+    print(f"Đã xử lý {processed} ảnh, lỗi {failed} ảnh")
+    return 0 if failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+import argparse
+import csv
+import datetime
+import heapq
+import logging
+import re
+import sys
+import threading
+import time
+from urllib.parse import unquote
+
+from core.thumbnails import IMAGE_FIELDS, THUMBNAIL_EXTENSION, THUMBNAIL_SIZES, thumbnail_field
+from core.tracing import span, traced
+
+logger = logging.getLogger(__name__)
+
+# Chỉ xóa đối tượng tạo trước thời điểm này: ảnh vừa tải lên có thể chưa kịp
+# được ghi vào Firestore
+GC_GRACE_SECONDS = 24 * 60 * 60
+# Ảnh cũ do sửa/xóa sinh viên được giữ thêm một lúc cho các phiên đang hiển thị
+CLEANUP_DELAY_SECONDS = 10 * 60
+LIST_PAGE_SIZE = 1000
+# Số đối tượng mỗi lượt xóa (một request batch của Storage, tối đa 100 thao
+# tác) và thời gian nghỉ giữa các lượt
+DELETE_BATCH_SIZE = 100
+STORAGE_BATCH_LIMIT = 100
+DELETE_INTERVAL_SECONDS = 1.0
+URL_FIELDS = IMAGE_FIELDS + tuple(thumbnail_field(field, size) for field in IMAGE_FIELDS for size in THUMBNAIL_SIZES)
+# Chỉ đối tượng do ứng dụng tải lên mới được xóa: <uuid4>.<đuôi> (ảnh gốc) và
+# <uuid4>_<cỡ>.<đuôi bản thu nhỏ>; mọi đối tượng khác trong bucket được bỏ qua
+APP_BLOB_PATTERN = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+    rf"(\.[A-Za-z0-9]+|_({'|'.join(str(size) for size in THUMBNAIL_SIZES)})\.{THUMBNAIL_EXTENSION})")
+
+
+def image_urls(student_data):
+    # URL ảnh gốc và các bản thu nhỏ của một sinh viên
+    return [student_data[field] for field in URL_FIELDS if student_data.get(field)]
+
+
+def is_app_blob(name):
+    return APP_BLOB_PATTERN.fullmatch(name) is not None
+
+
+def blob_name(bucket, url):
+    # Tên đối tượng từ public URL của bucket; None nếu URL không thuộc bucket
+    prefix = bucket.blob("x").public_url[:-1]
+    if not url or not url.startswith(prefix):
+        return None
+    return unquote(url[len(prefix):])
+
+
+def _delete_each(bucket, names):
+    # Xóa từng đối tượng một; trả về (đã xóa, không còn tồn tại, lỗi)
+    from google.api_core.exceptions import NotFound
+
+    deleted = missing = failed = 0
+    for name in names:
+        try:
+            bucket.blob(name).delete()
+        except NotFound:
+            missing += 1
+        except Exception as e:
+            logger.warning("Could not delete blob %s: %s", name, e)
+            failed += 1
+        else:
+            deleted += 1
+    return deleted, missing, failed
+
+
+def _delete_batch(bucket, names):
+    # Xóa một lượt trong một request batch của Storage và đọc kết quả của từng
+    # thao tác con; trả về (đã xóa, không còn tồn tại, lỗi). Bucket không có
+    # client (vd. bản giả lập) hoặc google-cloud-storage cũ (batch không có
+    # raise_exception, một thao tác lỗi làm mất kết quả của cả lượt) thì xóa
+    # từng đối tượng.
+    client = getattr(bucket, "client", None)
+    if client is None:
+        return _delete_each(bucket, names)
+    try:
+        batch = client.batch(raise_exception=False)
+    except TypeError:
+        return _delete_each(bucket, names)
+    with batch:
+        for name in names:
+            bucket.delete_blob(name)
+    statuses = [response.status_code for response in batch._responses]
+    deleted = sum(1 for status in statuses if 200 <= status < 300)
+    missing = sum(1 for status in statuses if status == 404)
+    failed = len(names) - deleted - missing
+    if failed:
+        logger.warning("Could not delete %d of %d blobs (statuses %s)", failed, len(names),
+                       sorted(set(status for status in statuses if status != 404 and not 200 <= status < 300)))
+    return deleted, missing, failed
+
+
+def delete_in_batches(bucket, names, batch_size=DELETE_BATCH_SIZE, interval=DELETE_INTERVAL_SECONDS,
+                      stop=None):
+    # Xóa theo từng lượt (mỗi lượt một request batch), nghỉ giữa các lượt để
+    # không dồn request lên Storage.
+    # Trả về (số đã xóa, số không còn tồn tại, số lỗi).
+    stop = stop or threading.Event()
+    batch_size = max(1, min(batch_size, STORAGE_BATCH_LIMIT))
+    deleted = missing = failed = 0
+    for start in range(0, len(names), batch_size):
+        if start and stop.wait(interval):
+            break
+        chunk = names[start:start + batch_size]
+        try:
+            with span("storage.delete_batch", size=len(chunk)):
+                chunk_deleted, chunk_missing, chunk_failed = _delete_batch(bucket, chunk)
+        except Exception as e:
+            # Cả request batch thất bại
+            logger.warning("Could not delete %d blobs: %s", len(chunk), e)
+            failed += len(chunk)
+            continue
+        deleted += chunk_deleted
+        missing += chunk_missing
+        failed += chunk_failed
+    return deleted, missing, failed
+
+
+@traced("blob_gc.reconcile")
+def reconcile(db, bucket, grace_seconds=GC_GRACE_SECONDS, dry_run=True, prefix=None,
+              batch_size=DELETE_BATCH_SIZE, interval=DELETE_INTERVAL_SECONDS):
+    # Tìm các đối tượng do ứng dụng tải lên (is_app_blob) không còn được sinh
+    # viên nào tham chiếu; đối tượng khác trong bucket không bao giờ bị xóa.
+    # Liệt kê bucket trước rồi mới đọc Students, để ảnh được ghi vào Firestore
+    # trong lúc liệt kê vẫn được tính là đang dùng. Trả về (báo cáo, orphans),
+    # orphans là [(tên, kích thước, thời điểm tạo)].
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=grace_seconds)
+    blobs = []
+    foreign = 0
+    with span("storage.list_blobs"):
+        for blob in bucket.list_blobs(prefix=prefix, page_size=LIST_PAGE_SIZE):
+            if not is_app_blob(blob.name):
+                foreign += 1
+                continue
+            blobs.append((blob.name, blob.size or 0, blob.time_created))
+
+    referenced = set()
+    with span("firestore.get_all_students"):
+        for student in db.collection("Students").select(list(URL_FIELDS)).stream():
+            for url in image_urls(student.to_dict()):
+                name = blob_name(bucket, url)
+                if name is not None:
+                    referenced.add(name)
+
+    orphans = [blob for blob in blobs if blob[0] not in referenced]
+    # Không rõ thời điểm tạo: coi như còn trong thời gian chờ, không xóa
+    expired = [blob for blob in orphans if blob[2] is not None and blob[2] < cutoff]
+    report = {
+        "listed": len(blobs) + foreign,
+        "foreign": foreign,
+        "referenced": len(referenced),
+        "orphans": len(orphans),
+        "orphan_bytes": sum(size for _, size, _ in orphans),
+        "within_grace": len(orphans) - len(expired),
+        "deleted": 0,
+        "missing": 0,
+        "failed": 0,
+        "dry_run": dry_run,
+    }
+    if not dry_run and expired:
+        report["deleted"], report["missing"], report["failed"] = delete_in_batches(
+            bucket, [name for name, _, _ in expired], batch_size, interval)
+    logger.info("Blob reconciliation: %s", report)
+    return report, orphans
+
+
+class BlobCleanupQueue:
+    # Hàng đợi xóa ảnh cũ khi sinh viên được sửa ảnh hoặc bị xóa. Mỗi đối tượng
+    # được xóa sau CLEANUP_DELAY_SECONDS bởi một luồng nền, theo lượt có giới
+    # hạn tốc độ. Hàng đợi chỉ nằm trong bộ nhớ: mục bị mất khi khởi động lại sẽ
+    # được reconcile() dọn sau.
+
+    def __init__(self, bucket, delay=CLEANUP_DELAY_SECONDS, batch_size=DELETE_BATCH_SIZE,
+                 interval=DELETE_INTERVAL_SECONDS):
+        self.bucket = bucket
+        self.delay = delay
+        self.batch_size = batch_size
+        self.interval = interval
+        self._heap = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.stats = {"queued": 0, "deleted": 0, "missing": 0, "failed": 0}
+
+    def enqueue_urls(self, urls):
+        names = [name for name in (blob_name(self.bucket, url) for url in urls)
+                 if name is not None and is_app_blob(name)]
+        self.enqueue(names)
+
+    def enqueue(self, names):
+        if not names:
+            return
+        due = time.monotonic() + self.delay
+        with self._lock:
+            for name in names:
+                heapq.heappush(self._heap, (due, name))
+            self.stats["queued"] += len(names)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="blob-cleanup", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _take_due(self):
+        now = time.monotonic()
+        with self._lock:
+            names = []
+            while self._heap and self._heap[0][0] <= now and len(names) < self.batch_size:
+                names.append(heapq.heappop(self._heap)[1])
+            next_due = self._heap[0][0] - now if self._heap else None
+        return names, next_due
+
+    def _run(self):
+        while not self._stop.is_set():
+            names, next_due = self._take_due()
+            if names:
+                deleted, missing, failed = delete_in_batches(self.bucket, names, self.batch_size, self.interval,
+                                                             self._stop)
+                with self._lock:
+                    self.stats["deleted"] += deleted
+                    self.stats["missing"] += missing
+                    self.stats["failed"] += failed
+                self._stop.wait(self.interval)
+                continue
+            self._wake.clear()
+            self._wake.wait(next_due)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def report(self):
+        with self._lock:
+            return dict(self.stats, pending=len(self._heap))
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_cleanup_queue(bucket):
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = BlobCleanupQueue(bucket)
+    return _queue
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dọn các ảnh trong Storage không còn sinh viên nào dùng")
+    parser.add_argument("--credentials", help="File JSON service account (mặc định: secrets.toml)")
+    parser.add_argument("--delete", action="store_true", help="Xóa thật (mặc định chỉ báo cáo)")
+    parser.add_argument("--grace-hours", type=float, default=GC_GRACE_SECONDS / 3600,
+                        help="Chỉ xóa ảnh tạo trước số giờ này")
+    parser.add_argument("--prefix", help="Chỉ xét các đối tượng có tiền tố này")
+    parser.add_argument("--batch-size", type=int, default=DELETE_BATCH_SIZE)
+    parser.add_argument("--interval", type=float, default=DELETE_INTERVAL_SECONDS,
+                        help="Số giây nghỉ giữa các lượt xóa")
+    parser.add_argument("-o", "--output", help="Ghi danh sách ảnh không dùng ra file .csv")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    from core.firebase_client import init_firebase, load_credentials_info
+
+    db, bucket = init_firebase(load_credentials_info(args.credentials))
+    report, orphans = reconcile(db, bucket, args.grace_hours * 3600, dry_run=not args.delete, prefix=args.prefix,
+                                batch_size=args.batch_size, interval=args.interval)
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["name", "size", "time_created"])
+            for name, size, created in orphans:
+                writer.writerow([name, size, created.isoformat() if created else ""])
+    print(f"{report['listed']} đối tượng ({report['foreign']} không do ứng dụng tạo, bỏ qua), "
+          f"{report['orphans']} không dùng "
+          f"({report['orphan_bytes'] / (1024 * 1024):.1f} MB), {report['within_grace']} còn trong thời gian chờ, "
+          f"đã xóa {report['deleted']}, không còn tồn tại {report['missing']}, lỗi {report['failed']}")
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
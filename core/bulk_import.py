@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+import argparse
+import csv
+import io
+import logging
+import os
+import sys
+import zipfile
+
+from google.api_core.exceptions import AlreadyExists
+
+from core.embeddings import detect_portrait_face, embedding_fields, extract_features
+from core.name_search import name_tokens
+from core.tracing import span, traced
+from core.uploads import UploadError, start_uploads
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ("ID", "Name", "TheSV", "ChanDung")
+IMAGE_COLUMNS = ("TheSV", "ChanDung")
+# Giới hạn của Firestore: tối đa 500 thao tác trong một WriteBatch
+BATCH_LIMIT = 500
+# Số dòng xử lý cùng lúc (tải ảnh, tính embedding) trước khi ghi Firestore
+IMPORT_CHUNK_SIZE = 100
+# Kích thước tối đa của một ảnh trong file zip sau khi giải nén
+MAX_MEMBER_BYTES = 50 * 1024 * 1024
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+
+def read_csv_rows(csv_data):
+    # Trả về [(số dòng, {cột: giá trị})]; số dòng tính cả dòng tiêu đề
+    text = csv_data.decode("utf-8-sig") if isinstance(csv_data, bytes) else csv_data
+    reader = csv.DictReader(io.StringIO(text))
+    missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"File CSV thiếu cột: {', '.join(missing)}")
+    return [(line, {k: (v or "").strip() for k, v in row.items() if k}) for line, row in enumerate(reader, start=2)]
+
+
+class ImageArchive:
+    # Ảnh trong file zip, tra theo tên file (không phân biệt hoa thường,
+    # bỏ qua thư mục); chỉ giải nén ảnh khi cần
+
+    def __init__(self, zip_data):
+        self._zip = zipfile.ZipFile(io.BytesIO(zip_data) if isinstance(zip_data, bytes) else zip_data)
+        self._members = {}
+        for info in self._zip.infolist():
+            if not info.is_dir():
+                self._members[os.path.basename(info.filename).lower()] = info
+
+    def __contains__(self, file_name):
+        return os.path.basename(file_name).lower() in self._members
+
+    def read(self, file_name):
+        info = self._members[os.path.basename(file_name).lower()]
+        if info.file_size > MAX_MEMBER_BYTES:
+            raise ValueError(f"Ảnh {file_name} quá lớn")
+        return self._zip.read(info)
+
+
+def validate_rows(rows, archive):
+    # Kiểm tra từng dòng; trả về (các dòng hợp lệ, báo cáo lỗi)
+    valid = []
+    report = []
+    seen = set()
+    for line, row in rows:
+        error = None
+        missing = [column for column in REQUIRED_COLUMNS if not row.get(column)]
+        if missing:
+            error = f"Thiếu giá trị: {', '.join(missing)}"
+        elif "/" in row["ID"]:
+            error = "ID không được chứa '/'"
+        elif row["ID"] in seen:
+            error = "ID bị trùng trong file CSV"
+        else:
+            absent = [row[column] for column in IMAGE_COLUMNS if row[column] not in archive]
+            if absent:
+                error = f"Không có ảnh trong file zip: {', '.join(absent)}"
+        if row.get("ID"):
+            seen.add(row["ID"])
+        if error:
+            report.append(report_row(line, row, STATUS_ERROR, error))
+        else:
+            valid.append((line, row))
+    return valid, report
+
+
+def report_row(line, row, status, message=""):
+    return {"Dòng": line, "ID": row.get("ID", ""), "Tên": row.get("Name", ""),
+            "Trạng thái": status, "Ghi chú": message}
+
+
+@traced("import.existing_ids")
+def existing_ids(db, students_ref, student_ids, chunk_size=BATCH_LIMIT):
+    # Kiểm tra trùng ID với Firestore bằng get_all theo từng nhóm
+    found = set()
+    student_ids = list(student_ids)
+    for start in range(0, len(student_ids), chunk_size):
+        references = [students_ref.document(student_id) for student_id in student_ids[start:start + chunk_size]]
+        for snapshot in db.get_all(references):
+            if snapshot.exists:
+                found.add(snapshot.id)
+    return found
+
+
+def commit_records(db, students_ref, records):
+    # records: [(id, bản ghi)]; tạo mới theo WriteBatch, mỗi batch tối đa
+    # BATCH_LIMIT. batch.create làm cả batch thất bại nếu có ID đã tồn tại, nên
+    # sinh viên được thêm sau bước kiểm tra ID không bị ghi đè: các ID đó được
+    # loại ra và phần còn lại được ghi lại. Trả về (tập ID đã tồn tại,
+    # {id: lỗi} của các bản ghi thuộc batch ghi thất bại).
+    conflicts = set()
+    failed = {}
+    for start in range(0, len(records), BATCH_LIMIT):
+        chunk = records[start:start + BATCH_LIMIT]
+        while chunk:
+            batch = db.batch()
+            for student_id, record in chunk:
+                batch.create(students_ref.document(student_id), record)
+            try:
+                with span("firestore.batch_commit", size=len(chunk)):
+                    batch.commit()
+                break
+            except AlreadyExists as e:
+                taken = existing_ids(db, students_ref, (student_id for student_id, _ in chunk))
+                if not taken:
+                    logger.warning("Batch create of %d students failed: %s", len(chunk), e)
+                    failed.update({student_id: str(e) for student_id, _ in chunk})
+                    break
+                logger.info("%d student IDs were created concurrently, retrying without them", len(taken))
+                conflicts |= taken
+                chunk = [(student_id, record) for student_id, record in chunk if student_id not in taken]
+            except Exception as e:
+                logger.warning("Batch write of %d students failed: %s", len(chunk), e)
+                failed.update({student_id: str(e) for student_id, _ in chunk})
+                break
+    return conflicts, failed
+
+
+def _import_chunk(db, bucket, students_ref, models, archive, chunk):
+    # Tải ảnh của cả nhóm lên song song, tính embedding theo lô trong lúc chờ,
+    # rồi ghi Firestore theo batch. Trả về (báo cáo, [(id, bản ghi)] đã ghi).
+    report = []
+    prepared = []
+    for line, row in chunk:
+        try:
+            images = {column: archive.read(row[column]) for column in IMAGE_COLUMNS}
+        except (ValueError, zipfile.BadZipFile, OSError) as e:
+            report.append(report_row(line, row, STATUS_ERROR, f"Không đọc được ảnh: {e}"))
+            continue
+        uploads = start_uploads(bucket, {column: (images[column], row[column], None) for column in IMAGE_COLUMNS})
+        prepared.append((line, row, images["ChanDung"], uploads))
+
+    # Phát hiện khuôn mặt chân dung từng ảnh, tính feature cho cả nhóm một lượt
+    crops = []
+    crop_rows = []
+    with models.lease("yunet") as detector:
+        for i, (_, _, portrait, _) in enumerate(prepared):
+            _, _, crop = detect_portrait_face(portrait, detector)
+            if crop is not None:
+                crops.append(crop)
+                crop_rows.append(i)
+    features = [None] * len(prepared)
+    if crops:
+        with models.lease("sface_net") as feature_net:
+            for i, feature in zip(crop_rows, extract_features(feature_net, crops)):
+                features[i] = feature
+
+    records = []
+    uploads_by_id = {}
+    rows_by_id = {}
+    for (line, row, _, uploads), feature in zip(prepared, features):
+        try:
+            urls = uploads.result()
+        except UploadError as e:
+            report.append(report_row(line, row, STATUS_ERROR, f"Tải ảnh lên thất bại: {e}"))
+            continue
+        record = {"Name": row["Name"]}
+        record.update(urls)
+        record.update(name_tokens(row["Name"]))
+        record.update(embedding_fields(feature, urls["ChanDung"]))
+        records.append((row["ID"], record))
+        uploads_by_id[row["ID"]] = uploads
+        rows_by_id[row["ID"]] = (line, row, feature is not None)
+
+    conflicts, failed = commit_records(db, students_ref, records)
+    committed = []
+    for student_id, record in records:
+        line, row, has_face = rows_by_id[student_id]
+        if student_id in conflicts:
+            uploads_by_id[student_id].rollback()
+            report.append(report_row(line, row, STATUS_ERROR, "ID đã tồn tại"))
+        elif student_id in failed:
+            uploads_by_id[student_id].rollback()
+            report.append(report_row(line, row, STATUS_ERROR, f"Ghi Firestore thất bại: {failed[student_id]}"))
+        else:
+            committed.append((student_id, record))
+            report.append(report_row(line, row, STATUS_OK, "" if has_face else "Không tìm thấy khuôn mặt trong ảnh chân dung"))
+    return report, committed
+
+
+@traced("import.run")
+def import_students(db, bucket, models, csv_data, zip_data, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    # Nhập danh sách sinh viên từ CSV (ID, Name, TheSV, ChanDung) và file zip ảnh.
+    # Trả về (báo cáo từng dòng, [(id, bản ghi)] đã ghi vào Firestore).
+    students_ref = db.collection("Students")
+    archive = ImageArchive(zip_data)
+    valid, report = validate_rows(read_csv_rows(csv_data), archive)
+
+    duplicates = existing_ids(db, students_ref, (row["ID"] for _, row in valid))
+    pending = []
+    for line, row in valid:
+        if row["ID"] in duplicates:
+            report.append(report_row(line, row, STATUS_ERROR, "ID đã tồn tại"))
+        else:
+            pending.append((line, row))
+
+    committed = []
+    for start in range(0, len(pending), chunk_size):
+        chunk_report, chunk_committed = _import_chunk(db, bucket, students_ref, models, archive,
+                                                      pending[start:start + chunk_size])
+        report.extend(chunk_report)
+        committed.extend(chunk_committed)
+        if progress is not None:
+            progress(min(start + chunk_size, len(pending)), len(pending))
+    report.sort(key=lambda r: r["Dòng"])
+    return report, committed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Nhập danh sách sinh viên từ file CSV và file zip ảnh")
+    parser.add_argument("csv", help="File CSV với các cột ID, Name, TheSV, ChanDung")
+    parser.add_argument("images", help="File zip chứa ảnh thẻ sinh viên và ảnh chân dung")
+    parser.add_argument("-o", "--output", help="Ghi báo cáo từng dòng ra file .csv")
+    parser.add_argument("--credentials", help="File JSON service account (mặc định: secrets.toml)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    from core.firebase_client import init_firebase, load_credentials_info
+    from core.models import get_model_manager
+
+    db, bucket = init_firebase(load_credentials_info(args.credentials))
+    with open(args.csv, "rb") as f:
+        csv_data = f.read()
+    with open(args.images, "rb") as zip_file:
+        report, committed = import_students(
+            db, bucket, get_model_manager(), csv_data, zip_file,
+            progress=lambda done, total: logger.info("Imported %d/%d rows", done, total))
+
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(report_row(0, {}, "").keys()))
+            writer.writeheader()
+            writer.writerows(report)
+    errors = sum(1 for r in report if r["Trạng thái"] == STATUS_ERROR)
+    print(f"Đã nhập {len(committed)} sinh viên, lỗi {errors} dòng")
+    return 0 if errors == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
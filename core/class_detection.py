@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from core.models import YUNET_NMS_THRESHOLD
+from core.tracing import traced
+
+# Lượt phát hiện toàn ảnh chạy trên bản thu nhỏ có cạnh dài tối đa DETECT_MAX_SIDE
+DETECT_MAX_SIDE = 1280
+# Ảnh có cạnh dài từ TILING_MIN_SIDE trở lên được chia ô để bắt các khuôn mặt nhỏ
+TILING_MIN_SIDE = 2500
+TILE_SIZE = 1024
+TILE_OVERLAP = 0.2
+TILE_WORKERS = 4
+
+# Cột chứa tọa độ x / y trong kết quả YuNet (bbox + 5 điểm mốc), cột 14 là điểm
+_X_COLUMNS = [0, 4, 6, 8, 10, 12]
+_Y_COLUMNS = [1, 5, 7, 9, 11, 13]
+_EMPTY_FACES = np.zeros((0, 15), dtype=np.float32)
+
+
+def detect_faces(detector, img):
+    # Một lượt YuNet trên toàn bộ img (BGR), trả về mảng N x 15
+    height, width = img.shape[:2]
+    detector.setInputSize((width, height))
+    _, faces = detector.detect(img)
+    if faces is None:
+        return _EMPTY_FACES
+    return faces
+
+
+def _transform_faces(faces, scale=1.0, offset_x=0, offset_y=0):
+    # Đưa tọa độ từ ảnh thu nhỏ/ô cắt về tọa độ ảnh gốc
+    faces = faces.copy()
+    faces[:, :14] *= scale
+    faces[:, _X_COLUMNS] += offset_x
+    faces[:, _Y_COLUMNS] += offset_y
+    return faces
+
+
+def tile_grid(width, height, tile_size=TILE_SIZE, overlap=TILE_OVERLAP):
+    # Các ô (x, y, w, h) phủ kín ảnh, chồng lấn nhau theo tỉ lệ overlap
+    step = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, step))
+        positions.append(length - tile_size)
+        return positions
+
+    return [(x, y, min(tile_size, width - x), min(tile_size, height - y))
+            for y in starts(height) for x in starts(width)]
+
+
+def merge_faces(faces, nms_threshold=YUNET_NMS_THRESHOLD):
+    # Gộp kết quả của các ô chồng lấn bằng NMS
+    if len(faces) == 0:
+        return _EMPTY_FACES
+    boxes = faces[:, :4].tolist()
+    scores = faces[:, 14].tolist()
+    keep = cv2.dnn.NMSBoxes(boxes, scores, 0.0, nms_threshold)
+    return faces[np.asarray(keep, dtype=np.int64).reshape(-1)]
+
+
+@traced("detect.yunet")
+def detect_class_faces(img, models, max_side=DETECT_MAX_SIDE, tile_size=TILE_SIZE,
+                       overlap=TILE_OVERLAP, workers=TILE_WORKERS, use_tiles=None):
+    # Phát hiện khuôn mặt trên ảnh lớp học (BGR) bằng YuNet. Trả về mảng
+    # N x 15 theo tọa độ ảnh gốc. use_tiles = None: tự chia ô với ảnh lớn.
+    height, width = img.shape[:2]
+    scale = min(1.0, max_side / max(height, width))
+    if scale < 1.0:
+        small = cv2.resize(img, (int(round(width * scale)), int(round(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+    else:
+        small = img
+    with models.lease("yunet") as detector:
+        results = [_transform_faces(detect_faces(detector, small), 1.0 / scale)]
+
+    if use_tiles is None:
+        use_tiles = max(height, width) >= TILING_MIN_SIDE
+    if use_tiles:
+        def detect_tile(tile):
+            x, y, w, h = tile
+            with models.lease("yunet") as tile_detector:
+                return _transform_faces(detect_faces(tile_detector, img[y:y+h, x:x+w]), 1.0, x, y)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results.extend(executor.map(detect_tile, tile_grid(width, height, tile_size, overlap)))
+
+    return merge_faces(np.vstack(results))
+
+
+def face_boxes(faces, width, height):
+    # Khung (x, y, w, h) kiểu int, đã cắt theo biên ảnh
+    boxes = []
+    for face in faces:
+        x1 = int(max(0, face[0]))
+        y1 = int(max(0, face[1]))
+        x2 = int(min(width, face[0] + face[2]))
+        y2 = int(min(height, face[1] + face[3]))
+        if x2 > x1 and y2 > y1:
+            boxes.append((x1, y1, x2 - x1, y2 - y1))
+    return boxes
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from core.embeddings import EMBEDDING_MODEL, EMBEDDING_VERSION
+from core.models import YUNET_FILE, YUNET_NMS_THRESHOLD, YUNET_SCORE_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi đổi cách tính/ghi kết quả để bỏ qua cache cũ
+CACHE_VERSION = 1
+MEMORY_LIMIT_BYTES = 64 * 1024 * 1024
+DISK_LIMIT_BYTES = 512 * 1024 * 1024
+CACHE_DIR = os.environ.get("FACE_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "face_app_cache")
+_META_KEY = "__meta__"
+
+
+def model_signature(models):
+    # Kết quả chỉ dùng lại được khi cùng mô hình, cùng tham số mô hình và cùng
+    # backend suy luận của models (OpenCV DNN và onnxruntime cho kết quả lệch
+    # nhau chút ít); bản int8 cho kết quả khác bản float nên có khóa riêng
+    signature = f"{CACHE_VERSION}:{YUNET_FILE}:{YUNET_SCORE_THRESHOLD}:{YUNET_NMS_THRESHOLD}:" \
+                f"{EMBEDDING_MODEL}:{EMBEDDING_VERSION}:{models.backend}"
+    return signature + ":int8" if models.int8 else signature
+
+
+def cache_key(image_data, stage, models, **params):
+    # Khóa theo nội dung ảnh (sha256), giai đoạn xử lý, mô hình/backend và tham số
+    digest = hashlib.sha256(image_data).hexdigest()
+    suffix = json.dumps(params, sort_keys=True, default=str)
+    extra = hashlib.sha256(f"{stage}|{model_signature(models)}|{suffix}".encode("utf-8")).hexdigest()[:16]
+    return f"{digest}-{stage}-{extra}"
+
+
+def _entry_size(entry):
+    return sum(v.nbytes if isinstance(v, np.ndarray) else 64 for v in entry.values())
+
+
+class DetectionCache:
+    # Cache kết quả phát hiện/embedding theo nội dung ảnh, dùng chung cho mọi
+    # phiên và mọi lần chạy lại script. Giá trị là dict {tên: mảng numpy,
+    # số, chuỗi hoặc None}. Bản trong bộ nhớ là LRU giới hạn theo dung lượng;
+    # bản bị đẩy ra được ghi xuống đĩa (.npz) và nạp lại khi cần.
+
+    def __init__(self, memory_limit=MEMORY_LIMIT_BYTES, disk_dir=CACHE_DIR, disk_limit=DISK_LIMIT_BYTES):
+        self.memory_limit = memory_limit
+        self.disk_dir = disk_dir
+        self.disk_limit = disk_limit
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "spills": 0}
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key + ".npz")
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+        entry = self._load(key)
+        with self._lock:
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+        self._put_memory(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        self._put_memory(key, dict(entry))
+
+    def get_or_compute(self, key, compute):
+        entry = self.get(key)
+        if entry is None:
+            entry = compute()
+            self.put(key, entry)
+        return entry
+
+    def _put_memory(self, key, entry):
+        spilled = []
+        with self._lock:
+            if key in self._entries:
+                self._memory_bytes -= _entry_size(self._entries.pop(key))
+            self._entries[key] = entry
+            self._memory_bytes += _entry_size(entry)
+            while self._memory_bytes > self.memory_limit and len(self._entries) > 1:
+                old_key, old_entry = self._entries.popitem(last=False)
+                self._memory_bytes -= _entry_size(old_entry)
+                spilled.append((old_key, old_entry))
+        for old_key, old_entry in spilled:
+            self._spill(old_key, old_entry)
+
+    def _spill(self, key, entry):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        arrays = {name: value for name, value in entry.items() if isinstance(value, np.ndarray)}
+        meta = {name: value for name, value in entry.items() if not isinstance(value, np.ndarray)}
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **arrays, **{_META_KEY: np.array(json.dumps(meta))})
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning("Could not spill cache entry %s: %s", key, e)
+            return
+        with self._lock:
+            self.stats["spills"] += 1
+            spills = self.stats["spills"]
+        if spills % 32 == 1:
+            self.prune_disk()
+
+    def _load(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                entry = json.loads(str(data[_META_KEY]))
+                entry.update({name: data[name] for name in data.files if name != _META_KEY})
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Dropping unreadable cache file %s: %s", path, e)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def prune_disk(self):
+        # Xóa các file dùng lâu nhất khi thư mục cache vượt quá disk_limit
+        try:
+            files = [os.path.join(self.disk_dir, name) for name in os.listdir(self.disk_dir)
+                     if name.endswith(".npz")]
+            files = sorted(((os.stat(path), path) for path in files), key=lambda item: item[0].st_mtime)
+        except OSError:
+            return
+        total = sum(stat.st_size for stat, _ in files)
+        for stat, path in files:
+            if total <= self.disk_limit:
+                break
+            try:
+                os.remove(path)
+                total -= stat.st_size
+            except OSError:
+                pass
+
+    def report(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), memory_mb=self._memory_bytes / (1024 * 1024))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_detection_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DetectionCache()
+    return _cache
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+import cv2
+import numpy as np
+
+from core.class_detection import detect_faces, face_boxes
+from core.image_decode import PORTRAIT_DECODE_SIZE, decode_image
+from core.portrait_fetch import fetch_portraits
+from core.tracing import span, traced
+
+# Thông tin mô hình dùng để tính embedding chân dung.
+# Tăng EMBEDDING_VERSION mỗi khi thay đổi cách cắt/chuẩn hóa khuôn mặt,
+# các embedding cũ sẽ bị coi là lỗi thời và được tính lại.
+# Phiên bản 3: khung YuNet thay cho Haar, cùng cách cắt với ảnh lớp học/video.
+EMBEDDING_MODEL = "face_recognition_sface_2021dec"
+EMBEDDING_VERSION = 3
+
+# Số ảnh khuôn mặt tối đa trong một lượt suy luận SFace theo lô
+FEATURE_BATCH_SIZE = 32
+FEATURE_INPUT_SIZE = (112, 112)
+
+
+def face_crop(img_rgb, face):
+    x, y, w, h = face
+    return cv2.resize(img_rgb[y:y+h, x:x+w], FEATURE_INPUT_SIZE)
+
+
+def _forward_one(feature_net, crop):
+    feature_net.setInput(cv2.dnn.blobFromImage(crop, 1.0, FEATURE_INPUT_SIZE, (0, 0, 0), True, False))
+    return feature_net.forward().reshape(1, -1)
+
+
+@traced("embed.features")
+def extract_features(feature_net, crops, max_batch=FEATURE_BATCH_SIZE):
+    # Tính feature SFace cho N ảnh 112x112 bằng các blob N x 3 x 112 x 112.
+    # Tiền xử lý giống FaceRecognizerSF.feature (scale 1, không trừ mean,
+    # swapRB) nên kết quả trùng với gọi feature() từng ảnh. Trả về N x 128.
+    if len(crops) == 0:
+        return np.zeros((0, 128), dtype=np.float32)
+    outputs = []
+    for start in range(0, len(crops), max_batch):
+        chunk = crops[start:start + max_batch]
+        blob = cv2.dnn.blobFromImages(chunk, 1.0, FEATURE_INPUT_SIZE, (0, 0, 0), True, False)
+        feature_net.setInput(blob)
+        output = feature_net.forward()
+        if output.shape[0] != len(chunk):
+            # Mô hình cố định batch = 1: chạy lần lượt từng ảnh
+            output = np.vstack([_forward_one(feature_net, crop) for crop in chunk])
+        outputs.append(output.reshape(len(chunk), -1))
+    return np.vstack(outputs).astype(np.float32, copy=False)
+
+
+def largest_face(detector, img):
+    # Khung (x, y, w, h) lớn nhất do YuNet tìm thấy trong img (BGR), hoặc None.
+    # Dùng cùng bộ phát hiện và face_crop với ảnh lớp học để embedding chân
+    # dung và khuôn mặt trong lớp được cắt theo cùng một kiểu khung.
+    height, width = img.shape[:2]
+    with span("detect.yunet_portrait"):
+        faces = face_boxes(detect_faces(detector, img), width, height)
+    if not faces:
+        return None
+    return max(faces, key=lambda f: f[2] * f[3])
+
+
+def detect_portrait_face(image_data, detector):
+    # Giải mã ảnh chân dung, trả về (ảnh RGB, khung mặt lớn nhất, ảnh mặt 112x112)
+    try:
+        decoded = decode_image(image_data, PORTRAIT_DECODE_SIZE, need=("bgr", "rgb"))
+    except ValueError:
+        return None, None, None
+
+    face = largest_face(detector, decoded.bgr)
+    if face is None:
+        return decoded.rgb, None, None
+    return decoded.rgb, face, face_crop(decoded.rgb, face)
+
+
+def process_student_image(image_data, detector, face_recognizer):
+    img_rgb, face, crop = detect_portrait_face(image_data, detector)
+    if crop is None:
+        return img_rgb, None, None
+    return img_rgb, face, face_recognizer.feature(crop)
+
+
+def embedding_fields(feature, source_url):
+    # Các trường lưu cùng bản ghi sinh viên. Embedding = None nghĩa là
+    # đã thử nhưng không tìm thấy khuôn mặt trong ảnh chân dung.
+    return {
+        "Embedding": None if feature is None else [float(v) for v in np.asarray(feature).ravel()],
+        "EmbeddingModel": EMBEDDING_MODEL,
+        "EmbeddingVersion": EMBEDDING_VERSION,
+        "EmbeddingSource": source_url,
+    }
+
+
+def is_embedding_stale(student_data):
+    return (
+        "EmbeddingVersion" not in student_data
+        or student_data.get("EmbeddingModel") != EMBEDDING_MODEL
+        or student_data.get("EmbeddingVersion") != EMBEDDING_VERSION
+        or student_data.get("EmbeddingSource") != student_data.get("ChanDung")
+    )
+
+
+def load_embedding(student_data):
+    values = student_data.get("Embedding")
+    if not values:
+        return None
+    return np.asarray(values, dtype=np.float32).reshape(1, -1)
+
+
+@traced("roster.load")
+def load_roster_features(students, detector, feature_net, session=None, max_batch=FEATURE_BATCH_SIZE,
+                         progress=None):
+    # Trả về danh sách (id, tên, feature) của các sinh viên có khuôn mặt.
+    # Embedding thiếu hoặc lỗi thời được tính lại và ghi bù vào Firestore;
+    # ảnh chân dung của chúng được tải song song và xử lý ngay khi tải xong,
+    # các khuôn mặt được gom lại để tính feature theo lô. progress(đã xử lý, tổng)
+    # được gọi mỗi khi tải xong một ảnh chân dung phải tính lại.
+    roster = []
+    stale = {}
+    total = 0
+    for student in students:
+        total += 1
+        student_data = student.to_dict()
+        if not student_data.get("ChanDung"):
+            continue
+        if is_embedding_stale(student_data):
+            stale[student.id] = (student, student_data)
+            continue
+        feature = load_embedding(student_data)
+        if feature is not None:
+            roster.append((student.id, student_data.get("Name"), feature))
+
+    processed = total - len(stale)
+    if progress is not None:
+        progress(processed, total)
+
+    batch_ids = []
+    batch_crops = []
+
+    def flush():
+        features = extract_features(feature_net, batch_crops, max_batch)
+        for student_id, feature in zip(batch_ids, features):
+            student, student_data = stale[student_id]
+            with span("firestore.update"):
+                student.reference.update(embedding_fields(feature, student_data["ChanDung"]))
+            roster.append((student_id, student_data.get("Name"), feature.reshape(1, -1)))
+        batch_ids.clear()
+        batch_crops.clear()
+
+    urls = ((student_id, student_data["ChanDung"]) for student_id, (_, student_data) in stale.items())
+    for student_id, content in fetch_portraits(urls, session=session):
+        processed += 1
+        if progress is not None:
+            progress(processed, total)
+        if content is None:
+            continue
+        student, student_data = stale[student_id]
+        _, _, crop = detect_portrait_face(content, detector)
+        if crop is None:
+            with span("firestore.update"):
+                student.reference.update(embedding_fields(None, student_data["ChanDung"]))
+            continue
+        batch_ids.append(student_id)
+        batch_crops.append(crop)
+        if len(batch_crops) >= max_batch:
+            flush()
+    if batch_crops:
+        flush()
+    return roster
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import firebase_admin
+from firebase_admin import credentials, firestore, storage
+
+STORAGE_BUCKET = 'hchuong.appspot.com'
+
+
+def load_credentials_info(path=None):
+    # Dùng cho các lệnh chạy ngoài Streamlit: đọc service account từ file JSON
+    # (tham số hoặc biến GOOGLE_APPLICATION_CREDENTIALS), nếu không có thì
+    # lấy mục [firebase] trong .streamlit/secrets.toml
+    path = path or os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    import streamlit as st
+    return dict(st.secrets["firebase"])
+
+
+def init_firebase(credentials_info=None):
+    # Khởi tạo Firebase (chỉ thực hiện một lần) và trả về (db, bucket)
+    if not firebase_admin._apps:
+        if credentials_info is None:
+            credentials_info = load_credentials_info()
+        cred = credentials.Certificate(credentials_info)
+        firebase_admin.initialize_app(cred, {
+            'storageBucket': STORAGE_BUCKET
+        })
+    return firestore.client(), storage.bucket()
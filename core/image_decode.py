@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+from io import BytesIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from core.tracing import span
+
+# Ảnh vượt quá số điểm ảnh này bị từ chối trước khi giải mã (chống "decompression bomb")
+MAX_IMAGE_PIXELS = 100_000_000
+EXIF_ORIENTATION = 0x0112
+
+# Cạnh dài tối thiểu cần giữ khi giải mã cho từng loại ảnh
+PORTRAIT_DECODE_SIZE = 1024
+VERIFY_DECODE_SIZE = 1280
+CLASS_DECODE_SIZE = 4096
+
+_COLOR_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+_GRAY_FLAGS = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+               4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+
+
+class DecodedImage:
+    # Ảnh đã giải mã (có thể ở độ phân giải giảm) cùng các bản màu được yêu cầu.
+    # scale = kích thước gốc / kích thước đã giải mã, dùng để đưa khung về ảnh gốc.
+
+    def __init__(self, bgr, rgb, gray, original_size, scale):
+        self.bgr = bgr
+        self.rgb = rgb
+        self.gray = gray
+        self.original_size = original_size
+        self.scale = scale
+
+    @property
+    def size(self):
+        img = next(i for i in (self.bgr, self.rgb, self.gray) if i is not None)
+        return img.shape[1], img.shape[0]
+
+    def to_original(self, boxes):
+        # Khung (x, y, w, h) theo ảnh đã giải mã -> theo ảnh gốc
+        return [tuple(int(round(v * self.scale)) for v in box[:4]) for box in boxes]
+
+
+def read_image_info(image_data):
+    # Đọc kích thước và hướng EXIF từ phần đầu file, chưa giải mã điểm ảnh.
+    # Trả về (rộng, cao) sau khi xoay theo EXIF và giá trị orientation.
+    try:
+        with Image.open(BytesIO(image_data)) as img:
+            width, height = img.size
+            orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError(f"Không đọc được ảnh: {e}") from e
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ValueError(f"Ảnh quá lớn ({width}x{height})")
+    if orientation in (5, 6, 7, 8):
+        width, height = height, width
+    return (width, height), orientation
+
+
+def reduction_factor(original_size, target_size):
+    # Hệ số giảm lớn nhất (2/4/8) mà cạnh dài vẫn không nhỏ hơn target_size
+    if not target_size:
+        return 1
+    long_side = max(original_size)
+    for factor in (8, 4, 2):
+        if long_side / factor >= target_size:
+            return factor
+    return 1
+
+
+def apply_orientation(img, orientation):
+    if orientation == 2:
+        return cv2.flip(img, 1)
+    if orientation == 3:
+        return cv2.rotate(img, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(img, 0)
+    if orientation == 5:
+        return cv2.transpose(img)
+    if orientation == 6:
+        return cv2.rotate(img, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.rotate(cv2.transpose(img), cv2.ROTATE_180)
+    if orientation == 8:
+        return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return img
+
+
+def decode_image(image_data, target_size=None, need=("bgr",)):
+    # Giải mã ảnh tải lên một lần với độ phân giải vừa đủ cho bước phát hiện
+    # (cạnh dài >= target_size), chỉ tạo các bản màu trong need
+    # ("bgr", "rgb", "gray").
+    original_size, orientation = read_image_info(image_data)
+    factor = reduction_factor(original_size, target_size)
+    gray_only = set(need) == {"gray"}
+    flags = (_GRAY_FLAGS if gray_only else _COLOR_FLAGS)[factor] | cv2.IMREAD_IGNORE_ORIENTATION
+
+    with span("image.decode", factor=factor):
+        img = cv2.imdecode(np.frombuffer(image_data, np.uint8), flags)
+        if img is None:
+            raise ValueError("Không đọc được ảnh")
+        img = apply_orientation(img, orientation)
+    scale = original_size[0] / img.shape[1]
+
+    if gray_only:
+        return DecodedImage(None, None, img, original_size, scale)
+
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if "gray" in need else None
+    bgr = rgb = None
+    if "bgr" in need:
+        bgr = img
+        if "rgb" in need:
+            rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    elif "rgb" in need:
+        # Không cần bản BGR: đổi kênh màu tại chỗ, không cấp phát thêm
+        rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+    return DecodedImage(bgr, rgb, gray, original_size, scale)
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+
+import cv2
+import numpy as np
+
+from core.jobs import MAX_RUNNING_JOBS
+from core.matching import l2_normalize
+
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+logger = logging.getLogger(__name__)
+
+OPENCV = "opencv"
+ONNXRUNTIME = "onnxruntime"
+BACKENDS = (OPENCV, ONNXRUNTIME)
+INFERENCE_BACKEND = os.environ.get("FACE_INFERENCE_BACKEND", OPENCV)
+# Số luồng suy luận của mỗi tiến trình/instance: mặc định chia đều CPU cho số
+# job chạy đồng thời để các phiên không tranh nhau lõi
+INFERENCE_THREADS = int(os.environ.get("FACE_INFERENCE_THREADS") or 0) or \
+    max(1, (os.cpu_count() or 1) // MAX_RUNNING_JOBS)
+# Mức tối ưu đồ thị của onnxruntime: disabled, basic, extended, all
+GRAPH_OPTIMIZATION = os.environ.get("FACE_ORT_GRAPH_OPTIMIZATION", "all")
+# Dùng bản lượng tử int8 (<tên>_int8.onnx trong models/) nếu có
+USE_INT8 = os.environ.get("FACE_INFERENCE_INT8", "").lower() in ("1", "true", "yes")
+
+_ORT_LEVELS = {"disabled": "ORT_DISABLE_ALL", "basic": "ORT_ENABLE_BASIC",
+               "extended": "ORT_ENABLE_EXTENDED", "all": "ORT_ENABLE_ALL"}
+
+# Ngưỡng của bài tự kiểm tra khi khởi động
+PARITY_MIN_COSINE = 0.999
+PARITY_MAX_ABS_DIFF = 1e-3
+PARITY_SAMPLES = 8
+
+YUNET_STRIDES = (8, 16, 32)
+
+
+def available_backends():
+    return [OPENCV] + ([ONNXRUNTIME] if ort is not None else [])
+
+
+def resolve_backend(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {name}")
+    if name == ONNXRUNTIME and ort is None:
+        logger.warning("onnxruntime is not installed, using the OpenCV DNN backend")
+        return OPENCV
+    return name
+
+
+def int8_variant(file_name):
+    # face_recognition_sface_2021dec.onnx -> face_recognition_sface_2021dec_int8.onnx
+    root, extension = os.path.splitext(file_name)
+    return f"{root}_int8{extension}"
+
+
+def create_session(path, threads, optimization=GRAPH_OPTIMIZATION):
+    if ort is None:
+        raise RuntimeError("onnxruntime is not installed")
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = getattr(ort.GraphOptimizationLevel, _ORT_LEVELS[optimization])
+    # Luồng rảnh không quay vòng chờ việc, tránh chiếm lõi của các phiên khác
+    options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def create_opencv_net(path):
+    # Backend/target mặc định của cv2.dnn là OpenCV trên CPU
+    return cv2.dnn.readNetFromONNX(path)
+
+
+class OrtNet:
+    # Phiên onnxruntime với cùng giao diện cv2.dnn.Net mà extract_features dùng
+    # (setInput, forward). Mô hình cố định batch = 1 được chạy lần lượt từng ảnh.
+
+    def __init__(self, session):
+        self._session = session
+        model_input = session.get_inputs()[0]
+        self._input = model_input.name
+        self._fixed_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        self._blob = None
+
+    def setInput(self, blob):
+        self._blob = np.ascontiguousarray(blob, dtype=np.float32)
+
+    def forward(self):
+        blob = self._blob
+        if self._fixed_batch == 1 and len(blob) > 1:
+            return np.vstack([self._session.run(None, {self._input: blob[i:i + 1]})[0] for i in range(len(blob))])
+        return self._session.run(None, {self._input: blob})[0]
+
+
+def ort_outputs(session):
+    # Hàm chạy mô hình YuNet thô: blob -> {tên đầu ra: mảng}
+    input_name = session.get_inputs()[0].name
+    names = [output.name for output in session.get_outputs()]
+    return lambda blob: dict(zip(names, session.run(names, {input_name: blob})))
+
+
+def opencv_outputs(net):
+    names = list(net.getUnconnectedOutLayersNames())
+
+    def run(blob):
+        net.setInput(blob)
+        return dict(zip(names, net.forward(names)))
+    return run
+
+
+def _pad32(n):
+    return ((n - 1) // 32 + 1) * 32
+
+
+def yunet_blob(img):
+    # Như FaceDetectorYN: ảnh BGR giữ nguyên giá trị, đệm 0 ở phải/dưới tới bội số của 32
+    height, width = img.shape[:2]
+    blob = np.zeros((1, 3, _pad32(height), _pad32(width)), dtype=np.float32)
+    blob[0, :, :height, :width] = img.transpose(2, 0, 1)
+    return blob
+
+
+def decode_yunet(outputs, pad_width, pad_height, score_threshold, nms_threshold, top_k):
+    # Giải mã đầu ra YuNet 2023mar như FaceDetectorYN: mỗi stride s có lưới
+    # (pad_height/s) x (pad_width/s) ô; điểm = sqrt(cls * obj); tâm
+    # cx = (cột + bbox0) * s, rộng w = exp(bbox2) * s; các điểm mốc tính như tâm.
+    # Trả về N x 15 (x, y, w, h, 5 điểm mốc, điểm) sau NMS, hoặc None.
+    rows = []
+    for stride in YUNET_STRIDES:
+        cols = pad_width // stride
+        cls = np.clip(outputs[f"cls_{stride}"].reshape(-1), 0, 1)
+        obj = np.clip(outputs[f"obj_{stride}"].reshape(-1), 0, 1)
+        scores = np.sqrt(cls * obj)
+        keep = np.flatnonzero(scores > score_threshold)
+        if len(keep) == 0:
+            continue
+        bbox = outputs[f"bbox_{stride}"].reshape(-1, 4)[keep]
+        kps = outputs[f"kps_{stride}"].reshape(-1, 10)[keep]
+        col = (keep % cols).astype(np.float32)
+        row = (keep // cols).astype(np.float32)
+        faces = np.empty((len(keep), 15), dtype=np.float32)
+        w = np.exp(bbox[:, 2]) * stride
+        h = np.exp(bbox[:, 3]) * stride
+        faces[:, 0] = (col + bbox[:, 0]) * stride - w / 2
+        faces[:, 1] = (row + bbox[:, 1]) * stride - h / 2
+        faces[:, 2] = w
+        faces[:, 3] = h
+        faces[:, 4:14:2] = (kps[:, 0::2] + col[:, None]) * stride
+        faces[:, 5:14:2] = (kps[:, 1::2] + row[:, None]) * stride
+        faces[:, 14] = scores[keep]
+        rows.append(faces)
+    if not rows:
+        return None
+    faces = np.vstack(rows)
+    # FaceDetectorYN làm NMS trên khung tọa độ nguyên
+    boxes = faces[:, :4].astype(np.int32).tolist()
+    keep = cv2.dnn.NMSBoxes(boxes, faces[:, 14].tolist(), score_threshold, nms_threshold, 1.0, top_k)
+    if len(keep) == 0:
+        return None
+    return faces[np.asarray(keep).reshape(-1)]
+
+
+class YuNetDetector:
+    # Chạy YuNet qua một hàm suy luận thô và tự giải mã, cùng giao diện
+    # cv2.FaceDetectorYN (setInputSize, detect) để thay thế trực tiếp
+
+    def __init__(self, run_outputs, score_threshold, nms_threshold, top_k):
+        self._run = run_outputs
+        self.score_threshold = score_threshold
+        self.nms_threshold = nms_threshold
+        self.top_k = top_k
+        self._size = (0, 0)
+
+    def setInputSize(self, size):
+        self._size = tuple(size)
+
+    def detect(self, img):
+        blob = yunet_blob(img)
+        faces = decode_yunet(self._run(blob), blob.shape[3], blob.shape[2],
+                             self.score_threshold, self.nms_threshold, self.top_k)
+        return 1, faces
+
+
+def parity_check(yunet_path, sface_path, threads=1, optimization=GRAPH_OPTIMIZATION, samples=PARITY_SAMPLES,
+                 seed=0):
+    # Tự kiểm tra khi khởi động: chạy cùng dữ liệu ngẫu nhiên qua OpenCV DNN và
+    # onnxruntime, so cosine nhỏ nhất giữa feature SFace và sai lệch lớn nhất
+    # của đầu ra thô YuNet. Mô hình thiếu file được bỏ qua.
+    from core.embeddings import extract_features
+
+    rng = np.random.default_rng(seed)
+    report = {"ok": True}
+    if sface_path is not None and os.path.exists(sface_path):
+        crops = list(rng.integers(0, 256, size=(samples, 112, 112, 3), dtype=np.uint8))
+        reference = extract_features(create_opencv_net(sface_path), crops)
+        candidate = extract_features(OrtNet(create_session(sface_path, threads, optimization)), crops)
+        report["sface_min_cosine"] = float(np.sum(l2_normalize(reference) * l2_normalize(candidate), axis=1).min())
+        report["ok"] &= report["sface_min_cosine"] >= PARITY_MIN_COSINE
+    if yunet_path is not None and os.path.exists(yunet_path):
+        blob = yunet_blob(rng.integers(0, 256, size=(120, 160, 3), dtype=np.uint8))
+        reference = opencv_outputs(create_opencv_net(yunet_path))(blob)
+        candidate = ort_outputs(create_session(yunet_path, threads, optimization))(blob)
+        report["yunet_max_abs_diff"] = float(max(
+            np.abs(reference[name] - candidate[name].reshape(reference[name].shape)).max() for name in reference))
+        report["ok"] &= report["yunet_max_abs_diff"] <= PARITY_MAX_ABS_DIFF
+    return report
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Số job suy luận chạy đồng thời tối đa cho cả tiến trình; các job khác xếp hàng
+MAX_RUNNING_JOBS = max(1, (os.cpu_count() or 2) // 2)
+# Quá số job đang chờ này thì từ chối nhận thêm
+MAX_QUEUED_JOBS = 16
+# Job đã kết thúc được giữ lại để trang có thể lấy kết quả (giây)
+JOB_RESULT_TTL = 30 * 60
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    # Một lượt xử lý nền. Hàm xử lý nhận job làm tham số đầu tiên và gọi
+    # job.update(...) để báo tiến độ; update ném JobCancelled khi job đã bị hủy,
+    # nên việc hủy có hiệu lực ở lần báo tiến độ kế tiếp.
+
+    def __init__(self, kind, owner=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.owner = owner
+        self.status = QUEUED
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._future = None
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def finished_state(self):
+        return self.status in FINISHED_STATES
+
+    def cancel(self):
+        self._cancel.set()
+        if self._future is not None and self._future.cancel():
+            # Chưa bắt đầu chạy: hủy ngay trong hàng đợi
+            self._finish(CANCELLED)
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def update(self, **progress):
+        with self._lock:
+            self.progress.update(progress)
+        self.check_cancelled()
+
+    def snapshot(self):
+        with self._lock:
+            return {"id": self.id, "kind": self.kind, "status": self.status, "progress": dict(self.progress),
+                    "error": self.error, "created": self.created, "started": self.started,
+                    "finished": self.finished}
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished = time.time()
+
+
+class JobQueue:
+    # Hàng đợi job nền dùng chung cho cả tiến trình: tối đa max_running job
+    # chạy cùng lúc (kiểm soát tải CPU khi nhiều người dùng), tối đa max_queued
+    # job chờ; job được tra lại theo id để trang theo dõi hoặc lấy kết quả.
+
+    def __init__(self, max_running=MAX_RUNNING_JOBS, max_queued=MAX_QUEUED_JOBS, result_ttl=JOB_RESULT_TTL):
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_running, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args, owner=None, **kwargs):
+        self._prune()
+        with self._lock:
+            queued = sum(1 for job in self._jobs.values() if job.status == QUEUED)
+            if queued >= self.max_queued:
+                raise JobQueueFull(f"{queued} jobs are already waiting")
+            job = Job(kind, owner)
+            self._jobs[job.id] = job
+        job._future = self._executor.submit(self._run, job, fn, args, kwargs)
+        logger.info("Queued %s job %s", kind, job.id)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancelled:
+            job._finish(CANCELLED)
+            return
+        with job._lock:
+            job.status = RUNNING
+            job.started = time.time()
+        try:
+            result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            job._finish(CANCELLED)
+            logger.info("Cancelled %s job %s", job.kind, job.id)
+        except Exception as e:
+            job._finish(FAILED, error=str(e))
+            logger.exception("%s job %s failed", job.kind, job.id)
+        else:
+            job._finish(DONE, result=result)
+            logger.info("Finished %s job %s in %.2fs", job.kind, job.id, job.finished - job.started)
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def position(self, job):
+        # Số job đang chờ phía trước job này
+        with self._lock:
+            return sum(1 for other in self._jobs.values()
+                       if other.status == QUEUED and other.created < job.created)
+
+    def _prune(self):
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished is not None and now - job.finished > self.result_ttl]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+    def report(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {"max_running": self.max_running, "max_queued": self.max_queued, **counts}
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from core.tracing import traced
+
+# Số ứng viên tối đa giữ lại cho mỗi khuôn mặt
+DEFAULT_TOP_K = 5
+
+
+def stack_features(features, dim=128):
+    # Ghép các feature (1x128) thành ma trận N x 128 đã chuẩn hóa L2
+    if len(features) == 0:
+        return np.zeros((0, dim), dtype=np.float32)
+    matrix = np.vstack([np.asarray(f, dtype=np.float32).reshape(1, -1) for f in features])
+    return l2_normalize(matrix)
+
+
+def l2_normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def similarity_matrix(face_matrix, roster_matrix):
+    # Cosine giữa mọi cặp (khuôn mặt, sinh viên) bằng một phép nhân ma trận,
+    # tương đương FaceRecognizerSF.match(..., FR_COSINE)
+    return face_matrix @ roster_matrix.T
+
+
+def top_k_matches(scores, names, threshold, top_k=DEFAULT_TOP_K):
+    # scores: M x N. Trả về face_matches dạng [[(tên, điểm), ...], ...]
+    # sắp xếp giảm dần theo điểm, chỉ giữ các điểm vượt ngưỡng.
+    num_faces, num_students = scores.shape
+    if num_faces == 0 or num_students == 0:
+        return [[] for _ in range(num_faces)]
+
+    k = num_students if top_k is None else min(top_k, num_students)
+    if k < num_students:
+        top_idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top_idx = np.tile(np.arange(num_students), (num_faces, 1))
+    top_scores = np.take_along_axis(scores, top_idx, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    top_idx = np.take_along_axis(top_idx, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    keep = top_scores > threshold
+
+    face_matches = []
+    for idx_row, score_row, keep_row in zip(top_idx, top_scores, keep):
+        face_matches.append([(names[j], float(s)) for j, s in zip(idx_row[keep_row], score_row[keep_row])])
+    return face_matches
+
+
+@traced("match.exact")
+def match_faces(class_features, roster, threshold, top_k=DEFAULT_TOP_K):
+    # class_features: [(face, feature), ...] từ process_class_image
+    # roster: [(id, tên, feature), ...] từ load_roster_features
+    face_matrix = stack_features([feature for _, feature in class_features])
+    roster_matrix = stack_features([feature for _, _, feature in roster])
+    names = [name for _, name, _ in roster]
+    scores = similarity_matrix(face_matrix, roster_matrix)
+    return top_k_matches(scores, names, threshold, top_k)
+
+
+@traced("match.index")
+def match_faces_index(class_features, index, threshold, top_k=DEFAULT_TOP_K, nprobe=None):
+    # Như match_faces nhưng lấy ứng viên từ RosterIndex (ANN) thay vì vét cạn
+    if len(class_features) == 0:
+        return []
+    face_matrix = stack_features([feature for _, feature in class_features])
+    results = index.search(face_matrix, k=top_k, nprobe=nprobe)
+    return [[(name, score) for _, name, score in candidates if score > threshold] for candidates in results]
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+from core.inference_backend import (GRAPH_OPTIMIZATION, INFERENCE_BACKEND, INFERENCE_THREADS, ONNXRUNTIME, OPENCV,
+                                    USE_INT8, OrtNet, YuNetDetector, create_opencv_net, create_session,
+                                    int8_variant, ort_outputs, parity_check, resolve_backend)
+
+logger = logging.getLogger(__name__)
+
+# Đường dẫn tới models
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+YUNET_FILE = "face_detection_yunet_2023mar.onnx"
+SFACE_FILE = "face_recognition_sface_2021dec.onnx"
+
+# Tham số YuNet: ngưỡng điểm, ngưỡng NMS, top_k
+YUNET_SCORE_THRESHOLD = 0.9
+YUNET_NMS_THRESHOLD = 0.3
+YUNET_TOP_K = 5000
+
+
+def _rss_mb():
+    # Bộ nhớ thường trú hiện tại của tiến trình (MB), None nếu không đọc được
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return None
+
+
+class ModelManager:
+    # Quản lý mô hình dùng chung cho cả tiến trình. Các đối tượng OpenCV
+    # (CascadeClassifier, FaceDetectorYN, FaceRecognizerSF) không an toàn khi
+    # nhiều luồng gọi detect/feature cùng lúc, nên mỗi mô hình có một pool:
+    # lease() cho mượn một instance dùng riêng rồi trả lại để tái sử dụng,
+    # số instance chỉ tăng theo số luồng dùng đồng thời cao nhất.
+    # YuNet và mạng SFace theo lô chạy qua OpenCV DNN hoặc onnxruntime
+    # (backend); FaceRecognizerSF (căn chỉnh khuôn mặt) luôn dùng OpenCV.
+
+    def __init__(self, models_dir=MODELS_DIR, backend=INFERENCE_BACKEND, threads=INFERENCE_THREADS,
+                 optimization=GRAPH_OPTIMIZATION, int8=USE_INT8):
+        self.models_dir = models_dir
+        self.backend = resolve_backend(backend)
+        self.threads = threads
+        self.optimization = optimization
+        self.int8 = int8
+        self.parity = None
+        # Số luồng của OpenCV áp dụng cho cả tiến trình
+        cv2.setNumThreads(threads)
+        self._factories = {
+            "haar": self._create_haar,
+            "yunet": self._create_yunet,
+            "sface": self._create_sface,
+            "sface_net": self._create_sface_net,
+        }
+        self._pools = {name: queue.LifoQueue() for name in self._factories}
+        self._lock = threading.Lock()
+        self._warm_lock = threading.Lock()
+        self._warmed_up = False
+        self.stats = {name: {"instances": 0, "load_seconds": 0.0, "memory_mb": 0.0, "warmup_seconds": None}
+                      for name in self._factories}
+
+    def model_path(self, file_name):
+        path = os.path.join(self.models_dir, file_name)
+        if self.int8:
+            quantized = os.path.join(self.models_dir, int8_variant(file_name))
+            if os.path.exists(quantized):
+                return quantized
+            logger.warning("No int8 variant of %s, using the float model", file_name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model file not found: {path}")
+        return path
+
+    def _create_haar(self):
+        cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        if not os.path.exists(cascade_path):
+            raise FileNotFoundError(f"Haar Cascade file not found: {cascade_path}")
+        return cv2.CascadeClassifier(cascade_path)
+
+    def _create_yunet(self):
+        if self.backend == ONNXRUNTIME:
+            session = create_session(self.model_path(YUNET_FILE), self.threads, self.optimization)
+            return YuNetDetector(ort_outputs(session), YUNET_SCORE_THRESHOLD, YUNET_NMS_THRESHOLD, YUNET_TOP_K)
+        return cv2.FaceDetectorYN.create(self.model_path(YUNET_FILE), "", (0, 0),
+                                         YUNET_SCORE_THRESHOLD, YUNET_NMS_THRESHOLD, YUNET_TOP_K)
+
+    def _create_sface(self):
+        return cv2.FaceRecognizerSF.create(self.model_path(SFACE_FILE), "")
+
+    def _create_sface_net(self):
+        # Mạng SFace dùng trực tiếp để suy luận theo lô
+        if self.backend == ONNXRUNTIME:
+            return OrtNet(create_session(self.model_path(SFACE_FILE), self.threads, self.optimization))
+        return create_opencv_net(self.model_path(SFACE_FILE))
+
+    def _create(self, name):
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        instance = self._factories[name]()
+        elapsed = time.perf_counter() - start
+        rss_after = _rss_mb()
+        with self._lock:
+            stats = self.stats[name]
+            stats["instances"] += 1
+            stats["load_seconds"] += elapsed
+            if rss_before is not None and rss_after is not None:
+                stats["memory_mb"] += max(0.0, rss_after - rss_before)
+        logger.info("Loaded %s instance #%d in %.3fs", name, self.stats[name]["instances"], elapsed)
+        return instance
+
+    @contextmanager
+    def lease(self, name):
+        pool = self._pools[name]
+        backend = self.backend
+        try:
+            instance = pool.get_nowait()
+        except queue.Empty:
+            instance = self._create(name)
+        try:
+            yield instance
+        finally:
+            # Instance của backend đã bị thay thì bỏ đi
+            if backend == self.backend:
+                pool.put(instance)
+
+    def use_backend(self, backend):
+        self.backend = resolve_backend(backend)
+        for name in ("yunet", "sface_net"):
+            pool = self._pools[name]
+            while True:
+                try:
+                    pool.get_nowait()
+                except queue.Empty:
+                    break
+
+    def self_test(self):
+        # So khớp kết quả onnxruntime với OpenCV DNN; lệch quá ngưỡng thì quay về OpenCV
+        if self.backend == OPENCV:
+            return None
+        paths = []
+        for file_name in (YUNET_FILE, SFACE_FILE):
+            try:
+                paths.append(self.model_path(file_name))
+            except FileNotFoundError:
+                paths.append(None)
+        try:
+            self.parity = parity_check(*paths, threads=self.threads, optimization=self.optimization)
+        except Exception as e:
+            self.parity = {"ok": False, "error": str(e)}
+        if self.parity["ok"]:
+            logger.info("Inference backend %s passed the parity self-test: %s", self.backend, self.parity)
+        else:
+            logger.error("Inference backend %s failed the parity self-test (%s), falling back to OpenCV",
+                         self.backend, self.parity)
+            self.use_backend(OPENCV)
+        return self.parity
+
+    def warm_up(self, background=False):
+        # Chạy một lượt suy luận giả để OpenCV cấp phát sẵn bộ nhớ/luồng
+        if background:
+            threading.Thread(target=self.warm_up, name="model-warm-up", daemon=True).start()
+            return
+        with self._warm_lock:
+            if self._warmed_up:
+                return
+            self.self_test()
+            dummy = np.zeros((160, 160, 3), dtype=np.uint8)
+            warm_ups = {
+                "haar": lambda m: m.detectMultiScale(cv2.cvtColor(dummy, cv2.COLOR_BGR2GRAY)),
+                "yunet": lambda m: (m.setInputSize((160, 160)), m.detect(dummy)),
+                "sface": lambda m: m.feature(cv2.resize(dummy, (112, 112))),
+                "sface_net": lambda m: (m.setInput(cv2.dnn.blobFromImage(cv2.resize(dummy, (112, 112)))),
+                                        m.forward()),
+            }
+            for name, run in warm_ups.items():
+                try:
+                    with self.lease(name) as model:
+                        start = time.perf_counter()
+                        run(model)
+                        self.stats[name]["warmup_seconds"] = time.perf_counter() - start
+                except (FileNotFoundError, cv2.error) as e:
+                    logger.warning("Warm-up of %s failed: %s", name, e)
+            self._warmed_up = True
+            logger.info("Model warm-up finished: %s", self.report())
+
+    def report(self):
+        with self._lock:
+            rows = [dict(model=name, **stats) for name, stats in self.stats.items()]
+        total = _rss_mb()
+        return {"models": rows, "process_memory_mb": total, "backend": self.backend, "threads": self.threads,
+                "precision": "int8" if self.int8 else "fp32", "parity": self.parity}
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_model_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ModelManager()
+        return _manager
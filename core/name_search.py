@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+import threading
+import unicodedata
+from bisect import bisect_left, bisect_right, insort
+
+from core.tracing import traced
+
+# Bảng chuyển chữ có dấu tiếng Việt sang không dấu, áp dụng trong một lượt
+_VIETNAMESE_MAP = {
+    'à': 'a', 'á': 'a', 'ả': 'a', 'ã': 'a', 'ạ': 'a',
+    'ă': 'a', 'ằ': 'a', 'ắ': 'a', 'ẳ': 'a', 'ẵ': 'a', 'ặ': 'a',
+    'â': 'a', 'ầ': 'a', 'ấ': 'a', 'ẩ': 'a', 'ẫ': 'a', 'ậ': 'a',
+    'đ': 'd',
+    'è': 'e', 'é': 'e', 'ẻ': 'e', 'ẽ': 'e', 'ẹ': 'e',
+    'ê': 'e', 'ề': 'e', 'ế': 'e', 'ể': 'e', 'ễ': 'e', 'ệ': 'e',
+    'ì': 'i', 'í': 'i', 'ỉ': 'i', 'ĩ': 'i', 'ị': 'i',
+    'ò': 'o', 'ó': 'o', 'ỏ': 'o', 'õ': 'o', 'ọ': 'o',
+    'ô': 'o', 'ồ': 'o', 'ố': 'o', 'ổ': 'o', 'ỗ': 'o', 'ộ': 'o',
+    'ơ': 'o', 'ờ': 'o', 'ớ': 'o', 'ở': 'o', 'ỡ': 'o', 'ợ': 'o',
+    'ù': 'u', 'ú': 'u', 'ủ': 'u', 'ũ': 'u', 'ụ': 'u',
+    'ư': 'u', 'ừ': 'u', 'ứ': 'u', 'ử': 'u', 'ữ': 'u', 'ự': 'u',
+    'ỳ': 'y', 'ý': 'y', 'ỷ': 'y', 'ỹ': 'y', 'ỵ': 'y'
+}
+_VIETNAMESE_TABLE = str.maketrans(_VIETNAMESE_MAP)
+
+# Firestore giới hạn 500 thao tác mỗi batch
+BATCH_LIMIT = 500
+
+
+def normalize_text(text):
+    if not text:
+        return ""
+    # NFC để chữ có dấu dạng tổ hợp (NFD) cũng được chuyển đúng
+    return unicodedata.normalize("NFC", text).lower().translate(_VIETNAMESE_TABLE)
+
+
+def name_tokens(full_name):
+    # Họ (từ đầu tiên) và tên (từ cuối cùng) đã chuẩn hóa, lưu cùng bản ghi sinh viên
+    name_parts = (full_name or "").split()
+    return {
+        "HoNorm": normalize_text(name_parts[0]) if name_parts else "",
+        "TenNorm": normalize_text(name_parts[-1]) if name_parts else "",
+    }
+
+
+def parse_name_query(search_name):
+    # "Hoang" -> tìm theo họ; "#Chuong" -> tìm theo tên
+    search_text = search_name.strip()
+    is_search_by_last_name = not search_text.startswith('#')
+    if not is_search_by_last_name:
+        search_text = search_text[1:].strip()
+    return normalize_text(search_text), is_search_by_last_name
+
+
+def tokens_of(student_data):
+    if "HoNorm" in student_data and "TenNorm" in student_data:
+        return student_data["HoNorm"], student_data["TenNorm"]
+    tokens = name_tokens(student_data.get("Name", ""))
+    return tokens["HoNorm"], tokens["TenNorm"]
+
+
+class NamePrefixIndex:
+    # Chỉ mục trong bộ nhớ trên họ/tên đã chuẩn hóa: hai mảng (token, id)
+    # được giữ sắp xếp để tra cứu tiền tố và chính xác bằng bisect.
+
+    def __init__(self):
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._tokens = {}
+        self._surnames = []
+        self._given_names = []
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def add(self, student_id, ho, ten):
+        with self._lock:
+            self._remove(student_id)
+            self._tokens[student_id] = (ho, ten)
+            insort(self._surnames, (ho, student_id))
+            insort(self._given_names, (ten, student_id))
+
+    def remove(self, student_id):
+        with self._lock:
+            self._remove(student_id)
+
+    def _remove(self, student_id):
+        tokens = self._tokens.pop(student_id, None)
+        if tokens is None:
+            return
+        ho, ten = tokens
+        for array, token in ((self._surnames, ho), (self._given_names, ten)):
+            i = bisect_left(array, (token, student_id))
+            if i < len(array) and array[i] == (token, student_id):
+                del array[i]
+
+    def prefix(self, token):
+        # Sinh viên có họ bắt đầu bằng token
+        with self._lock:
+            lo = bisect_left(self._surnames, (token,))
+            hi = bisect_left(self._surnames, (token + "\uffff",))
+            return [student_id for _, student_id in self._surnames[lo:hi]]
+
+    def exact(self, token):
+        # Sinh viên có tên đúng bằng token
+        with self._lock:
+            lo = bisect_left(self._given_names, (token,))
+            hi = bisect_right(self._given_names, (token, "\uffff"))
+            return [student_id for t, student_id in self._given_names[lo:hi] if t == token]
+
+    def lookup(self, normalized_search, is_search_by_last_name):
+        if is_search_by_last_name:
+            return self.prefix(normalized_search)
+        return self.exact(normalized_search)
+
+    @traced("name_index.load")
+    def load(self, students_ref, db, students=None):
+        # Đọc một lần các trường tên của toàn bộ sinh viên (hoặc dùng students đã
+        # có sẵn, ví dụ từ RosterCache); bản ghi cũ chưa có token chuẩn hóa sẽ
+        # được ghi bù theo batch
+        tokens = {}
+        batch = db.batch()
+        pending = 0
+        if students is None:
+            students = students_ref.select(["Name", "HoNorm", "TenNorm"]).stream()
+        for student in students:
+            student_data = student.to_dict()
+            ho, ten = tokens_of(student_data)
+            tokens[student.id] = (ho, ten)
+            if "HoNorm" not in student_data or "TenNorm" not in student_data:
+                batch.update(student.reference, {"HoNorm": ho, "TenNorm": ten})
+                pending += 1
+                if pending == BATCH_LIMIT:
+                    batch.commit()
+                    batch = db.batch()
+                    pending = 0
+        if pending:
+            batch.commit()
+
+        with self._lock:
+            self._tokens = tokens
+            self._surnames = sorted((ho, student_id) for student_id, (ho, _) in tokens.items())
+            self._given_names = sorted((ten, student_id) for student_id, (_, ten) in tokens.items())
+            self.loaded = True
+
+
+def matches_name(student_data, normalized_search, is_search_by_last_name):
+    ho, ten = tokens_of(student_data)
+    if is_search_by_last_name:
+        return bool(ho) and normalized_search in ho
+    return bool(ten) and ten == normalized_search
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_name_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NamePrefixIndex()
+        return _index
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.tracing import span
+
+# Cấu hình tải ảnh chân dung
+FETCH_WORKERS = 8
+FETCH_TIMEOUT = (3.05, 15)  # (connect, read) giây
+FETCH_RETRIES = 3
+FETCH_BACKOFF = 0.3
+
+
+def make_session(pool_size=FETCH_WORKERS, retries=FETCH_RETRIES, backoff=FETCH_BACKOFF):
+    # Một session dùng chung: giữ kết nối keep-alive và tự thử lại khi lỗi tạm thời
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_one(session, url, timeout=FETCH_TIMEOUT):
+    try:
+        with span("portrait.fetch"):
+            response = session.get(url, timeout=timeout)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    return response.content
+
+
+def fetch_portraits(items, session=None, max_workers=FETCH_WORKERS, timeout=FETCH_TIMEOUT):
+    # items: iterable (key, url). Sinh ra (key, content) ngay khi từng ảnh tải xong
+    # (content = None nếu lỗi), để bên gọi giải mã/tính embedding song song với
+    # các lượt tải còn lại. Số request đang chờ được giới hạn theo max_workers.
+    own_session = session is None
+    if own_session:
+        session = make_session(pool_size=max_workers)
+
+    items = iter(items)
+    max_pending = max_workers * 2
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+
+            def submit_next():
+                for key, url in items:
+                    pending[executor.submit(fetch_one, session, url, timeout)] = key
+                    return True
+                return False
+
+            while len(pending) < max_pending and submit_next():
+                pass
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = pending.pop(future)
+                    submit_next()
+                    yield key, future.result()
+    finally:
+        if own_session:
+            session.close()
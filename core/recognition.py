@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import threading
+
+import numpy as np
+
+from core.ann_index import get_roster_index
+from core.class_detection import detect_class_faces, face_boxes
+from core.detection_cache import cache_key
+from core.embeddings import extract_features, face_crop, is_embedding_stale, load_embedding, load_roster_features
+from core.image_decode import CLASS_DECODE_SIZE, decode_image
+from core.matching import match_faces_index
+from core.name_search import tokens_of
+from core.rendering import PREVIEW_MAX_SIZE, downscale
+from core.roster_cache import load_students
+from core.roster_store import get_roster_store
+from core.tracing import traced
+
+# Nạp chỉ mục lần đầu (hoặc khi refresh) chỉ chạy ở một job tại một thời điểm
+_roster_load_lock = threading.Lock()
+
+
+@traced("recognition.class_image")
+def process_class_image(image_data, models, **detect_options):
+    # Phát hiện và tính feature cho mọi khuôn mặt trong ảnh lớp học.
+    # Trả về (ảnh RGB, [khung (x, y, w, h)], [(khung, feature 1x128)], DecodedImage);
+    # khung theo ảnh đã giải mã, dùng DecodedImage.to_original để đổi về ảnh gốc.
+    decoded = decode_image(image_data, CLASS_DECODE_SIZE, need=("bgr", "rgb"))
+    img, img_rgb = decoded.bgr, decoded.rgb
+    height, width = img.shape[:2]
+
+    # YuNet trên ảnh thu nhỏ (và các ô chồng lấn với ảnh lớn), khung theo ảnh đã giải mã
+    faces = face_boxes(detect_class_faces(img, models, **detect_options), width, height)
+
+    # Tính feature của mọi khuôn mặt trong một lượt suy luận theo lô
+    with models.lease("sface_net") as feature_net:
+        features = extract_features(feature_net, [face_crop(img_rgb, face) for face in faces])
+    face_features = [(face, feature.reshape(1, -1)) for face, feature in zip(faces, features)]
+
+    return img_rgb, faces, face_features, decoded
+
+
+def cached_class_faces(image_data, models, cache, **detect_options):
+    # Như process_class_image nhưng lấy khung và feature từ cache theo nội dung
+    # ảnh nếu đã có. Trả về ([khung], [(khung, feature 1x128)], kích thước ảnh
+    # đã giải mã); khung theo ảnh giải mã với CLASS_DECODE_SIZE.
+    key_options = {k: v for k, v in detect_options.items() if k != "workers"}
+    key = cache_key(image_data, "class_faces", models, decode_size=CLASS_DECODE_SIZE, **key_options)
+
+    def compute():
+        _, faces, face_features, decoded = process_class_image(image_data, models, **detect_options)
+        features = [feature for _, feature in face_features]
+        return {
+            "boxes": np.asarray(faces, dtype=np.int32).reshape(-1, 4),
+            "features": np.vstack(features) if features else np.zeros((0, 128), dtype=np.float32),
+            "size": list(decoded.size),
+            "scale": decoded.scale,
+        }
+
+    entry = cache.get_or_compute(key, compute)
+    faces = [tuple(int(v) for v in box) for box in entry["boxes"]]
+    face_features = [(face, entry["features"][i:i + 1]) for i, face in enumerate(faces)]
+    return faces, face_features, tuple(entry["size"])
+
+
+def ensure_roster_index(db, models, refresh=False, progress=None):
+    # Chỉ mục embedding được nạp một lần cho cả tiến trình (từ snapshot cục bộ
+    # nếu đủ, nếu không thì đọc Firestore và tính embedding), sau đó chỉ được
+    # cập nhật dần qua upsert/delete khi sinh viên thay đổi. refresh buộc nạp
+    # lại toàn bộ từ Firestore.
+    roster_index = get_roster_index()
+    if roster_index.loaded and not refresh:
+        return roster_index
+    # Các job khởi động cùng lúc chỉ nạp một lần; job đến sau chờ rồi dùng kết quả
+    with _roster_load_lock:
+        if roster_index.loaded and not refresh:
+            return roster_index
+        roster_store = get_roster_store()
+        if not refresh and roster_store.refresh() and roster_store.complete:
+            roster_index.sync(roster_store.roster())
+            return roster_index
+        students = load_students(db.collection("Students"))
+        with models.lease("yunet") as detector, models.lease("sface_net") as feature_net:
+            roster = load_roster_features(students, detector, feature_net, progress=progress)
+        roster_index.sync(roster)
+        roster_store.sync(roster)
+    return roster_index
+
+
+def apply_student_changes(changes, name_index, roster_index, roster_store):
+    # Cập nhật các chỉ mục trong bộ nhớ và snapshot theo [(id, dữ liệu hoặc None)]
+    # từ listener. Cả lần gửi được ghi vào snapshot trong một batch; bản ghi
+    # không đổi tên và embedding (vd. vừa được chính trang 1 ghi) không ghi lại.
+    # Sinh viên đổi ảnh chân dung mà chưa có embedding mới bị bỏ khỏi chỉ mục và
+    # snapshot ngay (không so khớp với khuôn mặt cũ); trả về id của các sinh viên
+    # đó để tính lại embedding bằng refresh_embeddings_job.
+    stale = []
+    with roster_store.batch():
+        for student_id, student_data in changes:
+            if student_data is None:
+                name_index.remove(student_id)
+                roster_index.delete(student_id)
+                roster_store.delete(student_id)
+                continue
+            if name_index.loaded:
+                name_index.add(student_id, *tokens_of(student_data))
+            feature = None
+            if student_data.get("ChanDung"):
+                if is_embedding_stale(student_data):
+                    stale.append(student_id)
+                else:
+                    feature = load_embedding(student_data)
+            if feature is None:
+                roster_index.delete(student_id)
+                roster_store.delete(student_id)
+                continue
+            if roster_index.loaded:
+                roster_index.upsert(student_id, student_data.get("Name"), feature)
+            roster_store.upsert(student_id, student_data.get("Name"), feature)
+    return stale
+
+
+def refresh_embeddings_job(job, models, students):
+    # Job nền tính lại embedding cho các bản ghi (DocumentSnapshot/CachedStudent)
+    # mà apply_student_changes báo lỗi thời. load_roster_features ghi embedding
+    # mới vào Firestore; kết quả được đưa luôn vào chỉ mục và snapshot thay vì
+    # chờ listener báo lại.
+    def report(processed, total):
+        job.update(students_processed=processed, students_total=total)
+
+    with models.lease("yunet") as detector, models.lease("sface_net") as feature_net:
+        roster = load_roster_features(students, detector, feature_net, progress=report)
+    roster_index = get_roster_index()
+    roster_store = get_roster_store()
+    with roster_store.batch():
+        for student_id, name, feature in roster:
+            if roster_index.loaded:
+                roster_index.upsert(student_id, name, feature)
+            roster_store.upsert(student_id, name, feature)
+    return len(roster)
+
+
+def class_recognition_job(job, db, models, cache, image_data, threshold, nprobe=None, refresh_roster=False,
+                          **detect_options):
+    # Job nền của trang nhận diện lớp học: phát hiện và tính feature (qua cache)
+    # rồi so khớp với chỉ mục trong bộ nhớ. Chỉ mục chỉ được nạp khi khởi động
+    # nguội (từ snapshot cục bộ nếu đủ, nếu không thì từ Firestore) hoặc khi
+    # refresh_roster; sau đó được cập nhật dần theo thay đổi. Tiến độ được báo
+    # qua job.update; kết quả giữ feature để trang so khớp lại khi đổi ngưỡng
+    # và bản xem trước đã giải mã (cạnh dài tối đa PREVIEW_MAX_SIZE), không giữ
+    # bytes ảnh gốc suốt thời gian job được lưu. digest để trang nhận ra ảnh gốc
+    # còn trong ô tải lên khi cần xem độ phân giải đầy đủ.
+    job.update(stage="detect")
+    faces, face_features, size = cached_class_faces(image_data, models, cache, **detect_options)
+    job.update(stage="roster", faces=len(faces))
+
+    matches = []
+    if faces:
+        def report(processed, total):
+            job.update(students_processed=processed, students_total=total)
+
+        roster_index = ensure_roster_index(db, models, refresh=refresh_roster, progress=report)
+        job.check_cancelled()
+        job.update(stage="match")
+        matches = match_faces_index(face_features, roster_index, threshold, nprobe=nprobe)
+    job.update(stage="done", faces_matched=sum(1 for candidates in matches if candidates))
+    preview = None
+    if faces:
+        preview, _ = downscale(decode_image(image_data, PREVIEW_MAX_SIZE, need=("rgb",)).rgb)
+    return {"preview": preview, "digest": hashlib.sha256(image_data).hexdigest(), "faces": faces,
+            "face_features": face_features, "size": size}
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import os
+
+import cv2
+import numpy as np
+
+from core.tracing import span
+
+# Ảnh kết quả gửi lên trình duyệt: vẽ trên bản đã thu nhỏ về cạnh dài tối đa
+# PREVIEW_MAX_SIZE rồi nén JPEG/WebP, thay vì gửi mảng RGB đầy đủ
+PREVIEW_MAX_SIZE = int(os.environ.get("FACE_PREVIEW_MAX_SIZE") or 1280)
+PREVIEW_FORMAT = os.environ.get("FACE_PREVIEW_FORMAT", "jpeg").lower()
+PREVIEW_QUALITY = int(os.environ.get("FACE_PREVIEW_QUALITY") or 80)
+# Chất lượng khi người dùng yêu cầu xem ảnh gốc
+FULL_QUALITY = 95
+FORMATS = ("jpeg", "webp")
+
+# Lưới khuôn mặt: mỗi ô là một ô vuông SPRITE_TILE_SIZE px
+SPRITE_TILE_SIZE = 128
+SPRITE_COLUMNS = 6
+SPRITE_BACKGROUND = (255, 255, 255)
+CROP_PADDING = 0.1
+
+_QUALITY_FLAGS = {"jpeg": cv2.IMWRITE_JPEG_QUALITY, "webp": cv2.IMWRITE_WEBP_QUALITY}
+_EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp"}
+
+
+def encode_image(img_rgb, image_format=PREVIEW_FORMAT, quality=PREVIEW_QUALITY):
+    # Nén ảnh RGB thành bytes JPEG/WebP để st.image gửi nguyên vẹn
+    if image_format not in FORMATS:
+        raise ValueError(f"Unknown image format: {image_format}")
+    with span("render.encode", format=image_format):
+        ok, data = cv2.imencode(_EXTENSIONS[image_format], cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR),
+                                [_QUALITY_FLAGS[image_format], int(quality)])
+    if not ok:
+        raise ValueError(f"Could not encode image as {image_format}")
+    return data.tobytes()
+
+
+def downscale(img, max_size=PREVIEW_MAX_SIZE):
+    # Trả về (ảnh, tỉ lệ) với cạnh dài không quá max_size; ảnh đã đủ nhỏ (hoặc
+    # max_size None) được trả lại nguyên, không sao chép
+    height, width = img.shape[:2]
+    if not max_size or max(height, width) <= max_size:
+        return img, 1.0
+    scale = max_size / max(height, width)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA), scale
+
+
+def crop_face(img, face, padding=CROP_PADDING):
+    # Vùng khuôn mặt (x, y, w, h) kèm lề, là view của img (không sao chép)
+    x, y, w, h = face[:4]
+    pad = int(min(w, h) * padding)
+    x1 = max(0, int(x - pad))
+    y1 = max(0, int(y - pad))
+    x2 = min(img.shape[1], int(x + w + pad))
+    y2 = min(img.shape[0], int(y + h + pad))
+    return img[y1:y2, x1:x2]
+
+
+def draw_label(img, text, x, y, h, color):
+    # Nhãn trên nền màu của khung, phía trên khung (phía dưới nếu sát mép trên)
+    text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
+    text_y = y - 10 if y - 10 > text_size[1] else y + h + 20
+    cv2.rectangle(img, (x, text_y - text_size[1] - 4), (x + text_size[0], text_y + 4), color, -1)
+    cv2.putText(img, text, (x, text_y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+
+def render_annotated(img, annotations, scale=1.0, max_size=PREVIEW_MAX_SIZE, image_format=PREVIEW_FORMAT,
+                     quality=PREVIEW_QUALITY):
+    # Vẽ khung và nhãn lên bản thu nhỏ của img rồi nén. annotations là
+    # [(khung (x, y, w, h), màu, nhãn hoặc None)] theo tọa độ của ảnh mà img có
+    # được khi thu nhỏ với tỉ lệ scale (img = ảnh đó * scale).
+    with span("render.annotate", faces=len(annotations)):
+        preview, preview_scale = downscale(img, max_size)
+        if preview is img:
+            preview = img.copy()
+        scale *= preview_scale
+        for box, color, text in annotations:
+            x, y, w, h = (int(round(float(v) * scale)) for v in box[:4])
+            cv2.rectangle(preview, (x, y), (x + w, y + h), color, 2)
+            if text:
+                draw_label(preview, text, x, y, h, color)
+    return encode_image(preview, image_format, quality)
+
+
+def face_sprite(img, faces, tile_size=SPRITE_TILE_SIZE, columns=SPRITE_COLUMNS, image_format=PREVIEW_FORMAT,
+                quality=PREVIEW_QUALITY):
+    # Ghép các khuôn mặt thành một ảnh lưới duy nhất (thay vì mỗi khuôn mặt một
+    # ảnh), ô thứ i được đánh số i + 1 ở góc trên bên trái
+    columns = max(1, min(columns, len(faces)))
+    rows = -(-len(faces) // columns)
+    with span("render.sprite", faces=len(faces)):
+        sprite = np.full((rows * tile_size, columns * tile_size, 3), SPRITE_BACKGROUND, dtype=np.uint8)
+        for i, face in enumerate(faces):
+            crop = crop_face(img, face)
+            if crop.size == 0:
+                continue
+            fit = tile_size / max(crop.shape[:2])
+            width, height = max(1, round(crop.shape[1] * fit)), max(1, round(crop.shape[0] * fit))
+            interpolation = cv2.INTER_AREA if fit < 1 else cv2.INTER_LINEAR
+            top = (i // columns) * tile_size + (tile_size - height) // 2
+            left = (i % columns) * tile_size + (tile_size - width) // 2
+            sprite[top:top + height, left:left + width] = cv2.resize(crop, (width, height),
+                                                                     interpolation=interpolation)
+            text = str(i + 1)
+            text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)[0]
+            left, top = (i % columns) * tile_size, (i // columns) * tile_size
+            cv2.rectangle(sprite, (left, top), (left + text_size[0] + 6, top + text_size[1] + 8), (0, 0, 0), -1)
+            cv2.putText(sprite, text, (left + 3, top + text_size[1] + 4), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                        (255, 255, 255), 1)
+    return encode_image(sprite, image_format, quality)
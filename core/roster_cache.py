@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+import time
+from bisect import bisect_right
+
+from core.student_repo import student_row
+from core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Chu kỳ kiểm tra listener còn hoạt động (giây)
+WATCH_CHECK_SECONDS = 5
+# Thời gian chờ trước mỗi lần kết nối lại liên tiếp (giây)
+RECONNECT_BACKOFF_SECONDS = (1, 2, 5, 10, 30)
+
+
+class CachedStudent:
+    # Bản ghi trong cache, cùng giao diện với DocumentSnapshot (id, reference,
+    # exists, to_dict) để dùng thay cho kết quả đọc Firestore
+
+    exists = True
+
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class RosterCache:
+    # Toàn bộ collection Students trong bộ nhớ, dùng chung cho mọi phiên.
+    # Nạp một lần qua on_snapshot rồi được listener cập nhật theo từng thay đổi
+    # (kể cả thay đổi từ tiến trình khác). Khi listener ngừng hoạt động, luồng
+    # giám sát đăng ký lại; lần gửi đầu tiên sau đó thay toàn bộ dữ liệu để bỏ
+    # các thay đổi đã lỡ. Sau lần nạp đầu, mỗi lần gửi các hàm nghe được gọi một
+    # lần với danh sách [(id, dữ liệu hoặc None nếu bị xóa)] của lần gửi đó.
+
+    def __init__(self, check_interval=WATCH_CHECK_SECONDS):
+        self.check_interval = check_interval
+        self._students_ref = None
+        self._docs = {}
+        self._sorted_ids = None
+        self._listeners = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._watch = None
+        self._synced = False
+        self._last_sync = None
+        self.stats = {"events": 0, "resyncs": 0, "reconnects": 0, "errors": 0}
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def start(self, students_ref):
+        # Gọi nhiều lần cũng chỉ đăng ký một listener
+        with self._lock:
+            if self._students_ref is not None:
+                return
+            self._students_ref = students_ref
+        self._subscribe()
+        threading.Thread(target=self._supervise, name="roster-cache", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._watch is not None:
+            self._watch.unsubscribe()
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def add_listener(self, key, fn):
+        # Đăng ký theo khóa: chạy lại script chỉ thay hàm cũ, không thêm trùng
+        with self._lock:
+            self._listeners[key] = fn
+
+    def _subscribe(self):
+        with self._lock:
+            self._synced = False
+        try:
+            self._watch = self._students_ref.on_snapshot(self._on_snapshot)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning("Could not start roster listener: %s", e)
+
+    def _on_snapshot(self, documents, changes, read_time):
+        try:
+            with span("roster_cache.apply", changes=len(changes)):
+                changed = self._apply(documents, changes)
+        except Exception:
+            self.stats["errors"] += 1
+            logger.exception("Failed to apply roster changes")
+            return
+        self._ready.set()
+        with self._lock:
+            listeners = list(self._listeners.values())
+        if not changed:
+            return
+        for fn in listeners:
+            try:
+                fn(changed)
+            except Exception:
+                logger.exception("Roster listener failed for %d changes", len(changed))
+
+    def _apply(self, documents, changes):
+        with self._lock:
+            changed = []
+            if not self._synced:
+                # Lần gửi đầu sau khi đăng ký chứa toàn bộ collection
+                docs = {document.id: document.to_dict() for document in documents}
+                if self._ready.is_set():
+                    self.stats["resyncs"] += 1
+                    changed = [(student_id, data) for student_id, data in docs.items()
+                               if self._docs.get(student_id) != data]
+                    changed += [(student_id, None) for student_id in self._docs if student_id not in docs]
+                    logger.info("Resynced roster cache: %d students, %d changed", len(docs), len(changed))
+                self._docs = docs
+                self._synced = True
+            else:
+                for change in changes:
+                    document = change.document
+                    if change.type.name == "REMOVED":
+                        self._docs.pop(document.id, None)
+                        changed.append((document.id, None))
+                    else:
+                        self._docs[document.id] = document.to_dict()
+                        changed.append((document.id, self._docs[document.id]))
+            self.stats["events"] += len(changes)
+            self._sorted_ids = None
+            self._last_sync = time.monotonic()
+            return changed
+
+    def _supervise(self):
+        attempt = 0
+        while not self._stop.wait(self.check_interval):
+            watch = self._watch
+            if watch is not None and watch.is_active:
+                attempt = 0
+                with self._lock:
+                    if self._synced:
+                        self._last_sync = time.monotonic()
+                continue
+            delay = RECONNECT_BACKOFF_SECONDS[min(attempt, len(RECONNECT_BACKOFF_SECONDS) - 1)]
+            logger.warning("Roster listener is not active, reconnecting in %ss", delay)
+            if self._stop.wait(delay):
+                break
+            attempt += 1
+            self.stats["reconnects"] += 1
+            if watch is not None:
+                try:
+                    watch.unsubscribe()
+                except Exception:
+                    pass
+            self._subscribe()
+
+    def staleness(self):
+        # Số giây dữ liệu có thể đã lỗi thời: 0 khi listener đang hoạt động và
+        # đã đồng bộ, None khi chưa nạp lần nào
+        with self._lock:
+            if self._last_sync is None:
+                return None
+            watch = self._watch
+            if self._synced and watch is not None and watch.is_active:
+                return 0.0
+            return time.monotonic() - self._last_sync
+
+    def get(self, student_id):
+        with self._lock:
+            student_data = self._docs.get(student_id)
+        return dict(student_data) if student_data is not None else None
+
+    def students(self):
+        with self._lock:
+            items = list(self._docs.items())
+        return [CachedStudent(self._students_ref.document(student_id), data) for student_id, data in items]
+
+    def count(self):
+        with self._lock:
+            return len(self._docs)
+
+    def page(self, page_size, start_after=None):
+        # Như fetch_page nhưng đọc từ bộ nhớ
+        with self._lock:
+            if self._sorted_ids is None:
+                self._sorted_ids = sorted(self._docs)
+            start = 0 if start_after is None else bisect_right(self._sorted_ids, start_after)
+            page_ids = self._sorted_ids[start:start + page_size]
+            students = [CachedStudent(self._students_ref.document(student_id), self._docs[student_id])
+                        for student_id in page_ids]
+        rows = [student_row(student) for student in students]
+        next_cursor = rows[-1]["ID"] if len(rows) == page_size else None
+        return rows, next_cursor
+
+    def report(self):
+        staleness = self.staleness()
+        with self._lock:
+            return dict(self.stats, students=len(self._docs), ready=self.ready,
+                        active=self._watch is not None and self._watch.is_active, staleness_s=staleness)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_roster_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RosterCache()
+    return _cache
+
+
+def load_students(students_ref):
+    # Toàn bộ sinh viên: lấy từ cache nếu listener đã nạp xong, nếu không thì đọc Firestore
+    cache = get_roster_cache()
+    if cache.ready:
+        return cache.students()
+    with span("firestore.get_all_students"):
+        return students_ref.get()
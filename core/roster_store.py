@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from core.embeddings import EMBEDDING_MODEL, EMBEDDING_VERSION
+from core.matching import DEFAULT_TOP_K, l2_normalize, stack_features, top_k_matches
+from core.tracing import traced
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR = os.environ.get("ROSTER_STORE_DIR") or os.path.join(tempfile.gettempdir(), "face_app_roster")
+STORE_DTYPES = ("int8", "float16")
+DEFAULT_DTYPE = "int8"
+INITIAL_CAPACITY = 1024
+# Số dòng giải lượng tử mỗi lượt khi so khớp, giữ bộ nhớ tạm nhỏ
+MATCH_BLOCK_ROWS = 8192
+
+FEATURES_FILE = "features.npy"
+SCALES_FILE = "scales.npy"
+TABLE_FILE = "table.json"
+LOCK_FILE = "lock"
+
+
+def store_signature(dtype):
+    # Snapshot chỉ dùng được với đúng mô hình/phiên bản embedding và kiểu lưu
+    return f"{EMBEDDING_MODEL}-v{EMBEDDING_VERSION}-{dtype}"
+
+
+def quantize(matrix, dtype):
+    # matrix: N x 128 đã chuẩn hóa. int8: mỗi dòng một hệ số scale (max |x| / 127);
+    # float16: scale = 1. Trả về (dữ liệu, scales)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if dtype == "float16":
+        return matrix.astype(np.float16), np.ones(len(matrix), dtype=np.float32)
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    data = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return data, scales.astype(np.float32)
+
+
+def dequantize(data, scales):
+    return data.astype(np.float32) * scales[:, None]
+
+
+def _write_atomic(path, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class RosterStore:
+    # Snapshot cục bộ của danh sách embedding: ma trận int8/float16 liên tục
+    # (features.npy, kèm scales.npy) và bảng id/tên (table.json), đặt trong thư
+    # mục riêng theo mô hình. Tiến trình đọc chỉ ánh xạ bộ nhớ (mmap) các file
+    # .npy nên nạp gần như tức thì và dùng chung trang bộ nhớ giữa các tiến trình.
+    # Cập nhật theo từng sinh viên: ghi đè dòng tại chỗ, dòng đã xóa được dùng lại;
+    # table.json được thay nguyên tử và tăng generation để bên đọc nạp lại.
+
+    def __init__(self, root=STORE_DIR, dtype=DEFAULT_DTYPE, dim=128):
+        if dtype not in STORE_DTYPES:
+            raise ValueError(f"Unsupported roster store dtype: {dtype}")
+        self.dtype = dtype
+        self.dim = dim
+        self.path = os.path.join(root, store_signature(dtype))
+        self._lock = threading.RLock()
+        self._defer_save = 0
+        # Có thay đổi chưa ghi trong batch hiện tại
+        self._dirty = False
+        self._generation = None
+        self._reset_memory()
+
+    def _reset_memory(self):
+        self._features = np.zeros((0, self.dim), dtype=self.dtype)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._ids = []
+        self._names = []
+        self._row_of = {}
+        # Các dòng trống (của sinh viên đã xóa) để dùng lại khi thêm
+        self._free_rows = []
+        self.complete = False
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    @property
+    def size(self):
+        return len(self._row_of)
+
+    @property
+    def labels(self):
+        # (id, tên) theo từng dòng đã dùng; None ở dòng trống
+        return [None if student_id is None else (student_id, name)
+                for student_id, name in zip(self._ids, self._names)]
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(LOCK_FILE), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def refresh(self):
+        # Nạp (hoặc nạp lại khi bên ghi đã đổi) snapshot từ đĩa; trả về True nếu có dữ liệu
+        with self._lock:
+            try:
+                with open(self._file(TABLE_FILE), encoding="utf-8") as f:
+                    table = json.load(f)
+            except FileNotFoundError:
+                self._reset_memory()
+                return False
+            except (OSError, ValueError) as e:
+                logger.warning("Unreadable roster store table in %s: %s", self.path, e)
+                self._reset_memory()
+                return False
+            if table.get("signature") != store_signature(self.dtype):
+                self._reset_memory()
+                return False
+            if table["generation"] == self._generation:
+                return True
+            self._features = np.load(self._file(FEATURES_FILE), mmap_mode="r")
+            self._scales = np.load(self._file(SCALES_FILE), mmap_mode="r")
+            self._ids = table["ids"]
+            self._names = table["names"]
+            self._row_of = {student_id: row for row, student_id in enumerate(self._ids) if student_id is not None}
+            self._free_rows = [row for row, student_id in enumerate(self._ids) if student_id is None]
+            self.complete = table.get("complete", False)
+            self._generation = table["generation"]
+            return True
+
+    def _save_table(self):
+        if self._defer_save:
+            return
+        self._generation = (self._generation or 0) + 1
+        table = {"signature": store_signature(self.dtype), "dtype": self.dtype, "dim": self.dim,
+                 "generation": self._generation, "complete": self.complete, "updated": time.time(),
+                 "ids": self._ids, "names": self._names}
+        _write_atomic(self._file(TABLE_FILE),
+                      lambda f: f.write(json.dumps(table, ensure_ascii=False).encode("utf-8")))
+
+    def _write_arrays(self, features, scales):
+        # Ghi file mới rồi thay nguyên tử; bên đọc đang mmap file cũ vẫn dùng được
+        _write_atomic(self._file(FEATURES_FILE), lambda f: np.save(f, features))
+        _write_atomic(self._file(SCALES_FILE), lambda f: np.save(f, scales))
+        self._features = np.load(self._file(FEATURES_FILE), mmap_mode="r+")
+        self._scales = np.load(self._file(SCALES_FILE), mmap_mode="r+")
+
+    def _writable(self):
+        if not isinstance(self._features, np.memmap) or self._features.mode != "r+":
+            self._features = np.load(self._file(FEATURES_FILE), mmap_mode="r+")
+            self._scales = np.load(self._file(SCALES_FILE), mmap_mode="r+")
+
+    def _allocate_row(self):
+        if self._free_rows:
+            return self._free_rows.pop()
+        row = len(self._ids)
+        if row >= len(self._features):
+            capacity = max(INITIAL_CAPACITY, 2 * len(self._features))
+            features = np.zeros((capacity, self.dim), dtype=self.dtype)
+            scales = np.zeros(capacity, dtype=np.float32)
+            features[:row] = self._features[:row]
+            scales[:row] = self._scales[:row]
+            self._write_arrays(features, scales)
+        self._ids.append(None)
+        self._names.append(None)
+        return row
+
+    def _upsert(self, student_id, name, feature):
+        if feature is None:
+            self._delete(student_id)
+            return
+        data, scales = quantize(l2_normalize(np.asarray(feature, dtype=np.float32).reshape(1, -1)), self.dtype)
+        row = self._row_of.get(student_id)
+        if row is not None and self._names[row] == name and self._scales[row] == scales[0] \
+                and np.array_equal(self._features[row], data[0]):
+            # Không đổi (vd. listener báo lại thay đổi vừa ghi): không cần ghi
+            return
+        self._dirty = True
+        if row is None:
+            row = self._allocate_row()
+            self._row_of[student_id] = row
+        self._writable()
+        self._features[row] = data[0]
+        self._scales[row] = scales[0]
+        self._ids[row] = student_id
+        self._names[row] = name
+
+    def _delete(self, student_id):
+        row = self._row_of.pop(student_id, None)
+        if row is not None:
+            self._dirty = True
+            self._ids[row] = None
+            self._names[row] = None
+            self._free_rows.append(row)
+
+    def _flush(self):
+        if isinstance(self._features, np.memmap) and self._features.mode == "r+":
+            self._features.flush()
+            self._scales.flush()
+
+    @contextmanager
+    def batch(self):
+        # Gom nhiều cập nhật: khóa giữa các tiến trình, nạp bản mới nhất trước khi
+        # sửa và chỉ ghi bảng id/tên một lần khi kết thúc
+        with self._lock:
+            if self._defer_save:
+                yield
+                return
+            with self._file_lock():
+                self.refresh()
+                self._defer_save += 1
+                self._dirty = False
+                try:
+                    yield
+                finally:
+                    self._defer_save -= 1
+                if self._dirty:
+                    self._flush()
+                    self._save_table()
+
+    @traced("roster_store.sync")
+    def sync(self, roster):
+        # Ghi lại toàn bộ từ danh sách (id, tên, feature) và đánh dấu snapshot đầy đủ
+        roster = [(student_id, name, feature) for student_id, name, feature in roster if feature is not None]
+        data, scales = quantize(stack_features([feature for _, _, feature in roster], self.dim), self.dtype)
+        capacity = max(INITIAL_CAPACITY, len(roster))
+        features = np.zeros((capacity, self.dim), dtype=self.dtype)
+        all_scales = np.zeros(capacity, dtype=np.float32)
+        features[:len(roster)] = data
+        all_scales[:len(roster)] = scales
+        with self.batch():
+            self._write_arrays(features, all_scales)
+            self._ids = [student_id for student_id, _, _ in roster]
+            self._names = [name for _, name, _ in roster]
+            self._row_of = {student_id: row for row, student_id in enumerate(self._ids)}
+            self._free_rows = []
+            self.complete = True
+            self._dirty = True
+
+    # Các cập nhật lẻ chỉ có ý nghĩa khi snapshot đã đầy đủ (đã sync ít nhất một lần)
+
+    def upsert(self, student_id, name, feature):
+        with self.batch():
+            if self.complete:
+                self._upsert(student_id, name, feature)
+
+    def delete(self, student_id):
+        with self.batch():
+            if self.complete:
+                self._delete(student_id)
+
+    def rename(self, old_id, new_id, name=None):
+        with self.batch():
+            row = self._row_of.pop(old_id, None) if self.complete else None
+            if row is not None:
+                self._dirty = True
+                self._row_of[new_id] = row
+                self._ids[row] = new_id
+                if name is not None:
+                    self._names[row] = name
+
+    def roster(self):
+        # [(id, tên, feature 1x128 float32)] giải lượng tử từ snapshot
+        with self._lock:
+            rows = sorted(self._row_of.values())
+            matrix = dequantize(np.asarray(self._features[rows]), np.asarray(self._scales[rows]))
+            return [(self._ids[row], self._names[row], matrix[i:i + 1]) for i, row in enumerate(rows)]
+
+    def scores(self, queries):
+        # Cosine M x (số dòng) tính trực tiếp trên dữ liệu lượng tử theo từng khối;
+        # dòng trống nhận -inf
+        queries = l2_normalize(np.asarray(queries, dtype=np.float32).reshape(-1, self.dim))
+        with self._lock:
+            used = len(self._ids)
+            scores = np.empty((len(queries), used), dtype=np.float32)
+            for start in range(0, used, MATCH_BLOCK_ROWS):
+                stop = min(used, start + MATCH_BLOCK_ROWS)
+                block = np.asarray(self._features[start:stop], dtype=np.float32)
+                scores[:, start:stop] = (queries @ block.T) * np.asarray(self._scales[start:stop])
+            if self._free_rows:
+                scores[:, self._free_rows] = -np.inf
+            return scores
+
+    @traced("match.roster_store")
+    def match(self, queries, threshold, top_k=DEFAULT_TOP_K):
+        # Như top_k_matches, nhãn là (id, tên)
+        with self._lock:
+            labels = self.labels
+            return top_k_matches(self.scores(queries), labels, threshold, top_k)
+
+
+def accuracy_report(reference, dtype, queries=None, k=DEFAULT_TOP_K, noise=0.35, seed=0):
+    # So kết quả so khớp trên dữ liệu lượng tử với float32. reference: N x 128.
+    # queries mặc định là chính các vector cộng nhiễu (giống ảnh chụp khác của
+    # cùng người).
+    reference = l2_normalize(reference)
+    if queries is None:
+        rng = np.random.default_rng(seed)
+        picks = rng.choice(len(reference), min(len(reference), 1000), replace=False)
+        queries = reference[picks] + rng.normal(scale=noise / np.sqrt(reference.shape[1]),
+                                                size=(len(picks), reference.shape[1])).astype(np.float32)
+    queries = l2_normalize(queries)
+    data, scales = quantize(reference, dtype)
+    exact = queries @ reference.T
+    approx = (queries @ data.astype(np.float32).T) * scales
+    k = min(k, len(reference))
+    exact_top = np.argsort(-exact, axis=1)[:, :k]
+    approx_top = np.argsort(-approx, axis=1)[:, :k]
+    recall = np.mean([len(set(a) & set(e)) / k for a, e in zip(approx_top, exact_top)])
+    error = np.abs(exact - approx)
+    return {
+        "dtype": dtype,
+        "students": len(reference),
+        "queries": len(queries),
+        "top1_agreement": float(np.mean(approx_top[:, 0] == exact_top[:, 0])),
+        f"recall_at_{k}": float(recall),
+        "max_abs_score_error": float(error.max()),
+        "mean_abs_score_error": float(error.mean()),
+        "bytes_per_student": int(data.itemsize * data.shape[1] + (4 if dtype == "int8" else 0)),
+    }
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_roster_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = RosterStore()
+                _store.refresh()
+    return _store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tạo snapshot embedding cục bộ và đo độ chính xác lượng tử")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--dir", default=STORE_DIR, help="Thư mục snapshot")
+    parser.add_argument("--dtype", choices=STORE_DTYPES, default=DEFAULT_DTYPE)
+    parser.add_argument("--credentials", help="File JSON service account (mặc định: secrets.toml)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    from core.batch_attendance import load_roster
+
+    labels, matrix = load_roster(args.credentials)
+    if args.command == "build":
+        store = RosterStore(args.dir, args.dtype)
+        store.sync([(student_id, name, matrix[i]) for i, (student_id, name) in enumerate(labels)])
+        print(f"Đã ghi {store.size} sinh viên vào {store.path}")
+    else:
+        for dtype in STORE_DTYPES:
+            print(json.dumps(accuracy_report(matrix, dtype), ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from core.thumbnails import TABLE_THUMBNAIL_SIZE, thumbnail_url
+from core.tracing import traced
+
+# Phân trang danh sách sinh viên
+PAGE_SIZE_OPTIONS = [10, 20, 50, 100]
+DEFAULT_PAGE_SIZE = 20
+# Thời gian sống của trang trong cache (giây)
+PAGE_CACHE_TTL = 30
+
+
+def student_row(student):
+    student_data = student.to_dict()
+    return {
+        "ID": student.id,
+        "Name": student_data.get("Name", ""),
+        # Bảng chỉ cần ảnh xem trước nhỏ
+        "TheSV": thumbnail_url(student_data, "TheSV", TABLE_THUMBNAIL_SIZE),
+        "ChanDung": thumbnail_url(student_data, "ChanDung", TABLE_THUMBNAIL_SIZE)
+    }
+
+
+@traced("firestore.page")
+def fetch_page(students_ref, page_size, start_after=None):
+    # Đọc một trang theo thứ tự ID; start_after là ID cuối của trang trước.
+    # Trả về (rows, next_cursor), next_cursor = None nếu đã là trang cuối.
+    query = students_ref.order_by(FieldPath.document_id()).limit(page_size)
+    if start_after is not None:
+        query = query.start_after({FieldPath.document_id(): students_ref.document(start_after)})
+    rows = [student_row(student) for student in query.stream()]
+    next_cursor = rows[-1]["ID"] if len(rows) == page_size else None
+    return rows, next_cursor
+
+
+@traced("firestore.count")
+def count_students(students_ref):
+    # Truy vấn tổng hợp count(), không đọc từng bản ghi
+    result = students_ref.count().get()
+    return int(result[0][0].value)
+
+
+class StudentPageCache:
+    # Cache các trang đã đọc trong thời gian ngắn, dùng chung cho mọi phiên.
+    # Các thao tác thêm/sửa/xóa phải gọi invalidate().
+
+    def __init__(self, ttl=PAGE_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._pages = {}
+
+    def _get(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+        value = loader()
+        with self._lock:
+            self._pages[key] = (now + self.ttl, value)
+        return value
+
+    def page(self, students_ref, page_size, start_after=None):
+        return self._get(("page", page_size, start_after),
+                         lambda: fetch_page(students_ref, page_size, start_after))
+
+    def count(self, students_ref):
+        return self._get(("count",), lambda: count_students(students_ref))
+
+    def invalidate(self):
+        with self._lock:
+            self._pages.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_page_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = StudentPageCache()
+        return _cache
+
+
+def invalidate_student_pages():
+    get_page_cache().invalidate()
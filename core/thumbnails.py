@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import argparse
+import logging
+import uuid
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from core.portrait_fetch import fetch_portraits
+
+logger = logging.getLogger(__name__)
+
+# Các trường ảnh có bản thu nhỏ và kích thước cạnh dài (px) của từng bản
+IMAGE_FIELDS = ("TheSV", "ChanDung")
+THUMBNAIL_SIZES = (160, 480)
+TABLE_THUMBNAIL_SIZE = 160
+PREVIEW_THUMBNAIL_SIZE = 480
+THUMBNAIL_FORMAT = "WEBP"
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_CONTENT_TYPE = "image/webp"
+THUMBNAIL_EXTENSION = "webp"
+
+
+def thumbnail_field(field, size):
+    # "ChanDung", 160 -> "ChanDung_160"
+    return f"{field}_{size}"
+
+
+def thumbnail_url(student_data, field, size):
+    # URL bản thu nhỏ, quay về ảnh gốc nếu chưa có
+    return student_data.get(thumbnail_field(field, size)) or student_data.get(field, "")
+
+
+def make_thumbnail(image_data, size, quality=THUMBNAIL_QUALITY):
+    with Image.open(BytesIO(image_data)) as img:
+        # Giải mã giảm độ phân giải ngay từ đầu với JPEG lớn
+        img.draft("RGB", (size, size))
+        img = ImageOps.exif_transpose(img)
+        img = img.convert("RGB")
+        img.thumbnail((size, size), Image.LANCZOS)
+        output = BytesIO()
+        img.save(output, THUMBNAIL_FORMAT, quality=quality, method=4)
+        return output.getvalue()
+
+
+def upload_thumbnails(bucket, field, image_data, base_name=None):
+    # Tạo và tải lên các bản thu nhỏ của một ảnh, trả về {trường: URL}
+    base_name = base_name or str(uuid.uuid4())
+    urls = {}
+    for size in THUMBNAIL_SIZES:
+        blob = bucket.blob(f"{base_name}_{size}.{THUMBNAIL_EXTENSION}")
+        blob.upload_from_string(make_thumbnail(image_data, size), content_type=THUMBNAIL_CONTENT_TYPE,
+                                predefined_acl="publicRead")
+        urls[thumbnail_field(field, size)] = blob.public_url
+    return urls
+
+
+def missing_thumbnails(student_data):
+    return [field for field in IMAGE_FIELDS
+            if student_data.get(field)
+            and any(not student_data.get(thumbnail_field(field, size)) for size in THUMBNAIL_SIZES)]
+
+
+def backfill_thumbnails(db, bucket, dry_run=False):
+    # Tạo bản thu nhỏ cho các sinh viên đã có từ trước. Trả về số ảnh đã xử lý.
+    pending = {}
+    for student in db.collection("Students").stream():
+        student_data = student.to_dict()
+        for field in missing_thumbnails(student_data):
+            pending[(student.id, field)] = (student.reference, student_data[field])
+
+    logger.info("%d images need thumbnails", len(pending))
+    if dry_run:
+        return len(pending)
+
+    done = 0
+    urls = ((key, url) for key, (_, url) in pending.items())
+    for (student_id, field), content in fetch_portraits(urls):
+        if content is None:
+            logger.warning("Could not download %s of %s", field, student_id)
+            continue
+        doc_ref, _ = pending[(student_id, field)]
+        try:
+            doc_ref.update(upload_thumbnails(bucket, field, content))
+        except OSError as e:
+            logger.warning("Could not create thumbnails for %s of %s: %s", field, student_id, e)
+            continue
+        done += 1
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tạo bản thu nhỏ cho ảnh của các sinh viên hiện có")
+    parser.add_argument("--credentials", help="File JSON service account (mặc định: secrets.toml)")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ đếm số ảnh cần xử lý")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    from core.firebase_client import init_firebase, load_credentials_info
+    db, bucket = init_firebase(load_credentials_info(args.credentials))
+    count = backfill_thumbnails(db, bucket, dry_run=args.dry_run)
+    print(f"{'Cần xử lý' if args.dry_run else 'Đã xử lý'} {count} ảnh")
+
+
+if __name__ == "__main__":
+    main()
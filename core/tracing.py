@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# Biên trên (giây) của các bucket histogram, giống mặc định của Prometheus
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Đặt TRACE_JSON_LOGS=1 để ghi mỗi span thành một dòng log JSON
+JSON_LOGS = os.environ.get("TRACE_JSON_LOGS", "").lower() in ("1", "true", "yes")
+METRIC_PREFIX = "face_app"
+
+
+class StageStats:
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_seconds = 0.0
+        self.buckets = [0] * len(HISTOGRAM_BUCKETS)
+
+    def observe(self, seconds, failed):
+        self.count += 1
+        self.errors += int(failed)
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_seconds = seconds
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def quantile(self, q):
+        # Ước lượng phân vị từ histogram (biên trên của bucket chứa phân vị)
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(HISTOGRAM_BUCKETS, self.buckets):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max_seconds)
+        return self.max_seconds
+
+
+class Tracer:
+    # Đo thời gian từng giai đoạn (Firestore, tải ảnh, giải mã, phát hiện,
+    # feature, so khớp...) bằng span lồng nhau. Kết quả gộp theo tên giai đoạn
+    # thành bộ đếm và histogram, dùng chung cho cả tiến trình.
+
+    def __init__(self, json_logs=JSON_LOGS):
+        self.json_logs = json_logs
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started = time.time()
+        if json_logs and not logger.handlers:
+            # Mỗi dòng log là một đối tượng JSON, không kèm định dạng của root logger
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name, **attributes):
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        trace_id = parent["trace_id"] if parent else uuid.uuid4().hex[:16]
+        current = {"name": name, "trace_id": trace_id, "span_id": uuid.uuid4().hex[:8]}
+        stack.append(current)
+        failed = False
+        start = time.perf_counter()
+        try:
+            yield current
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            self.record(name, elapsed, failed)
+            if self.json_logs:
+                logger.info(json.dumps({
+                    "event": "span", "name": name, "trace_id": trace_id, "span_id": current["span_id"],
+                    "parent_id": parent["span_id"] if parent else None,
+                    "duration_ms": round(elapsed * 1000, 3), "error": failed,
+                    "attributes": attributes, "thread": threading.current_thread().name,
+                }, ensure_ascii=False, default=str))
+
+    def traced(self, name):
+        # Decorator: bọc cả hàm trong một span
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def record(self, name, seconds, failed=False):
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = StageStats()
+            stats.observe(seconds, failed)
+
+    def snapshot(self):
+        # Một dòng cho mỗi giai đoạn, dùng cho bảng chẩn đoán
+        with self._lock:
+            rows = []
+            for name, stats in sorted(self._stages.items()):
+                rows.append({
+                    "stage": name,
+                    "count": stats.count,
+                    "errors": stats.errors,
+                    "total_ms": stats.total_seconds * 1000,
+                    "mean_ms": stats.total_seconds * 1000 / stats.count,
+                    "p50_ms": stats.quantile(0.5) * 1000,
+                    "p95_ms": stats.quantile(0.95) * 1000,
+                    "max_ms": stats.max_seconds * 1000,
+                    "last_ms": stats.last_seconds * 1000,
+                })
+            return rows
+
+    def prometheus_text(self):
+        # Ảnh chụp các chỉ số theo định dạng văn bản của Prometheus
+        name = f"{METRIC_PREFIX}_stage_duration_seconds"
+        errors_name = f"{METRIC_PREFIX}_stage_errors_total"
+        lines = [f"# HELP {name} Duration of traced stages.", f"# TYPE {name} histogram"]
+        error_lines = [f"# HELP {errors_name} Failed traced stages.", f"# TYPE {errors_name} counter"]
+        with self._lock:
+            for stage, stats in sorted(self._stages.items()):
+                label = stage.replace("\\", "\\\\").replace('"', '\\"')
+                cumulative = 0
+                for bound, count in zip(HISTOGRAM_BUCKETS, stats.buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{label}",le="+Inf"}} {stats.count}')
+                lines.append(f'{name}_sum{{stage="{label}"}} {stats.total_seconds:.6f}')
+                lines.append(f'{name}_count{{stage="{label}"}} {stats.count}')
+                error_lines.append(f'{errors_name}{{stage="{label}"}} {stats.errors}')
+        return "\n".join(lines + error_lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._stages = {}
+            self.started = time.time()
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer()
+    return _tracer
+
+
+def span(name, **attributes):
+    return get_tracer().span(name, **attributes)
+
+
+def traced(name):
+    return get_tracer().traced(name)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import logging
+import mimetypes
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from io import BytesIO
+
+from core.thumbnails import (THUMBNAIL_CONTENT_TYPE, THUMBNAIL_EXTENSION, THUMBNAIL_SIZES, make_thumbnail,
+                             thumbnail_field)
+from core.tracing import span
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_WORKERS = 8
+# File lớn hơn ngưỡng này được tải lên theo từng phần (resumable upload);
+# kích thước phần phải là bội số của 256 KB
+RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 32 * 256 * 1024
+# ACL công khai được đặt ngay trong request tải lên, không cần gọi make_public
+PUBLIC_ACL = "publicRead"
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+
+
+class UploadError(Exception):
+    pass
+
+
+def guess_content_type(file_name, declared=None):
+    if declared:
+        return declared
+    return mimetypes.guess_type(file_name)[0] or DEFAULT_CONTENT_TYPE
+
+
+def upload_blob(bucket, name, data, content_type):
+    # Tải một đối tượng lên và trả về URL công khai
+    blob = bucket.blob(name)
+    if len(data) > RESUMABLE_THRESHOLD:
+        blob.chunk_size = UPLOAD_CHUNK_SIZE
+    with span("storage.upload", size=len(data)):
+        blob.upload_from_file(BytesIO(data), size=len(data), content_type=content_type,
+                              predefined_acl=PUBLIC_ACL)
+    return blob.public_url
+
+
+def delete_blobs(bucket, names):
+    # Xóa các đối tượng đã tải lên dở dang; lỗi chỉ được ghi log
+    for name in names:
+        try:
+            bucket.blob(name).delete()
+        except Exception as e:
+            logger.warning("Could not delete uploaded blob %s: %s", name, e)
+
+
+class PendingUploads:
+    # Nhóm các lượt tải lên chạy song song của một thao tác thêm/sửa sinh viên.
+    # result() chờ tất cả xong; nếu có lượt lỗi thì xóa các đối tượng đã tải
+    # và ném UploadError. rollback() xóa mọi đối tượng khi bước ghi Firestore lỗi.
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self._futures = {}
+
+    def submit(self, executor, field, name, make_data, content_type):
+        future = executor.submit(lambda: upload_blob(self.bucket, name, make_data(), content_type))
+        self._futures[future] = (field, name)
+
+    def result(self):
+        wait(self._futures)
+        urls = {}
+        errors = []
+        for future, (field, _) in self._futures.items():
+            if future.exception() is not None:
+                errors.append(f"{field}: {future.exception()}")
+            else:
+                urls[field] = future.result()
+        if errors:
+            self.rollback()
+            raise UploadError("; ".join(errors))
+        return urls
+
+    def rollback(self):
+        # Lượt tải lỗi không tạo đối tượng, chỉ cần xóa các lượt đã xong
+        wait(self._futures)
+        delete_blobs(self.bucket, [name for future, (_, name) in self._futures.items()
+                                   if future.exception() is None])
+
+
+def start_uploads(bucket, files, executor=None):
+    # files: {trường: (bytes, tên file, content type hoặc None)}. Ảnh gốc và các
+    # bản thu nhỏ của mọi trường được tải lên đồng thời; trả về PendingUploads.
+    executor = executor or get_upload_executor()
+    pending = PendingUploads(bucket)
+    for field, (data, file_name, content_type) in files.items():
+        base_name = str(uuid.uuid4())
+        extension = file_name.rsplit(".", 1)[-1] if "." in file_name else "bin"
+        pending.submit(executor, field, f"{base_name}.{extension}", lambda data=data: data,
+                       guess_content_type(file_name, content_type))
+        for size in THUMBNAIL_SIZES:
+            pending.submit(executor, thumbnail_field(field, size), f"{base_name}_{size}.{THUMBNAIL_EXTENSION}",
+                           lambda data=data, size=size: make_thumbnail(data, size), THUMBNAIL_CONTENT_TYPE)
+    return pending
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_upload_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+    return _executor
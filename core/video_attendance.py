@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+import argparse
+import csv
+import json
+import logging
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from core.class_detection import detect_class_faces, face_boxes
+from core.embeddings import extract_features, face_crop
+from core.matching import similarity_matrix, stack_features, top_k_matches
+
+logger = logging.getLogger(__name__)
+
+# Chạy YuNet mỗi DETECT_EVERY khung hình, giữa hai lần phát hiện chỉ dự đoán vị trí
+DETECT_EVERY = 5
+DETECT_MAX_SIDE = 960
+TRACK_IOU_THRESHOLD = 0.3
+# Số lần phát hiện liên tiếp không thấy trước khi bỏ track
+TRACK_MAX_MISSES = 3
+# Khuôn mặt nhỏ hơn (px) chưa tính embedding, đợi track lại gần hơn
+MIN_EMBED_FACE_SIZE = 40
+DEFAULT_THRESHOLD = 0.3
+
+
+def iou_matrix(boxes_a, boxes_b):
+    # IoU giữa mọi cặp khung (x, y, w, h)
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.clip(np.minimum(ax2[:, None], bx2[None]) - np.maximum(a[:, None, 0], b[None, :, 0]), 0, None)
+    ih = np.clip(np.minimum(ay2[:, None], by2[None]) - np.maximum(a[:, None, 1], b[None, :, 1]), 0, None)
+    inter = iw * ih
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+class Track:
+    def __init__(self, track_id, box, frame_index, timestamp):
+        self.track_id = track_id
+        self.box = np.asarray(box, dtype=np.float32)
+        # Khung phát hiện gần nhất; self.box là vị trí dự đoán cho khung hình hiện tại
+        self.last_box = self.box
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.last_frame = frame_index
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.misses = 0
+        self.embedded = False
+        self.match = None
+
+    def predict(self):
+        self.box = self.box + self.velocity
+
+    def update(self, box, frame_index, timestamp):
+        box = np.asarray(box, dtype=np.float32)
+        frames = max(1, frame_index - self.last_frame)
+        # Vận tốc đo giữa hai lần phát hiện thật, không so với khung đã dự đoán
+        self.velocity = (box - self.last_box) / frames
+        self.box = box
+        self.last_box = box
+        self.last_frame = frame_index
+        self.last_seen = timestamp
+        self.misses = 0
+
+    def int_box(self):
+        return tuple(int(v) for v in self.box)
+
+
+class VideoAttendance:
+    # Điểm danh từ luồng video: phát hiện mỗi detect_every khung hình, theo dõi
+    # khuôn mặt giữa các lần phát hiện bằng IoU, mỗi track chỉ tính embedding
+    # SFace một lần rồi so với danh sách sinh viên.
+
+    def __init__(self, models, labels, roster_matrix, threshold=DEFAULT_THRESHOLD,
+                 detect_every=DETECT_EVERY, max_side=DETECT_MAX_SIDE):
+        self.models = models
+        self.labels = labels
+        self.roster_matrix = roster_matrix
+        self.threshold = threshold
+        self.detect_every = max(1, detect_every)
+        self.max_side = max_side
+        self.tracks = []
+        self.attendance = {}
+        self._next_track_id = 0
+        self.stats = {"frames": 0, "detections": 0, "tracks": 0, "embeddings": 0,
+                      "detect_seconds": 0.0, "embed_seconds": 0.0, "frame_seconds": []}
+
+    def _detect(self, frame, frame_index, timestamp):
+        start = time.perf_counter()
+        height, width = frame.shape[:2]
+        faces = face_boxes(detect_class_faces(frame, self.models, max_side=self.max_side, use_tiles=False),
+                           width, height)
+        self.stats["detect_seconds"] += time.perf_counter() - start
+        self.stats["detections"] += 1
+
+        matched_tracks = set()
+        matched_faces = set()
+        if self.tracks and faces:
+            ious = iou_matrix([t.box for t in self.tracks], faces)
+            # Ghép tham lam theo IoU giảm dần
+            for flat in np.argsort(-ious, axis=None):
+                ti, fi = np.unravel_index(flat, ious.shape)
+                if ious[ti, fi] < TRACK_IOU_THRESHOLD:
+                    break
+                if ti in matched_tracks or fi in matched_faces:
+                    continue
+                self.tracks[ti].update(faces[fi], frame_index, timestamp)
+                matched_tracks.add(ti)
+                matched_faces.add(fi)
+
+        alive = []
+        for i, track in enumerate(self.tracks):
+            if i not in matched_tracks:
+                track.misses += 1
+            if track.misses <= TRACK_MAX_MISSES:
+                alive.append(track)
+        for fi, face in enumerate(faces):
+            if fi not in matched_faces:
+                alive.append(Track(self._next_track_id, face, frame_index, timestamp))
+                self._next_track_id += 1
+                self.stats["tracks"] += 1
+        self.tracks = alive
+
+    def _embed_new_tracks(self, frame):
+        pending = [t for t in self.tracks
+                   if not t.embedded and t.misses == 0 and min(t.box[2], t.box[3]) >= MIN_EMBED_FACE_SIZE]
+        if not pending:
+            return
+        start = time.perf_counter()
+        # face_crop dùng ảnh RGB như khi tính embedding chân dung
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        with self.models.lease("sface_net") as feature_net:
+            features = extract_features(feature_net, [face_crop(frame_rgb, t.int_box()) for t in pending])
+        scores = similarity_matrix(stack_features(features), self.roster_matrix)
+        matches = top_k_matches(scores, self.labels, self.threshold, top_k=1)
+        for track, candidates in zip(pending, matches):
+            track.embedded = True
+            if candidates:
+                track.match = candidates[0]
+                (student_id, student_name), score = candidates[0]
+                record = self.attendance.get(student_id)
+                if record is None:
+                    self.attendance[student_id] = {"student_id": student_id, "student_name": student_name,
+                                                   "first_seen": track.first_seen, "score": score}
+                elif score > record["score"]:
+                    record["score"] = score
+        self.stats["embeddings"] += len(pending)
+        self.stats["embed_seconds"] += time.perf_counter() - start
+
+    def process_frame(self, frame, frame_index, timestamp):
+        start = time.perf_counter()
+        # Dự đoán vị trí ở mọi khung hình, kể cả trước khi ghép với kết quả phát hiện
+        for track in self.tracks:
+            track.predict()
+        if frame_index % self.detect_every == 0:
+            self._detect(frame, frame_index, timestamp)
+            self._embed_new_tracks(frame)
+        self.stats["frames"] += 1
+        self.stats["frame_seconds"].append(time.perf_counter() - start)
+
+    def run(self, source, max_frames=None, max_seconds=None, progress=None):
+        # source: đường dẫn file video hoặc số thứ tự camera
+        capture = cv2.VideoCapture(source)
+        if not capture.isOpened():
+            raise ValueError(f"Không mở được nguồn video: {source}")
+        is_file = not isinstance(source, int)
+        total_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) if is_file else 0
+        started = time.perf_counter()
+        frame_index = 0
+        try:
+            while max_frames is None or frame_index < max_frames:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                elapsed = time.perf_counter() - started
+                if max_seconds is not None and elapsed >= max_seconds:
+                    break
+                timestamp = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0 if is_file else elapsed
+                self.process_frame(frame, frame_index, timestamp)
+                frame_index += 1
+                if progress is not None:
+                    progress(frame_index, total_frames, len(self.attendance))
+        finally:
+            capture.release()
+        return self.report(time.perf_counter() - started)
+
+    def report(self, wall_seconds):
+        frame_seconds = np.asarray(self.stats["frame_seconds"] or [0.0])
+        frames = self.stats["frames"]
+        stats = {
+            "frames": frames,
+            "detections": self.stats["detections"],
+            "tracks": self.stats["tracks"],
+            "embeddings": self.stats["embeddings"],
+            "wall_seconds": wall_seconds,
+            "fps": frames / wall_seconds if wall_seconds > 0 else 0.0,
+            "frame_ms_mean": float(frame_seconds.mean() * 1000),
+            "frame_ms_p95": float(np.percentile(frame_seconds, 95) * 1000),
+            "detect_ms_mean": self.stats["detect_seconds"] * 1000 / max(1, self.stats["detections"]),
+            "embed_ms_per_face": self.stats["embed_seconds"] * 1000 / max(1, self.stats["embeddings"]),
+        }
+        attendance = sorted(self.attendance.values(), key=lambda r: r["first_seen"])
+        return attendance, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Điểm danh từ file video hoặc camera")
+    parser.add_argument("source", help="File video hoặc số thứ tự camera (vd: 0)")
+    parser.add_argument("--every", type=int, default=DETECT_EVERY, help="Phát hiện mỗi N khung hình")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--max-frames", type=int, default=None)
+    parser.add_argument("--max-seconds", type=float, default=None)
+    parser.add_argument("-o", "--output", help="Ghi danh sách điểm danh ra file .csv hoặc .json")
+    parser.add_argument("--credentials", help="File JSON service account (mặc định: secrets.toml)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    from core.batch_attendance import load_roster
+    from core.models import get_model_manager
+
+    labels, roster_matrix = load_roster(args.credentials)
+    source = int(args.source) if args.source.isdigit() else args.source
+    session = VideoAttendance(get_model_manager(), labels, roster_matrix, args.threshold, args.every)
+    attendance, stats = session.run(source, args.max_frames, args.max_seconds)
+
+    if args.output and args.output.lower().endswith(".json"):
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"attendance": attendance, "stats": stats}, f, ensure_ascii=False, indent=2)
+    elif args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["student_id", "student_name", "first_seen", "score"])
+            writer.writeheader()
+            writer.writerows(attendance)
+    for record in attendance:
+        print(f"{record['first_seen']:8.2f}s  {record['student_id']}  {record['student_name']}  ({record['score']:.2f})")
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from core.ann_index import RosterIndex
+from core.matching import l2_normalize
+
+
+def clustered(count, clusters=40, dim=128, seed=0):
+    # Vector gom theo cụm như embedding của nhiều ảnh cùng một kiểu khuôn mặt
+    rng = np.random.default_rng(seed)
+    centers = l2_normalize(rng.normal(size=(clusters, dim)).astype(np.float32))
+    labels = rng.integers(0, clusters, count)
+    return l2_normalize(centers[labels] + rng.normal(scale=0.25 / np.sqrt(dim), size=(count, dim)).astype(np.float32))
+
+
+def roster_of(vectors):
+    return [(f"{i:05d}", f"Sinh viên {i}", vector) for i, vector in enumerate(vectors)]
+
+
+def ids(results):
+    return [[student_id for student_id, _, _ in result] for result in results]
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    return clustered(5000)
+
+
+@pytest.fixture(scope="module")
+def queries(vectors):
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(vectors), 200, replace=False)
+    return vectors[picks] + rng.normal(scale=0.02, size=(len(picks), vectors.shape[1])).astype(np.float32)
+
+
+def test_small_roster_is_searched_exactly():
+    vectors = clustered(50)
+    index = RosterIndex()
+    index.sync(roster_of(vectors))
+    assert index.loaded and len(index) == 50
+    results = index.search(vectors[:5], k=3)
+    for i, result in enumerate(results):
+        assert result[0][0] == f"{i:05d}"
+        assert result[0][2] == pytest.approx(1.0, abs=1e-5)
+        scores = [score for _, _, score in result]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_ivf_recall_against_exact(vectors, queries):
+    exact = RosterIndex(exact_threshold=len(vectors) + 1)
+    exact.sync(roster_of(vectors))
+    ivf = RosterIndex(exact_threshold=1000)
+    ivf.sync(roster_of(vectors))
+    assert ivf._centroids is not None
+
+    k = 5
+    expected = ids(exact.search(queries, k=k))
+    found = ids(ivf.search(queries, k=k))
+    recall = np.mean([len(set(a) & set(e)) / k for a, e in zip(found, expected)])
+    top1 = np.mean([a[0] == e[0] for a, e in zip(found, expected)])
+    assert recall >= 0.9
+    assert top1 >= 0.95
+    # Dò mọi cụm cho đúng kết quả vét cạn
+    assert ids(ivf.search(queries, k=k, nprobe=len(ivf._centroids))) == expected
+
+
+def test_delete_rename_and_upsert(vectors):
+    index = RosterIndex(exact_threshold=1000)
+    index.sync(roster_of(vectors[:2000]))
+
+    index.delete("00007")
+    assert "00007" not in index and len(index) == 1999
+    assert index.search(vectors[7], k=1)[0][0][0] != "00007"
+
+    index.rename("00008", "SV-008", name="Nguyễn Văn An")
+    assert "00008" not in index
+    assert index.search(vectors[8], k=1)[0][0][:2] == ("SV-008", "Nguyễn Văn An")
+
+    # Vector mới cho sinh viên có sẵn dùng lại dòng cũ; dòng đã xóa được dùng lại
+    index.upsert("00009", "Sinh viên 9", vectors[1500])
+    assert index.search(vectors[9], k=1, nprobe=1000)[0][0][0] != "00009"
+    index.upsert("new", "Trần Thị Bình", vectors[7])
+    assert index.search(vectors[7], k=1, nprobe=1000)[0][0][0] == "new"
+    assert len(index) == 2000
+    assert len(index._ids) == 2000
+
+    index.upsert("new", "Trần Thị Bình", None)
+    assert "new" not in index
+
+
+def test_sync_removes_missing_students(vectors):
+    index = RosterIndex()
+    index.sync(roster_of(vectors[:10]))
+    index.sync(roster_of(vectors[:4]))
+    assert len(index) == 4
+    assert {result[0][0] for result in index.search(vectors[:10], k=1)} <= {f"{i:05d}" for i in range(4)}
+
+
+def test_empty_index_returns_no_results():
+    index = RosterIndex()
+    assert index.search(np.ones((2, 128), dtype=np.float32)) == [[], []]
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+import csv
+import json
+
+import pytest
+
+from core.batch_attendance import Checkpoint, ResultWriter, discard_unmarked_rows
+
+
+def result_row(image, face):
+    return {"image": image, "face": face, "x": 1, "y": 2, "w": 3, "h": 4,
+            "student_id": "001", "student_name": "Nguyễn Văn An", "score": 0.9}
+
+
+def interrupted_run(tmp_path, output_name, partial_tail):
+    # Ảnh a.jpg xong hẳn; b.jpg đã ghi kết quả nhưng chưa kịp ghi checkpoint
+    output = str(tmp_path / output_name)
+    checkpoint = Checkpoint(str(tmp_path / "run.checkpoint"))
+    writer = ResultWriter(output)
+    writer.write([result_row("a.jpg", 0), result_row("a.jpg", 1)])
+    checkpoint.mark("a.jpg")
+    writer.write([result_row("b.jpg", 0)])
+    writer.close()
+    checkpoint.close()
+    with open(output, "a", encoding="utf-8") as f:
+        f.write(partial_tail)
+    return output, Checkpoint(str(tmp_path / "run.checkpoint"))
+
+
+@pytest.mark.parametrize("output_name, partial_tail", [
+    ("result.csv", "c.jpg,0,5,6"),
+    ("result.jsonl", '{"image": "c.jpg", "fa'),
+])
+def test_resume_keeps_only_checkpointed_rows(tmp_path, output_name, partial_tail):
+    output, checkpoint = interrupted_run(tmp_path, output_name, partial_tail)
+    assert checkpoint.done == {"a.jpg"}
+    assert discard_unmarked_rows(output, checkpoint.done) == 2
+
+    # Chạy tiếp: b.jpg được xử lý lại và chỉ có một bộ kết quả
+    writer = ResultWriter(output)
+    writer.write([result_row("b.jpg", 0)])
+    checkpoint.mark("b.jpg")
+    writer.close()
+    checkpoint.close()
+    with open(output, newline="", encoding="utf-8") as f:
+        if output_name.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f]
+    assert [(row["image"], int(row["face"])) for row in rows] == [("a.jpg", 0), ("a.jpg", 1), ("b.jpg", 0)]
+    assert rows[0]["student_name"] == "Nguyễn Văn An"
+
+
+def test_complete_output_is_left_untouched(tmp_path):
+    output = str(tmp_path / "result.csv")
+    writer = ResultWriter(output)
+    writer.write([result_row("a.jpg", 0)])
+    writer.close()
+    before = open(output, "rb").read()
+    assert discard_unmarked_rows(output, {"a.jpg"}) == 0
+    assert open(output, "rb").read() == before
+    assert discard_unmarked_rows(str(tmp_path / "missing.csv"), set()) == 0
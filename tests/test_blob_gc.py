@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import datetime
+import uuid
+
+import pytest
+
+from benchmarks.fakes import FakeBucket, FakeFirestore, FakeStorageClient
+from core.blob_gc import delete_in_batches, is_app_blob, reconcile
+
+OLD = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=3)
+
+
+def add_blob(bucket, name, created=OLD):
+    blob = bucket.blob(name)
+    blob.upload_from_string(b"image")
+    blob.time_created = created
+    return name
+
+
+def app_name(suffix=".jpg"):
+    return f"{uuid.uuid4()}{suffix}"
+
+
+@pytest.fixture
+def bucket():
+    return FakeBucket()
+
+
+@pytest.fixture
+def db():
+    return FakeFirestore()
+
+
+def test_app_blob_names():
+    base = str(uuid.uuid4())
+    assert is_app_blob(f"{base}.jpg")
+    assert is_app_blob(f"{base}_160.webp")
+    assert is_app_blob(f"{base}_480.webp")
+    assert not is_app_blob(f"{base}_999.webp")
+    assert not is_app_blob(f"backups/{base}.jpg")
+    assert not is_app_blob("logo.png")
+
+
+def test_only_unreferenced_app_blobs_are_deleted(db, bucket):
+    used = add_blob(bucket, app_name())
+    used_thumbnail = add_blob(bucket, used.replace(".jpg", "_160.webp"))
+    orphan = add_blob(bucket, app_name())
+    foreign = add_blob(bucket, "logo.png")
+    foreign_in_folder = add_blob(bucket, f"backups/{app_name()}")
+    db.collection("Students").document("001").set({
+        "ChanDung": bucket.blob(used).public_url,
+        "ChanDung_160": bucket.blob(used_thumbnail).public_url,
+    })
+
+    report, orphans = reconcile(db, bucket, dry_run=False, interval=0)
+    assert [name for name, _, _ in orphans] == [orphan]
+    assert report["foreign"] == 2
+    assert report["deleted"] == 1
+    assert sorted(bucket.objects) == sorted([used, used_thumbnail, foreign, foreign_in_folder])
+
+
+def test_grace_period_and_unknown_creation_time_are_kept(db, bucket):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    old = add_blob(bucket, app_name())
+    recent = add_blob(bucket, app_name(), created=now - datetime.timedelta(hours=1))
+    unknown = add_blob(bucket, app_name(), created=None)
+
+    report, orphans = reconcile(db, bucket, grace_seconds=24 * 60 * 60, dry_run=False, interval=0)
+    assert len(orphans) == 3
+    assert report["within_grace"] == 2
+    assert report["deleted"] == 1
+    assert old not in bucket.objects
+    assert recent in bucket.objects and unknown in bucket.objects
+
+
+def test_dry_run_deletes_nothing(db, bucket):
+    names = [add_blob(bucket, app_name()) for _ in range(3)]
+    report, orphans = reconcile(db, bucket, dry_run=True, interval=0)
+    assert len(orphans) == 3
+    assert report["deleted"] == 0
+    assert sorted(bucket.objects) == sorted(names)
+
+
+def test_prefix_limits_listing(db, bucket):
+    names = sorted(add_blob(bucket, app_name()) for _ in range(20))
+    prefix = names[0][:2]
+    in_prefix = [name for name in names if name.startswith(prefix)]
+    report, orphans = reconcile(db, bucket, dry_run=False, prefix=prefix, interval=0)
+    assert report["listed"] == len(in_prefix)
+    assert sorted(name for name, _, _ in orphans) == in_prefix
+    assert sorted(bucket.objects) == [name for name in names if not name.startswith(prefix)]
+
+
+def test_batch_responses_are_counted_per_object(bucket):
+    client = FakeStorageClient(bucket)
+    names = [add_blob(bucket, app_name()) for _ in range(250)]
+    bucket.failing.add(names[5])
+    bucket.objects.pop(names[7])
+    bucket.metadata.pop(names[7])
+
+    deleted, missing, failed = delete_in_batches(bucket, names + [app_name()], batch_size=500, interval=0)
+    # Tối đa 100 thao tác mỗi request batch
+    assert [len(batch) for batch in client.batches] == [100, 100, 51]
+    assert (deleted, missing, failed) == (248, 2, 1)
+    assert list(bucket.objects) == [names[5]]
+
+
+def test_without_batch_support_each_object_is_counted(bucket):
+    names = [add_blob(bucket, app_name()) for _ in range(5)]
+    bucket.failing.add(names[0])
+    deleted, missing, failed = delete_in_batches(bucket, names + [app_name()], interval=0)
+    assert (deleted, missing, failed) == (4, 1, 1)
+    assert list(bucket.objects) == [names[0]]
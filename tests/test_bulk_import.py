@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from google.api_core.exceptions import AlreadyExists
+
+from benchmarks.fakes import FakeBatch, FakeFirestore
+from core.bulk_import import BATCH_LIMIT, commit_records
+
+
+class RecordingFirestore(FakeFirestore):
+    # Ghi lại số thao tác của mỗi batch được commit; before_commit(số lần commit)
+    # chạy ngay trước mỗi lần commit, giả lập một bên ghi khác chen vào
+    def __init__(self, before_commit=None):
+        super().__init__()
+        self.attempts = []
+        self.before_commit = before_commit
+
+    def batch(self):
+        db = self
+
+        class Batch(FakeBatch):
+            def commit(self):
+                db.attempts.append(len(self._ops))
+                if db.before_commit is not None:
+                    db.before_commit(len(db.attempts))
+                super().commit()
+
+        return Batch(self)
+
+
+def records(count, prefix="SV"):
+    return [(f"{prefix}{i:04d}", {"Name": f"Sinh viên {i}"}) for i in range(count)]
+
+
+def test_records_are_split_into_batches_of_the_firestore_limit():
+    db = RecordingFirestore()
+    students_ref = db.collection("Students")
+    conflicts, failed = commit_records(db, students_ref, records(1200))
+    assert (conflicts, failed) == (set(), {})
+    assert db.attempts == [BATCH_LIMIT, BATCH_LIMIT, 200]
+    assert len(students_ref.docs) == 1200
+
+
+def test_concurrent_create_is_retried_without_the_taken_ids():
+    students_ref = None
+
+    def concurrent_writer(attempt):
+        # Trong lúc nhập, một phiên khác thêm hai sinh viên có ID trùng ở batch thứ hai
+        if attempt == 2:
+            students_ref.document("SV0600").set({"Name": "Người khác"})
+            students_ref.document("SV0700").set({"Name": "Người khác nữa"})
+
+    db = RecordingFirestore(concurrent_writer)
+    students_ref = db.collection("Students")
+    conflicts, failed = commit_records(db, students_ref, records(1000))
+    assert conflicts == {"SV0600", "SV0700"}
+    assert failed == {}
+    # Lần thứ hai thất bại cả batch (nguyên tử), lần thứ ba ghi phần còn lại
+    assert db.attempts == [BATCH_LIMIT, BATCH_LIMIT, BATCH_LIMIT - 2]
+    assert db.commits == 2
+    assert len(students_ref.docs) == 1000
+    # Dữ liệu của bên ghi kia không bị ghi đè
+    assert students_ref.document("SV0600").get().to_dict() == {"Name": "Người khác"}
+    assert students_ref.document("SV0601").get().to_dict() == {"Name": "Sinh viên 601"}
+
+
+def test_already_exists_without_visible_conflict_fails_the_chunk():
+    def deleted_again(attempt):
+        if attempt == 1:
+            raise AlreadyExists("Document already exists")
+
+    db = RecordingFirestore(deleted_again)
+    students_ref = db.collection("Students")
+    conflicts, failed = commit_records(db, students_ref, records(600))
+    assert conflicts == set()
+    assert set(failed) == {f"SV{i:04d}" for i in range(BATCH_LIMIT)}
+    assert len(students_ref.docs) == 100
+
+
+def test_other_errors_fail_only_their_batch():
+    def unavailable(attempt):
+        if attempt == 2:
+            raise ConnectionError("unavailable")
+
+    db = RecordingFirestore(unavailable)
+    students_ref = db.collection("Students")
+    conflicts, failed = commit_records(db, students_ref, records(1100))
+    assert conflicts == set()
+    assert set(failed) == {f"SV{i:04d}" for i in range(BATCH_LIMIT, 2 * BATCH_LIMIT)}
+    assert all(message == "unavailable" for message in failed.values())
+    assert len(students_ref.docs) == 600
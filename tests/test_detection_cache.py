@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+from core import recognition
+from core.ann_index import RosterIndex
+from core.detection_cache import DetectionCache, cache_key
+from core.matching import l2_normalize, match_faces_index
+
+OPENCV_MODELS = SimpleNamespace(backend="opencv", int8=False)
+
+
+def entry(value, size=256):
+    return {"features": np.full(size, value, dtype=np.float32), "size": [640, 480], "scale": 1.5, "face": None}
+
+
+def test_key_depends_on_content_stage_params_and_backend():
+    key = cache_key(b"image", "class_faces", OPENCV_MODELS, decode_size=4096)
+    assert key == cache_key(b"image", "class_faces", SimpleNamespace(backend="opencv", int8=False), decode_size=4096)
+    assert key != cache_key(b"other", "class_faces", OPENCV_MODELS, decode_size=4096)
+    assert key != cache_key(b"image", "verify_id", OPENCV_MODELS, decode_size=4096)
+    assert key != cache_key(b"image", "class_faces", OPENCV_MODELS, decode_size=1280)
+    assert key != cache_key(b"image", "class_faces", SimpleNamespace(backend="onnxruntime", int8=False),
+                            decode_size=4096)
+    assert key != cache_key(b"image", "class_faces", SimpleNamespace(backend="opencv", int8=True), decode_size=4096)
+
+
+def test_lru_eviction_spills_to_disk_and_reloads(tmp_path):
+    cache = DetectionCache(memory_limit=2500, disk_dir=str(tmp_path))
+    for i in range(3):
+        cache.put(f"k{i}", entry(i))
+    # Mỗi mục ~1 KB: mục dùng lâu nhất bị đẩy ra đĩa
+    assert cache.report()["entries"] == 2
+    assert cache.stats["spills"] == 1
+    assert os.path.exists(tmp_path / "k0.npz")
+
+    cache.get("k1")
+    cache.put("k3", entry(3))
+    # k1 vừa được dùng nên k2 bị đẩy ra trước
+    assert os.path.exists(tmp_path / "k2.npz")
+    assert not os.path.exists(tmp_path / "k1.npz")
+
+    reloaded = cache.get("k0")
+    assert cache.stats["disk_hits"] == 1
+    assert np.array_equal(reloaded["features"], entry(0)["features"])
+    assert reloaded["size"] == [640, 480] and reloaded["scale"] == 1.5 and reloaded["face"] is None
+    assert cache.get("missing") is None
+    assert cache.stats["misses"] == 1
+
+
+def test_without_disk_evicted_entries_are_recomputed():
+    cache = DetectionCache(memory_limit=1500, disk_dir=None)
+    calls = []
+
+    def compute(i):
+        calls.append(i)
+        return entry(i)
+
+    for i in (0, 1, 0):
+        cache.get_or_compute(f"k{i}", lambda: compute(i))
+    assert calls == [0, 1, 0]
+    cache.get_or_compute("k0", lambda: compute(0))
+    assert calls == [0, 1, 0]
+
+
+def test_unreadable_disk_entry_is_dropped(tmp_path):
+    (tmp_path / "bad.npz").write_bytes(b"not a zip")
+    cache = DetectionCache(disk_dir=str(tmp_path))
+    assert cache.get("bad") is None
+    assert not os.path.exists(tmp_path / "bad.npz")
+
+
+def test_prune_disk_removes_oldest_files(tmp_path):
+    cache = DetectionCache(memory_limit=0, disk_dir=str(tmp_path), disk_limit=10 ** 9)
+    for i in range(4):
+        cache._spill(f"k{i}", entry(i))
+        os.utime(tmp_path / f"k{i}.npz", (i, i))
+    size = os.path.getsize(tmp_path / "k0.npz")
+    cache.disk_limit = 2 * size
+    cache.prune_disk()
+    assert sorted(os.listdir(tmp_path)) == ["k2.npz", "k3.npz"]
+
+
+def test_threshold_change_rescores_cached_features(monkeypatch):
+    rng = np.random.default_rng(0)
+    roster_vectors = l2_normalize(rng.normal(size=(20, 128)))
+    index = RosterIndex()
+    index.sync([(f"{i:02d}", f"Sinh viên {i}", vector) for i, vector in enumerate(roster_vectors)])
+    faces = [(10, 10, 40, 40), (100, 10, 40, 40), (200, 10, 40, 40)]
+    # Khuôn mặt gần sinh viên 0 và 1 ở các mức khác nhau, khuôn mặt thứ ba lạ
+    features = l2_normalize(np.vstack([roster_vectors[0] + 0.3 * rng.normal(size=128) / np.sqrt(128),
+                                       roster_vectors[1] + 1.0 * rng.normal(size=128) / np.sqrt(128),
+                                       rng.normal(size=128)]))
+    calls = []
+
+    def process_class_image(image_data, models, **detect_options):
+        calls.append(detect_options)
+        decoded = SimpleNamespace(size=(800, 600), scale=2.0)
+        return None, faces, [(face, features[i:i + 1]) for i, face in enumerate(faces)], decoded
+
+    monkeypatch.setattr(recognition, "process_class_image", process_class_image)
+    cache = DetectionCache(disk_dir=None)
+
+    results = {}
+    for threshold in (0.9, 0.5, 0.0):
+        cached_faces, face_features, size = recognition.cached_class_faces(b"class photo", OPENCV_MODELS, cache,
+                                                                           tile_size=1024, workers=4)
+        results[threshold] = match_faces_index(face_features, index, threshold)
+    # Chỉ phát hiện một lần; đổi ngưỡng chỉ so khớp lại
+    assert len(calls) == 1
+    assert cached_faces == faces and size == (800, 600)
+    assert [len(matches) > 0 for matches in results[0.9]] == [True, False, False]
+    assert [len(matches) > 0 for matches in results[0.5]] == [True, True, False]
+    assert results[0.9][0][0][0] == "Sinh viên 0"
+    for threshold, face_matches in results.items():
+        assert all(score > threshold for matches in face_matches for _, score in matches)
+
+    # Số luồng không thuộc khóa; tham số phát hiện thì có
+    recognition.cached_class_faces(b"class photo", OPENCV_MODELS, cache, tile_size=1024, workers=1)
+    assert len(calls) == 1
+    recognition.cached_class_faces(b"class photo", OPENCV_MODELS, cache, tile_size=512, workers=4)
+    assert len(calls) == 2
+    recognition.cached_class_faces(b"class photo", SimpleNamespace(backend="onnxruntime", int8=False), cache,
+                                   tile_size=1024, workers=4)
+    assert len(calls) == 3
+
+
+def test_put_copies_entry():
+    cache = DetectionCache(disk_dir=None)
+    original = entry(1.0)
+    cache.put("k", original)
+    original["scale"] = 99
+    assert cache.get("k")["scale"] == 1.5
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from io import BytesIO
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image, ImageOps
+
+from core import image_decode
+from core.image_decode import EXIF_ORIENTATION, decode_image, read_image_info, reduction_factor
+
+# Bốn góc màu khác nhau để nhận ra ảnh đã được lật/xoay đúng chưa
+QUADRANT_COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0)]
+
+
+def quadrant_image(width=160, height=100):
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    half_h, half_w = height // 2, width // 2
+    img[:half_h, :half_w] = QUADRANT_COLORS[0]
+    img[:half_h, half_w:] = QUADRANT_COLORS[1]
+    img[half_h:, :half_w] = QUADRANT_COLORS[2]
+    img[half_h:, half_w:] = QUADRANT_COLORS[3]
+    return img
+
+
+def encode_jpeg(img_rgb, orientation=None, quality=95):
+    pil_img = Image.fromarray(img_rgb)
+    buffer = BytesIO()
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[EXIF_ORIENTATION] = orientation
+    pil_img.save(buffer, "JPEG", quality=quality, exif=exif)
+    return buffer.getvalue()
+
+
+def quadrant_means(img):
+    height, width = img.shape[:2]
+    half_h, half_w = height // 2, width // 2
+    return np.array([img[:half_h, :half_w].mean(axis=(0, 1)), img[:half_h, half_w:].mean(axis=(0, 1)),
+                     img[half_h:, :half_w].mean(axis=(0, 1)), img[half_h:, half_w:].mean(axis=(0, 1))])
+
+
+@pytest.mark.parametrize("orientation", range(1, 9))
+def test_exif_orientation_matches_pil(orientation):
+    data = encode_jpeg(quadrant_image(), orientation)
+    with Image.open(BytesIO(data)) as pil_img:
+        expected = np.asarray(ImageOps.exif_transpose(pil_img).convert("RGB"))
+    decoded = decode_image(data, need=("rgb",))
+    assert decoded.rgb.shape == expected.shape
+    assert decoded.original_size == (expected.shape[1], expected.shape[0])
+    assert np.abs(quadrant_means(decoded.rgb) - quadrant_means(expected)).max() < 8
+    if orientation in (5, 6, 7, 8):
+        assert decoded.size == (100, 160)
+
+
+def test_reduced_decode_keeps_target_size_and_scale():
+    data = encode_jpeg(quadrant_image(4000, 3000), quality=80)
+    assert reduction_factor((4000, 3000), 1024) == 2
+    assert reduction_factor((4000, 3000), 600) == 4
+    assert reduction_factor((4000, 3000), 500) == 8
+    assert reduction_factor((4000, 3000), 4096) == 1
+    assert reduction_factor((4000, 3000), None) == 1
+
+    decoded = decode_image(data, 1024, need=("bgr", "rgb", "gray"))
+    assert decoded.size == (2000, 1500)
+    assert decoded.scale == 2.0
+    assert decoded.original_size == (4000, 3000)
+    assert decoded.bgr.shape == (1500, 2000, 3) and decoded.gray.shape == (1500, 2000)
+    assert np.array_equal(decoded.rgb, decoded.bgr[:, :, ::-1])
+
+    gray = decode_image(data, 400, need=("gray",))
+    assert gray.size == (500, 375) and gray.scale == 8.0
+    assert gray.bgr is None and gray.rgb is None
+
+    full = decode_image(data)
+    assert full.size == (4000, 3000) and full.scale == 1.0
+
+
+def test_boxes_map_back_to_original():
+    data = encode_jpeg(quadrant_image(4000, 3000), quality=80)
+    decoded = decode_image(data, 600)
+    assert decoded.scale == 4.0
+    boxes = [(10, 20, 30, 40), np.array([1.4, 2.6, 3.5, 4.0, 0.9])]
+    assert decoded.to_original(boxes) == [(40, 80, 120, 160), (6, 10, 14, 16)]
+
+
+def test_oversized_image_is_rejected_before_decoding(monkeypatch):
+    calls = []
+    monkeypatch.setattr(image_decode.cv2, "imdecode", lambda *args: calls.append(args))
+    buffer = BytesIO()
+    Image.new("1", (12000, 9000)).save(buffer, "PNG")
+    data = buffer.getvalue()
+    with pytest.warns(Image.DecompressionBombWarning), pytest.raises(ValueError):
+        read_image_info(data)
+    with pytest.warns(Image.DecompressionBombWarning), pytest.raises(ValueError):
+        decode_image(data)
+    assert calls == []
+
+    monkeypatch.setattr(image_decode, "MAX_IMAGE_PIXELS", 100 * 100 - 1)
+    with pytest.raises(ValueError):
+        decode_image(encode_jpeg(quadrant_image(100, 100)))
+    assert calls == []
+
+
+def test_unreadable_data_is_rejected():
+    with pytest.raises(ValueError):
+        decode_image(b"not an image")
+    # Phần đầu hợp lệ nhưng dữ liệu điểm ảnh bị cắt cụt
+    data = encode_jpeg(quadrant_image())
+    with pytest.raises(ValueError):
+        decode_image(data[:200])
+    assert cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) is not None
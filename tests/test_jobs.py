@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pytest
+
+from core.jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobQueue, JobQueueFull
+
+
+def wait_finished(job, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not job.finished_state and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return job.finished_state
+
+
+def blocking(job, release, started=None):
+    if started is not None:
+        started.set()
+    release.wait(2.0)
+    return "done"
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+def test_result_and_progress():
+    queue = JobQueue(max_running=1)
+
+    def work(job, value):
+        job.update(stage="work", value=value)
+        return value * 2
+
+    job = queue.submit("test", work, 21)
+    assert wait_finished(job)
+    assert job.status == DONE
+    assert job.result == 42
+    assert job.snapshot()["progress"] == {"stage": "work", "value": 21}
+    assert queue.get(job.id) is job
+
+
+def test_failure_is_reported():
+    queue = JobQueue(max_running=1)
+
+    def broken(job):
+        raise ValueError("Ảnh không hợp lệ")
+
+    job = queue.submit("test", broken)
+    assert wait_finished(job)
+    assert job.status == FAILED
+    assert job.error == "Ảnh không hợp lệ"
+
+
+def test_admission_control(release):
+    queue = JobQueue(max_running=1, max_queued=2)
+    started = threading.Event()
+    running = queue.submit("test", blocking, release, started)
+    assert started.wait(2.0)
+    waiting = [queue.submit("test", blocking, release) for _ in range(2)]
+    with pytest.raises(JobQueueFull):
+        queue.submit("test", blocking, release)
+    assert running.status == RUNNING
+    assert [job.status for job in waiting] == [QUEUED, QUEUED]
+    assert queue.position(waiting[1]) == 1
+    assert queue.report()["queued"] == 2
+
+    release.set()
+    assert all(wait_finished(job) for job in [running] + waiting)
+    # Hàng đợi đã trống: nhận job mới
+    assert wait_finished(queue.submit("test", blocking, release))
+
+
+def test_cancel_before_start(release):
+    queue = JobQueue(max_running=1)
+    started = threading.Event()
+    running = queue.submit("test", blocking, release, started)
+    assert started.wait(2.0)
+    calls = []
+    waiting = queue.submit("test", lambda job: calls.append(job))
+    waiting.cancel()
+    assert waiting.status == CANCELLED
+    release.set()
+    assert wait_finished(running)
+    assert calls == []
+    assert waiting.status == CANCELLED
+
+
+def test_cancel_raised_from_update():
+    queue = JobQueue(max_running=1)
+    started = threading.Event()
+    proceed = threading.Event()
+    steps = []
+
+    def work(job):
+        job.update(stage="first")
+        steps.append("first")
+        started.set()
+        proceed.wait(2.0)
+        job.update(stage="second")
+        steps.append("second")
+
+    job = queue.submit("test", work)
+    assert started.wait(2.0)
+    job.cancel()
+    proceed.set()
+    assert wait_finished(job)
+    assert job.status == CANCELLED
+    assert steps == ["first"]
+    assert job.snapshot()["progress"] == {"stage": "second"}
+
+
+def test_finished_results_expire_after_ttl():
+    queue = JobQueue(max_running=1, result_ttl=0.05)
+    job = queue.submit("test", lambda job: "result")
+    assert wait_finished(job)
+    assert queue.get(job.id) is job
+    time.sleep(0.1)
+    # Job hết hạn được dọn ở lần nhận job kế tiếp
+    other = queue.submit("test", lambda job: "other")
+    assert queue.get(job.id) is None
+    assert wait_finished(other)
+    assert queue.get(other.id) is other
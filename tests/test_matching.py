@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from core.matching import match_faces, stack_features, top_k_matches
+
+NAMES = ["An", "Bình", "Chương", "Dũng", "Hà"]
+
+
+def brute_force(scores, names, threshold, top_k):
+    # So khớp vét cạn: sắp xếp toàn bộ hàng rồi lọc theo ngưỡng
+    face_matches = []
+    for row in scores:
+        order = sorted(range(len(names)), key=lambda j: -row[j])
+        if top_k is not None:
+            order = order[:top_k]
+        face_matches.append([(names[j], float(row[j])) for j in order if row[j] > threshold])
+    return face_matches
+
+
+def test_threshold_filters_and_order_is_descending():
+    scores = np.array([[0.2, 0.9, 0.5, 0.36, 0.7],
+                       [0.1, 0.2, 0.3, 0.1, 0.0]], dtype=np.float32)
+    matches = top_k_matches(scores, NAMES, threshold=0.363, top_k=5)
+    assert [name for name, _ in matches[0]] == ["Bình", "Hà", "Chương"]
+    assert [score for _, score in matches[0]] == pytest.approx([0.9, 0.7, 0.5])
+    # Không ai vượt ngưỡng: danh sách rỗng nhưng vẫn giữ vị trí khuôn mặt
+    assert matches[1] == []
+    # Điểm đúng bằng ngưỡng không được giữ
+    assert top_k_matches(scores, NAMES, threshold=0.5, top_k=5)[0] == [("Bình", pytest.approx(0.9)),
+                                                                       ("Hà", pytest.approx(0.7))]
+
+
+def test_top_k_keeps_best_candidates():
+    scores = np.array([[0.2, 0.9, 0.5, 0.36, 0.7]], dtype=np.float32)
+    assert [name for name, _ in top_k_matches(scores, NAMES, threshold=0.0, top_k=2)[0]] == ["Bình", "Hà"]
+    assert [name for name, _ in top_k_matches(scores, NAMES, threshold=0.0, top_k=1)[0]] == ["Bình"]
+
+
+@pytest.mark.parametrize("top_k", [5, 8, None])
+def test_k_not_smaller_than_roster_returns_everyone_above_threshold(top_k):
+    scores = np.array([[0.2, 0.9, 0.5, 0.36, 0.7]], dtype=np.float32)
+    matches = top_k_matches(scores, NAMES, threshold=0.0, top_k=top_k)
+    assert [name for name, _ in matches[0]] == ["Bình", "Hà", "Chương", "Dũng", "An"]
+
+
+def test_empty_inputs():
+    assert top_k_matches(np.zeros((0, 5), dtype=np.float32), NAMES, 0.3) == []
+    assert top_k_matches(np.zeros((3, 0), dtype=np.float32), [], 0.3) == [[], [], []]
+    assert match_faces([], [("001", "An", np.ones((1, 128), dtype=np.float32))], 0.3) == []
+
+
+@pytest.mark.parametrize("top_k", [1, 3, 5, 40, None])
+def test_agrees_with_brute_force(top_k):
+    rng = np.random.default_rng(0)
+    names = [f"SV{i:03d}" for i in range(30)]
+    scores = rng.uniform(-1, 1, size=(12, len(names))).astype(np.float32)
+    assert top_k_matches(scores, names, 0.3, top_k) == brute_force(scores, names, 0.3, top_k)
+
+
+def test_match_faces_uses_cosine_similarity():
+    rng = np.random.default_rng(1)
+    roster_features = rng.normal(size=(4, 128)).astype(np.float32)
+    roster = [(f"00{i}", NAMES[i], roster_features[i:i + 1]) for i in range(4)]
+    # Khuôn mặt là bản co giãn của sinh viên thứ 3: cosine bằng 1 bất kể độ dài
+    class_features = [((0, 0, 50, 50), 7.5 * roster_features[2:3])]
+    matches = match_faces(class_features, roster, threshold=0.9)
+    assert len(matches) == 1
+    assert [name for name, _ in matches[0]] == ["Chương"]
+    assert matches[0][0][1] == pytest.approx(1.0, abs=1e-5)
+    assert stack_features([np.zeros((1, 128))]).shape == (1, 128)
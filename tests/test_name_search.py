@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+import unicodedata
+
+import pytest
+
+from benchmarks.fakes import FakeFirestore
+from core.name_search import (BATCH_LIMIT, NamePrefixIndex, matches_name, name_tokens, normalize_text,
+                              parse_name_query, tokens_of)
+
+
+@pytest.fixture
+def index():
+    index = NamePrefixIndex()
+    for student_id, name in [("001", "Nguyễn Văn An"), ("002", "Nguyễn Thị Ánh"), ("003", "Ngô Bảo Châu"),
+                             ("004", "Đặng Minh An"), ("005", "Hoàng Văn Chương")]:
+        index.add(student_id, *tokens_of({"Name": name}))
+    return index
+
+
+def test_normalize_removes_vietnamese_diacritics():
+    assert normalize_text("Nguyễn") == "nguyen"
+    assert normalize_text("ĐẶNG") == "dang"
+    assert normalize_text("Chương Ưng Ỷ") == "chuong ung y"
+    assert normalize_text("") == ""
+    assert normalize_text(None) == ""
+
+
+def test_normalize_handles_decomposed_input():
+    # Chữ có dấu dạng tổ hợp (NFD), ví dụ gõ từ macOS, cho cùng kết quả với NFC
+    for text in ["Nguyễn", "Hoàng", "Trương Thị Ánh"]:
+        decomposed = unicodedata.normalize("NFD", text)
+        assert decomposed != text
+        assert normalize_text(decomposed) == normalize_text(text)
+    assert normalize_text(unicodedata.normalize("NFD", "Nguyễn")) == "nguyen"
+
+
+def test_name_tokens_and_query():
+    assert name_tokens("Hoàng Văn Chương") == {"HoNorm": "hoang", "TenNorm": "chuong"}
+    assert name_tokens("  Ánh  ") == {"HoNorm": "anh", "TenNorm": "anh"}
+    assert name_tokens("") == {"HoNorm": "", "TenNorm": ""}
+    assert parse_name_query(" Hoàng ") == ("hoang", True)
+    assert parse_name_query("#Chương") == ("chuong", False)
+    assert parse_name_query("# chuong") == ("chuong", False)
+    # Token đã lưu được dùng thay vì tính lại từ Name
+    assert tokens_of({"Name": "Hoàng Văn Chương", "HoNorm": "x", "TenNorm": "y"}) == ("x", "y")
+
+
+def test_prefix_lookup_by_surname(index):
+    assert index.lookup("nguyen", True) == ["001", "002"]
+    assert sorted(index.lookup("ng", True)) == ["001", "002", "003"]
+    assert index.lookup("d", True) == ["004"]
+    assert index.lookup("tran", True) == []
+
+
+def test_exact_lookup_by_given_name(index):
+    assert index.lookup("an", False) == ["001", "004"]
+    assert index.lookup("anh", False) == ["002"]
+    # Tiền tố của tên không được tính
+    assert index.lookup("a", False) == []
+    assert index.lookup("chuong", False) == ["005"]
+
+
+def test_lookup_agrees_with_linear_scan(index):
+    # Tìm theo họ là tìm tiền tố (như khi chỉ nhập tên), tìm theo tên là khớp chính xác
+    students = {"001": "Nguyễn Văn An", "002": "Nguyễn Thị Ánh", "003": "Ngô Bảo Châu",
+                "004": "Đặng Minh An", "005": "Hoàng Văn Chương"}
+    for query in ["Ng", "nguyễn", "Đặ", "h", "#An", "#Ánh", "#chau", "#Ch"]:
+        normalized, by_last_name = parse_name_query(query)
+        expected = []
+        for student_id, name in students.items():
+            ho, ten = tokens_of({"Name": name})
+            if (ho.startswith(normalized) if by_last_name else ten == normalized):
+                expected.append(student_id)
+        assert sorted(index.lookup(normalized, by_last_name)) == expected
+
+
+def test_matches_name_keeps_substring_surname_match():
+    # Khi tìm kết hợp ID và tên, họ chỉ cần chứa chuỗi tìm kiếm
+    assert matches_name({"Name": "Hoàng Văn Chương"}, "oang", True)
+    assert matches_name({"HoNorm": "hoang", "TenNorm": "chuong"}, "chuong", False)
+    assert not matches_name({"Name": "Hoàng Văn Chương"}, "chuon", False)
+    assert not matches_name({"Name": ""}, "", True)
+
+
+def test_add_replaces_and_remove_drops(index):
+    index.add("001", *tokens_of({"Name": "Trần Văn Bình"}))
+    assert index.lookup("nguyen", True) == ["002"]
+    assert index.lookup("tran", True) == ["001"]
+    assert index.lookup("an", False) == ["004"]
+    index.remove("004")
+    index.remove("999")
+    assert index.lookup("an", False) == []
+    assert len(index) == 4
+
+
+def test_load_backfills_missing_tokens():
+    db = FakeFirestore()
+    students_ref = db.collection("Students")
+    students_ref.document("001").set({"Name": "Nguyễn Văn An", "HoNorm": "nguyen", "TenNorm": "an"})
+    old_ids = [f"{i:04d}" for i in range(2, BATCH_LIMIT + 12)]
+    for student_id in old_ids:
+        students_ref.document(student_id).set({"Name": "Hoàng Văn Chương", "MSSV": student_id})
+
+    index = NamePrefixIndex()
+    index.load(students_ref, db)
+    assert index.loaded
+    assert len(index) == len(old_ids) + 1
+    assert index.lookup("an", False) == ["001"]
+    assert sorted(index.lookup("chuong", False)) == old_ids
+    # Ghi bù theo batch tối đa BATCH_LIMIT thao tác, không đụng tới các trường khác
+    assert db.commits == 2
+    for student_id in old_ids:
+        data = students_ref.docs[student_id]
+        assert (data["HoNorm"], data["TenNorm"]) == ("hoang", "chuong")
+        assert data["MSSV"] == student_id
+
+    # Lần nạp sau không còn gì để ghi
+    NamePrefixIndex().load(students_ref, db)
+    assert db.commits == 2
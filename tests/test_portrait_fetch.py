@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import socket
+import time
+
+import pytest
+
+from benchmarks.fakes import LocalImageServer
+from core.portrait_fetch import fetch_portraits, make_session
+
+
+@pytest.fixture
+def server():
+    with LocalImageServer() as image_server:
+        yield image_server
+
+
+@pytest.fixture
+def session():
+    # Không thử lại và không chờ giữa các lần thử để bài kiểm tra chạy nhanh
+    session = make_session(pool_size=4, retries=0, backoff=0)
+    yield session
+    session.close()
+
+
+def unused_port_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/missing.jpg"
+
+
+def test_yields_in_completion_order(server, session):
+    slow = server.add("slow.jpg", b"slow", delay=0.5)
+    fast = server.add("fast.jpg", b"fast")
+    results = list(fetch_portraits([("slow", slow), ("fast", fast)], session=session, max_workers=2))
+    assert results == [("fast", b"fast"), ("slow", b"slow")]
+
+
+def test_first_result_does_not_wait_for_slow_downloads(server, session):
+    items = [("slow", server.add("slow.jpg", b"slow", delay=1.0))] + \
+        [(i, server.add(f"{i}.jpg", bytes([i]))) for i in range(5)]
+    start = time.perf_counter()
+    results = fetch_portraits(items, session=session, max_workers=4)
+    key, content = next(results)
+    assert time.perf_counter() - start < 0.8
+    assert key != "slow" and content == bytes([key])
+    assert dict(results)["slow"] == b"slow"
+
+
+def test_read_timeout_returns_none(server, session):
+    url = server.add("hang.jpg", b"late", delay=2.0)
+    start = time.perf_counter()
+    assert list(fetch_portraits([("hang", url)], session=session, timeout=(1.0, 0.2))) == [("hang", None)]
+    assert time.perf_counter() - start < 1.5
+
+
+@pytest.mark.parametrize("status", [404, 403, 500])
+def test_error_status_returns_none(server, session, status):
+    url = server.add("broken.jpg", status=status)
+    assert list(fetch_portraits([("broken", url)], session=session)) == [("broken", None)]
+
+
+def test_connection_error_returns_none(session):
+    assert list(fetch_portraits([("down", unused_port_url())], session=session)) == [("down", None)]
+
+
+def test_failures_do_not_stop_other_downloads(server, session):
+    items = [("ok", server.add("ok.jpg", b"ok")), ("missing", server.add("missing.jpg", status=404)),
+             ("down", unused_port_url())]
+    assert dict(fetch_portraits(items, session=session)) == {"ok": b"ok", "missing": None, "down": None}
+
+
+def test_retries_transient_errors(server):
+    url = server.add("busy.jpg", status=503)
+    session = make_session(pool_size=1, retries=2, backoff=0)
+    try:
+        assert list(fetch_portraits([("busy", url)], session=session)) == [("busy", None)]
+    finally:
+        session.close()
+    assert server.hits("busy.jpg") == 3
+
+
+def test_limits_pending_requests(server, session):
+    consumed = []
+
+    def items():
+        for i in range(20):
+            consumed.append(i)
+            yield i, server.add(f"{i}.jpg", bytes([i]), delay=0.05)
+
+    results = fetch_portraits(items(), session=session, max_workers=2)
+    next(results)
+    # Tối đa 2 * max_workers request chờ, cộng một request bù cho kết quả vừa trả
+    assert len(consumed) <= 5
+    assert len(list(results)) == 19
+
+
+def test_empty_input(session):
+    assert list(fetch_portraits([], session=session)) == []
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from core import recognition
+from core.ann_index import RosterIndex
+from core.roster_store import RosterStore
+
+
+class FakeModels:
+    @contextmanager
+    def lease(self, name):
+        yield name
+
+
+def test_concurrent_cold_start_loads_once(monkeypatch, tmp_path):
+    roster_index = RosterIndex()
+    roster_store = RosterStore(str(tmp_path))
+    loads = []
+
+    def load_students(students_ref):
+        loads.append(students_ref)
+        time.sleep(0.1)
+        return []
+
+    def load_roster_features(students, detector, feature_net, progress=None):
+        return [("001", "Nguyễn Văn An", np.ones((1, 128), dtype=np.float32))]
+
+    monkeypatch.setattr(recognition, "get_roster_index", lambda: roster_index)
+    monkeypatch.setattr(recognition, "get_roster_store", lambda: roster_store)
+    monkeypatch.setattr(recognition, "load_students", load_students)
+    monkeypatch.setattr(recognition, "load_roster_features", load_roster_features)
+
+    class FakeDb:
+        def collection(self, name):
+            return name
+
+    results = []
+
+    def start_job():
+        results.append(recognition.ensure_roster_index(FakeDb(), FakeModels()))
+
+    threads = [threading.Thread(target=start_job) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert results == [roster_index] * 4
+    assert "001" in roster_index
+    assert roster_store.complete and roster_store.size == 1
+
+    # refresh buộc nạp lại từ Firestore
+    recognition.ensure_roster_index(FakeDb(), FakeModels(), refresh=True)
+    assert len(loads) == 2
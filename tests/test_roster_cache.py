@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from benchmarks.fakes import FakeCollection
+from core import roster_cache
+from core.ann_index import RosterIndex
+from core.embeddings import embedding_fields
+from core.name_search import NamePrefixIndex
+from core.recognition import apply_student_changes
+from core.roster_cache import RosterCache
+from core.roster_store import RosterStore
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+class Recorder:
+    # Hàm nghe ghi lại từng lần gửi
+    def __init__(self):
+        self.deliveries = []
+        self._lock = threading.Lock()
+
+    def __call__(self, changes):
+        with self._lock:
+            self.deliveries.append(sorted(changes, key=lambda change: change[0]))
+
+    @property
+    def changes(self):
+        with self._lock:
+            return [change for delivery in self.deliveries for change in delivery]
+
+
+@pytest.fixture(autouse=True)
+def fast_reconnect(monkeypatch):
+    monkeypatch.setattr(roster_cache, "RECONNECT_BACKOFF_SECONDS", (0.01,))
+
+
+@pytest.fixture
+def students():
+    collection = FakeCollection("Students")
+    collection.document("001").set({"Name": "Nguyễn Văn An"})
+    collection.document("002").set({"Name": "Trần Thị Bình"})
+    return collection
+
+
+@pytest.fixture
+def cache(students):
+    cache = RosterCache(check_interval=0.02)
+    recorder = Recorder()
+    cache.add_listener("test", recorder)
+    cache.start(students)
+    assert cache.wait_ready(1.0)
+    yield cache, recorder
+    cache.stop()
+
+
+def test_initial_load_is_not_reported_as_changes(cache):
+    cache, recorder = cache
+    assert cache.count() == 2
+    assert cache.get("001") == {"Name": "Nguyễn Văn An"}
+    assert sorted(student.id for student in cache.students()) == ["001", "002"]
+    assert cache.staleness() == 0.0
+    assert recorder.deliveries == []
+
+
+def test_live_changes_are_applied_and_reported(cache, students):
+    cache, recorder = cache
+    students.document("003").set({"Name": "Lê Văn Chương"})
+    students.document("001").set({"Name": "Nguyễn Văn Anh"})
+    students.document("002").delete()
+    assert cache.get("003") == {"Name": "Lê Văn Chương"}
+    assert cache.get("001") == {"Name": "Nguyễn Văn Anh"}
+    assert cache.get("002") is None
+    assert recorder.changes == [("003", {"Name": "Lê Văn Chương"}), ("001", {"Name": "Nguyễn Văn Anh"}),
+                                ("002", None)]
+
+
+def test_page_reads_sorted_ids(cache, students):
+    cache, _ = cache
+    students.document("000").set({"Name": "Phạm Minh"})
+    rows, next_cursor = cache.page(2)
+    assert [row["ID"] for row in rows] == ["000", "001"]
+    rows, next_cursor = cache.page(2, start_after=next_cursor)
+    assert [row["ID"] for row in rows] == ["002"]
+    assert next_cursor is None
+
+
+def test_disconnect_reports_staleness(cache, students):
+    cache, _ = cache
+    cache._stop.set()  # giữ trạng thái mất kết nối, không cho luồng giám sát nối lại
+    cache._watch.disconnect()
+    time.sleep(0.05)
+    assert cache.staleness() > 0
+    assert not cache.report()["active"]
+
+
+def test_reconnect_resyncs_and_reports_missed_changes(cache, students):
+    cache, recorder = cache
+    cache._watch.disconnect()
+    # Các thay đổi trong lúc mất kết nối bị bỏ lỡ
+    students.document("003").set({"Name": "Lê Văn Chương"})
+    students.document("001").set({"Name": "Nguyễn Văn Anh"})
+    students.document("002").delete()
+    assert wait_until(lambda: cache.stats["resyncs"] == 1)
+    assert cache.stats["reconnects"] >= 1
+    assert cache.count() == 2
+    assert cache.get("002") is None
+    assert cache.get("003") == {"Name": "Lê Văn Chương"}
+    # Chỉ các bản ghi thực sự khác được báo, trong một lần gửi
+    assert recorder.deliveries == [[("001", {"Name": "Nguyễn Văn Anh"}), ("002", None),
+                                    ("003", {"Name": "Lê Văn Chương"})]]
+    assert wait_until(lambda: cache.staleness() == 0.0)
+
+
+def test_resync_without_missed_changes_reports_nothing(cache):
+    cache, recorder = cache
+    cache._watch.disconnect()
+    assert wait_until(lambda: cache.stats["resyncs"] == 1)
+    assert recorder.deliveries == []
+    assert cache.count() == 2
+
+
+def test_changes_after_reconnect_are_live_again(cache, students):
+    cache, recorder = cache
+    cache._watch.disconnect()
+    assert wait_until(lambda: cache.stats["resyncs"] == 1)
+    students.document("004").set({"Name": "Võ Thảo"})
+    assert cache.get("004") == {"Name": "Võ Thảo"}
+    assert recorder.changes == [("004", {"Name": "Võ Thảo"})]
+
+
+def test_subscribe_failure_is_retried(students):
+    original = students.on_snapshot
+    attempts = []
+
+    def flaky_on_snapshot(callback):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("unavailable")
+        return original(callback)
+
+    students.on_snapshot = flaky_on_snapshot
+    cache = RosterCache(check_interval=0.02)
+    try:
+        cache.start(students)
+        assert not cache.ready
+        assert cache.stats["errors"] == 1
+        assert cache.wait_ready(2.0)
+        assert cache.count() == 2
+        assert cache.stats["reconnects"] >= 1
+    finally:
+        cache.stop()
+
+
+def test_failing_listener_does_not_block_others(cache, students):
+    cache, recorder = cache
+
+    def broken(changes):
+        raise RuntimeError("boom")
+
+    cache.add_listener("broken", broken)
+    students.document("005").set({"Name": "Đỗ Hải"})
+    assert cache.get("005") == {"Name": "Đỗ Hải"}
+    assert recorder.changes == [("005", {"Name": "Đỗ Hải"})]
+
+
+def test_stop_unsubscribes(cache, students):
+    cache, _ = cache
+    cache.stop()
+    assert not students.watches
+    students.document("006").set({"Name": "Bùi Long"})
+    assert cache.get("006") is None
+
+
+@pytest.fixture
+def indexes(tmp_path):
+    roster_index = RosterIndex()
+    roster_index.sync([])
+    roster_store = RosterStore(str(tmp_path))
+    roster_store.sync([])
+    return NamePrefixIndex(), roster_index, roster_store
+
+
+def student_record(name, portrait, feature):
+    return {"Name": name, "ChanDung": portrait, **embedding_fields(feature, portrait)}
+
+
+def test_changed_portrait_without_embedding_leaves_index(indexes):
+    name_index, roster_index, roster_store = indexes
+    feature = np.random.default_rng(0).normal(size=(1, 128)).astype(np.float32)
+    record = student_record("Nguyễn Văn An", "https://img/old.jpg", feature)
+    assert apply_student_changes([("001", record)], name_index, roster_index, roster_store) == []
+    assert "001" in roster_index
+    assert roster_store.size == 1
+
+    # Ảnh chân dung mới, embedding vẫn là của ảnh cũ
+    changed = dict(record, ChanDung="https://img/new.jpg")
+    assert apply_student_changes([("001", changed)], name_index, roster_index, roster_store) == ["001"]
+    assert "001" not in roster_index
+    assert roster_store.size == 0
+    assert roster_index.search(feature, k=1) == [[]]
+
+    # Embedding mới được ghi: sinh viên trở lại chỉ mục
+    fresh = student_record("Nguyễn Văn An", "https://img/new.jpg", -feature)
+    assert apply_student_changes([("001", fresh)], name_index, roster_index, roster_store) == []
+    assert roster_index.search(-feature, k=1)[0][0][0] == "001"
+    assert [student_id for student_id, _, _ in roster_store.roster()] == ["001"]
+
+
+def test_removed_portrait_or_no_face_leaves_index(indexes):
+    name_index, roster_index, roster_store = indexes
+    feature = np.random.default_rng(1).normal(size=(1, 128)).astype(np.float32)
+    apply_student_changes([("001", student_record("Trần Thị Bình", "https://img/1.jpg", feature)),
+                           ("002", student_record("Lê Văn Chương", "https://img/2.jpg", feature))],
+                          name_index, roster_index, roster_store)
+    assert len(roster_index) == 2
+    no_face = student_record("Trần Thị Bình", "https://img/1.jpg", None)
+    no_portrait = {"Name": "Lê Văn Chương", "ChanDung": ""}
+    assert apply_student_changes([("001", no_face), ("002", no_portrait)],
+                                 name_index, roster_index, roster_store) == []
+    assert len(roster_index) == 0
+    assert roster_store.size == 0
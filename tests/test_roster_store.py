@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from core.matching import l2_normalize, similarity_matrix, top_k_matches
+from core.roster_store import RosterStore, accuracy_report, dequantize, quantize
+
+
+def random_vectors(count, dim=128, seed=0):
+    return l2_normalize(np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32))
+
+
+def roster_of(vectors):
+    return [(f"{i:04d}", f"Sinh viên {i}", vector) for i, vector in enumerate(vectors)]
+
+
+@pytest.fixture
+def vectors():
+    return random_vectors(300)
+
+
+def test_int8_round_trip_error_is_bounded(vectors):
+    data, scales = quantize(vectors, "int8")
+    assert data.dtype == np.int8 and scales.dtype == np.float32
+    assert np.abs(data).max() == 127
+    error = np.abs(dequantize(data, scales) - vectors)
+    assert np.all(error <= scales[:, None] / 2 + 1e-7)
+
+
+def test_float16_and_zero_rows():
+    matrix = np.zeros((2, 128), dtype=np.float32)
+    matrix[1, 0] = 1.0
+    data, scales = quantize(matrix, "int8")
+    assert scales[0] == 1.0
+    assert np.array_equal(dequantize(data, scales), matrix)
+    data, scales = quantize(matrix, "float16")
+    assert data.dtype == np.float16 and np.all(scales == 1.0)
+    assert np.array_equal(dequantize(data, scales), matrix)
+
+
+def test_unknown_dtype_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        RosterStore(str(tmp_path), dtype="int4")
+
+
+def test_sync_and_reload_from_disk(tmp_path, vectors):
+    store = RosterStore(str(tmp_path))
+    assert not store.refresh()
+    store.sync(roster_of(vectors) + [("no-face", "Không có mặt", None)])
+    assert store.complete and store.size == len(vectors)
+
+    reader = RosterStore(str(tmp_path))
+    assert reader.refresh() and reader.complete
+    roster = reader.roster()
+    assert [student_id for student_id, _, _ in roster] == [f"{i:04d}" for i in range(len(vectors))]
+    restored = np.vstack([feature for _, _, feature in roster])
+    assert np.abs(restored - vectors).max() < 0.01
+    # Snapshot theo kiểu lưu khác không dùng lẫn
+    assert not RosterStore(str(tmp_path), dtype="float16").refresh()
+
+
+def test_updates_are_seen_by_other_processes(tmp_path, vectors):
+    writer = RosterStore(str(tmp_path))
+    writer.sync(roster_of(vectors[:10]))
+    reader = RosterStore(str(tmp_path))
+    reader.refresh()
+
+    writer.delete("0003")
+    writer.upsert("new", "Nguyễn Văn An", vectors[20])
+    writer.rename("0004", "SV-004", name="Trần Thị Bình")
+    assert reader.size == 10
+    assert reader.refresh()
+    assert reader.size == 10
+    labels = {label for label in reader.labels if label is not None}
+    assert ("new", "Nguyễn Văn An") in labels and ("SV-004", "Trần Thị Bình") in labels
+    assert not any(student_id == "0003" for student_id, _ in labels)
+    assert reader.match(vectors[20], 0.9)[0][0][0] == ("new", "Nguyễn Văn An")
+
+    # Bên đọc cũng ghi được: nạp bản mới nhất trước khi sửa
+    reader.upsert("0005", "Sinh viên 5", vectors[21])
+    writer.refresh()
+    assert writer.match(vectors[21], 0.9)[0][0][0] == ("0005", "Sinh viên 5")
+
+
+def test_deleted_rows_are_reused(tmp_path, vectors):
+    store = RosterStore(str(tmp_path))
+    store.sync(roster_of(vectors[:100]))
+    with store.batch():
+        for i in range(0, 100, 2):
+            store.delete(f"{i:04d}")
+    assert store.size == 50
+    with store.batch():
+        for i in range(100, 150):
+            store.upsert(f"{i:04d}", f"Sinh viên {i}", vectors[i])
+    assert store.size == 100
+    assert len(store.labels) == 100
+
+    # Sau khi nạp lại từ đĩa các dòng trống vẫn được dùng lại
+    store.delete("0001")
+    reader = RosterStore(str(tmp_path))
+    reader.refresh()
+    reader.upsert("0200", "Sinh viên 200", vectors[200])
+    assert len(reader.labels) == 100
+
+
+def test_unchanged_upsert_does_not_rewrite(tmp_path, vectors):
+    store = RosterStore(str(tmp_path))
+    store.sync(roster_of(vectors[:5]))
+    generation = store._generation
+    store.upsert("0001", "Sinh viên 1", vectors[1])
+    assert store._generation == generation
+    store.upsert("0001", "Sinh viên 1 (đổi tên)", vectors[1])
+    assert store._generation == generation + 1
+
+
+def test_int8_match_agrees_with_float32(tmp_path, vectors):
+    store = RosterStore(str(tmp_path))
+    store.sync(roster_of(vectors))
+    store.delete("0000")
+    rng = np.random.default_rng(1)
+    queries = l2_normalize(vectors[1:51] + rng.normal(scale=0.3 / np.sqrt(128), size=(50, 128)))
+
+    labels = [(student_id, name) for student_id, name, _ in roster_of(vectors)][1:]
+    expected = top_k_matches(similarity_matrix(queries, vectors[1:]), labels, 0.3, 3)
+    found = store.match(queries, 0.3, top_k=3)
+    for face_expected, face_found in zip(expected, found):
+        assert face_found[0][0] == face_expected[0][0]
+        assert face_found[0][1] == pytest.approx(face_expected[0][1], abs=0.01)
+        assert all(score > 0.3 for _, score in face_found)
+    # Dòng đã xóa không bao giờ được trả về
+    assert all(label[0] != "0000" for face in store.match(vectors[:1], -1.0, top_k=None) for label, _ in face)
+
+
+def test_accuracy_report(vectors):
+    report = accuracy_report(vectors, "int8", k=5)
+    assert report["top1_agreement"] >= 0.99
+    assert report["recall_at_5"] >= 0.95
+    assert report["bytes_per_student"] == 132
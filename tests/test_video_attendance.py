@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+
+from core import video_attendance
+from core.video_attendance import TRACK_MAX_MISSES, Track, VideoAttendance
+
+FRAME = np.zeros((480, 640, 3), dtype=np.uint8)
+
+
+class FakeModels:
+    @contextmanager
+    def lease(self, name):
+        yield name
+
+
+def yunet_rows(boxes):
+    # Kết quả dạng YuNet: khung + 5 điểm mốc + điểm tin cậy
+    rows = np.zeros((len(boxes), 15), dtype=np.float32)
+    if boxes:
+        rows[:, :4] = boxes
+        rows[:, 14] = 0.9
+    return rows
+
+
+@pytest.fixture
+def scene(monkeypatch):
+    # boxes_at(frame_index) -> [(x, y, w, h)] là các khuôn mặt thật trong khung hình
+    state = {"boxes_at": lambda frame_index: [], "frame": 0}
+
+    def detect_class_faces(frame, models, **options):
+        return yunet_rows(state["boxes_at"](state["frame"]))
+
+    def extract_features(feature_net, crops):
+        return np.tile(np.eye(1, 128, dtype=np.float32), (len(crops), 1))
+
+    monkeypatch.setattr(video_attendance, "detect_class_faces", detect_class_faces)
+    monkeypatch.setattr(video_attendance, "extract_features", extract_features)
+
+    session = VideoAttendance(FakeModels(), [("001", "Nguyễn Văn An")], np.eye(1, 128, dtype=np.float32),
+                              detect_every=5)
+
+    def run(boxes_at, frames, on_frame=None):
+        state["boxes_at"] = boxes_at
+        for frame_index in range(frames):
+            state["frame"] = frame_index
+            session.process_frame(FRAME, frame_index, frame_index / 25)
+            if on_frame is not None:
+                on_frame(frame_index)
+
+    return session, run
+
+
+def test_track_velocity_is_measured_between_detections():
+    track = Track(0, (100, 100, 60, 60), 0, 0.0)
+    for frame_index in range(1, 31):
+        track.predict()
+        if frame_index % 5 == 0:
+            track.update((100 + 10 * frame_index, 100, 60, 60), frame_index, frame_index / 25)
+    assert np.allclose(track.velocity, (10, 0, 0, 0))
+    for _ in range(3):
+        track.predict()
+    assert np.allclose(track.box, (100 + 10 * 33, 100, 60, 60))
+
+
+def test_prediction_follows_constant_velocity_between_detections(scene):
+    session, run = scene
+
+    def moving(frame_index):
+        return [(50 + 4 * frame_index, 200, 60, 60)]
+
+    errors = []
+
+    def check(frame_index):
+        if frame_index >= 10:
+            errors.append(np.abs(session.tracks[0].box - moving(frame_index)[0]).max())
+
+    run(moving, 100, check)
+    assert session.stats["tracks"] == 1
+    assert len(session.tracks) == 1
+    # Sau hai lần phát hiện vị trí dự đoán đúng ở mọi khung hình, không dao động
+    assert max(errors) < 1e-3
+
+
+def test_fast_face_needs_prediction_to_keep_its_track(scene):
+    session, run = scene
+
+    def fast(frame_index):
+        # Tăng tốc lên 8 px mỗi khung hình: 40 px giữa hai lần phát hiện, chỉ ghép
+        # được với track cũ khi vận tốc dự đoán đúng
+        x = 20 + 4 * frame_index if frame_index <= 10 else 60 + 8 * (frame_index - 10)
+        return [(x, 100, 60, 60)]
+
+    run(fast, 70)
+    assert session.stats["tracks"] == 1
+    assert session.tracks[0].track_id == 0
+
+
+def test_faces_are_associated_to_their_own_tracks(scene):
+    session, run = scene
+
+    def two_faces(frame_index):
+        return [(40 + 3 * frame_index, 100, 60, 60), (500 - 3 * frame_index, 300, 60, 60)]
+
+    run(two_faces, 60)
+    assert session.stats["tracks"] == 2
+    first, second = sorted(session.tracks, key=lambda t: t.track_id)
+    assert first.box[0] < second.box[0]
+    assert np.allclose(first.velocity, (3, 0, 0, 0))
+    assert np.allclose(second.velocity, (-3, 0, 0, 0))
+    # Mỗi track chỉ tính embedding một lần
+    assert session.stats["embeddings"] == 2
+    assert list(session.attendance) == ["001"]
+
+
+def test_track_expires_after_consecutive_misses(scene):
+    session, run = scene
+    last_visible = 20
+
+    def disappearing(frame_index):
+        return [(200, 200, 60, 60)] if frame_index <= last_visible else []
+
+    alive = {}
+    run(disappearing, last_visible + 5 * (TRACK_MAX_MISSES + 2),
+        lambda frame_index: alive.__setitem__(frame_index, len(session.tracks)))
+    assert alive[last_visible + 5 * TRACK_MAX_MISSES] == 1
+    assert alive[last_visible + 5 * (TRACK_MAX_MISSES + 1)] == 0
+    assert session.tracks == []
+
+    # Xuất hiện lại sau khi track đã bị bỏ: track mới
+    run(lambda frame_index: [(200, 200, 60, 60)], 1)
+    assert session.stats["tracks"] == 2